@@ -0,0 +1,84 @@
+from typing import Optional
+
+from state import load_state, save_state
+from errors import plain_hex
+
+MAX_UINT256 = 2 ** 256 - 1
+# keccak("Approval(address,address,uint256)")
+APPROVAL_TOPIC = "8c5be1e5ebec7d5bd14f71427d1e84f3dd0314c0f7b2291e5b200ac8c7c3b925"
+
+
+class AllowanceIndex:
+    def __init__(self, name="allowances"):
+        """
+        Persistent (owner, token, spender) -> allowance index
+
+        Updated from the Approval events of our own receipts and from the allowance reads we already
+        do, so a known-sufficient allowance needs neither an RPC read nor an approve transaction.
+
+        :param name: State file the index is stored in (state/<name>.json)
+        """
+        self.name = name
+        self.allowances = load_state(name, {})
+
+    @staticmethod
+    def key(owner, token, spender) -> str:
+        return f"{owner}:{token}:{spender}".lower()
+
+    def get(self, owner, token, spender) -> Optional[int]:
+        """Last known allowance, or None if we never saw one"""
+        value = self.allowances.get(self.key(owner, token, spender))
+        return None if value is None else int(value)
+
+    def set(self, owner, token, spender, amount: int) -> None:
+        self.allowances[self.key(owner, token, spender)] = str(amount)  # JSON can't hold uint256 as a number
+        save_state(self.name, self.allowances)
+
+    def forget(self, owner, token, spender) -> None:
+        """Drop an entry that turned out to be wrong (e.g. a swap relying on it reverted)"""
+        if self.allowances.pop(self.key(owner, token, spender), None) is not None:
+            save_state(self.name, self.allowances)
+
+    def is_sufficient(self, owner, token, spender, amount: int) -> bool:
+        known = self.get(owner, token, spender)
+        return known is not None and known >= amount
+
+    def read(self, token_contract, owner, spender, amount: int) -> int:
+        """Allowance from the index when it covers `amount`, otherwise read on-chain (sync Web3) and stored"""
+        if self.is_sufficient(owner, token_contract.address, spender, amount):
+            return self.get(owner, token_contract.address, spender)
+        allowance = token_contract.functions.allowance(owner, spender).call()
+        self.set(owner, token_contract.address, spender, allowance)
+        return allowance
+
+    async def async_read(self, token_contract, owner, spender, amount: int) -> int:
+        """read() for an AsyncWeb3 contract"""
+        if self.is_sufficient(owner, token_contract.address, spender, amount):
+            return self.get(owner, token_contract.address, spender)
+        allowance = await token_contract.functions.allowance(owner, spender).call()
+        self.set(owner, token_contract.address, spender, allowance)
+        return allowance
+
+    def spend(self, owner, token, spender, amount: int) -> None:
+        """Account for a successful transferFrom by `spender`; unlimited approvals are not decreased"""
+        known = self.get(owner, token, spender)
+        if known is not None and known != MAX_UINT256:
+            self.set(owner, token, spender, max(0, known - amount))
+
+    def record_receipt(self, receipt) -> None:
+        """Store every Approval event in a receipt"""
+        for log in receipt['logs']:
+            topics = log['topics']
+            if len(topics) == 3 and plain_hex(topics[0]) == APPROVAL_TOPIC:
+                owner = '0x' + plain_hex(topics[1])[-40:]
+                spender = '0x' + plain_hex(topics[2])[-40:]
+                self.set(owner, log['address'], spender, int(plain_hex(log['data']) or '0', 16))
+
+
+def approval_amount(amount: int, approve_max: bool) -> int:
+    """Amount to approve: unlimited once under the approve-max policy, otherwise exactly `amount`"""
+    return MAX_UINT256 if approve_max else amount
+
+
+# Shared by every script and persisted across runs
+allowance_index = AllowanceIndex()
@@ -0,0 +1,175 @@
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+import metrics
+from errors import plain_hex
+
+NATIVE = "native"  # Token key of the MON balance
+WMON_ADDRESS = "0x760afe86e5de5fa0ee542fc7b7b713e1c5425701"
+RECONCILE_INTERVAL = 120  # Seconds a balance is served before it's read on-chain again
+
+# keccak("Transfer(address,address,uint256)")
+TRANSFER_TOPIC = "ddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+# keccak("Deposit(address,uint256)")
+DEPOSIT_TOPIC = "e1fffcc4923d04b559f4d29a8bfc6cda04eb5b0d3c460751c2402c5c5cc9109c"
+# keccak("Withdrawal(address,uint256)")
+WITHDRAWAL_TOPIC = "7fcf532c15f0a6db0bd6d0e038bea71d30d808c7d98cb3bf7268a95bf5081b65"
+
+BALANCE_OF_ABI = [
+    {"constant": True, "inputs": [{"name": "account", "type": "address"}], "name": "balanceOf",
+     "outputs": [{"name": "", "type": "uint256"}], "type": "function"}
+]
+
+
+def _topic_address(topic) -> str:
+    return '0x' + plain_hex(topic)[-40:]
+
+
+class BalanceCache:
+    def __init__(self, reconcile_interval=RECONCILE_INTERVAL):
+        """
+        In-memory (wallet, token) -> balance cache shared by every script
+
+        Filled by reads and bulk scans, then kept current from our own receipts: the fee (Monad bills the
+        full gas limit) and value of every transaction, ERC20 Transfer logs and WMON Deposit/Withdrawal
+        logs. Only entries already known are adjusted. MON received through internal calls and tokens
+        sent to us by others leave no trace in our receipts, so the cache can only lag below the real
+        balance; every entry is re-read after `reconcile_interval` seconds, which corrects that drift.
+
+        :param reconcile_interval: Seconds an entry is served before it's read on-chain again
+        """
+        self.reconcile_interval = reconcile_interval
+        self.balances: Dict[Tuple[str, str], Tuple[int, float]] = {}  # (wallet, token) -> (balance, read at)
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(wallet, token=NATIVE) -> Tuple[str, str]:
+        return str(wallet).lower(), str(token).lower()
+
+    def get(self, wallet, token=NATIVE) -> Optional[int]:
+        """Cached balance, or None when unknown or due for reconciliation"""
+        with self.lock:
+            entry = self.balances.get(self.key(wallet, token))
+        if entry is None or time.monotonic() - entry[1] >= self.reconcile_interval:
+            metrics.incr('wallet_balances.miss')
+            return None
+        metrics.incr('wallet_balances.hit')
+        return entry[0]
+
+    def set(self, wallet, token, balance: int) -> None:
+        """Store a balance read on-chain, counting a drift when it differs from what the cache expected"""
+        key = self.key(wallet, token)
+        with self.lock:
+            previous = self.balances.get(key)
+            self.balances[key] = (int(balance), time.monotonic())
+        if previous is not None and previous[0] != int(balance):
+            metrics.incr('wallet_balances.drift')
+
+    def forget(self, wallet, token=NATIVE) -> None:
+        with self.lock:
+            self.balances.pop(self.key(wallet, token), None)
+
+    def _add(self, wallet, token, delta: int) -> None:
+        key = self.key(wallet, token)
+        with self.lock:
+            entry = self.balances.get(key)
+            if entry is not None:
+                # Keep the read time: a derived balance doesn't postpone reconciliation
+                self.balances[key] = (max(0, entry[0] + delta), entry[1])
+
+    def observe(self, tx, receipt) -> None:
+        """Apply a mined transaction of ours: fee and value, then its Transfer, Deposit and Withdrawal logs"""
+        sender = tx.get('from') or receipt.get('from')
+        if sender:
+            # Monad bills the gas limit, not the gas used
+            fee = tx.get('gas', receipt['gasUsed']) * receipt.get('effectiveGasPrice', tx.get('gasPrice', 0))
+            value = tx.get('value', 0) if receipt['status'] == 1 else 0
+            self._add(sender, NATIVE, -(fee + value))
+        if receipt['status'] != 1:
+            return
+
+        for log in receipt['logs']:
+            topics = log['topics']
+            if not topics:
+                continue
+            token = str(log['address']).lower()
+            signature = plain_hex(topics[0])
+            amount = int(plain_hex(log['data']) or '0', 16)
+            if signature == TRANSFER_TOPIC and len(topics) == 3:
+                self._add(_topic_address(topics[1]), token, -amount)
+                self._add(_topic_address(topics[2]), token, amount)
+            elif token == WMON_ADDRESS and signature == DEPOSIT_TOPIC and len(topics) == 2:
+                self._add(_topic_address(topics[1]), token, amount)
+            elif token == WMON_ADDRESS and signature == WITHDRAWAL_TOPIC and len(topics) == 2:
+                src = _topic_address(topics[1])
+                self._add(src, token, -amount)
+                if src == str(sender).lower():
+                    self._add(src, NATIVE, amount)
+                elif sender:
+                    # A router unwrapped and forwarded MON to us in an internal call, read it again
+                    self.forget(sender, NATIVE)
+        metrics.incr('wallet_balances.receipt')
+
+    def read(self, w3, wallet, token=NATIVE) -> int:
+        """Balance from the cache, otherwise read on-chain (sync Web3) and stored"""
+        balance = self.get(wallet, token)
+        if balance is None:
+            if token == NATIVE:
+                balance = w3.eth.get_balance(w3.to_checksum_address(wallet))
+            else:
+                contract = w3.eth.contract(address=w3.to_checksum_address(token), abi=BALANCE_OF_ABI)
+                balance = contract.functions.balanceOf(w3.to_checksum_address(wallet)).call()
+            self.set(wallet, token, balance)
+        return balance
+
+    async def async_read(self, w3, wallet, token=NATIVE) -> int:
+        """read() for an AsyncWeb3 instance"""
+        balance = self.get(wallet, token)
+        if balance is None:
+            if token == NATIVE:
+                balance = await w3.eth.get_balance(w3.to_checksum_address(wallet))
+            else:
+                contract = w3.eth.contract(address=w3.to_checksum_address(token), abi=BALANCE_OF_ABI)
+                balance = await contract.functions.balanceOf(w3.to_checksum_address(wallet)).call()
+            self.set(wallet, token, balance)
+        return balance
+
+    def _stale(self, wallet, tokens: Iterable[str]):
+        return [token for token in tokens if self.get(wallet, token) is None]
+
+    def scan(self, w3, wallet, tokens: Iterable[str]) -> Dict[str, int]:
+        """Balances of `tokens` (NATIVE for MON), reading every missing one in a single batched request"""
+        tokens = list(tokens)
+        stale = self._stale(wallet, tokens)
+        if stale:
+            owner = w3.to_checksum_address(wallet)
+            with w3.batch_requests() as batch:
+                for token in stale:
+                    batch.add(self._balance_call(w3, owner, token))
+                for token, balance in zip(stale, batch.execute()):
+                    self.set(wallet, token, balance)
+        return {token: self.balances[self.key(wallet, token)][0] for token in tokens}
+
+    async def async_scan(self, w3, wallet, tokens: Iterable[str]) -> Dict[str, int]:
+        """scan() for an AsyncWeb3 instance"""
+        tokens = list(tokens)
+        stale = self._stale(wallet, tokens)
+        if stale:
+            owner = w3.to_checksum_address(wallet)
+            async with w3.batch_requests() as batch:
+                for token in stale:
+                    batch.add(self._balance_call(w3, owner, token))
+                for token, balance in zip(stale, await batch.async_execute()):
+                    self.set(wallet, token, balance)
+        return {token: self.balances[self.key(wallet, token)][0] for token in tokens}
+
+    @staticmethod
+    def _balance_call(w3, owner, token):
+        if token == NATIVE:
+            return w3.eth.get_balance(owner)
+        return w3.eth.contract(address=w3.to_checksum_address(token), abi=BALANCE_OF_ABI).functions.balanceOf(owner)
+
+
+# Shared by every script so a balance read or derived by one module is reused by the others
+wallet_balances = BalanceCache()
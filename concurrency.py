@@ -0,0 +1,105 @@
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import List
+
+import metrics
+from logger import logger
+
+
+class AimdLimiter:
+    def __init__(self, initial: int, minimum: int = 1, maximum: int = 50, increase: int = 1, decrease: float = 0.5,
+                 target_p95: float = 2.0, max_error_rate: float = 0.05, min_samples: int = 20,
+                 interval: float = 5.0):
+        """
+        Number of accounts allowed in flight, steered by additive increase / multiplicative decrease
+
+        RPC responses are fed to observe(). Every `interval` seconds, once `min_samples` responses were
+        seen, they are judged together: while their p95 latency stays under `target_p95` and their error
+        rate (429, 5xx, transport errors) under `max_error_rate`, the limit grows by `increase` if it was
+        fully used; otherwise it's multiplied by `decrease`.
+
+        :param initial: Starting limit
+        :param minimum: Lowest limit a decrease may reach
+        :param maximum: Highest limit an increase may reach
+        :param increase: Added to the limit after a healthy interval
+        :param decrease: Factor the limit is multiplied by after a degraded interval
+        :param target_p95: Healthy p95 response time in seconds
+        :param max_error_rate: Healthy share of failed responses
+        :param min_samples: Responses needed before a decision
+        :param interval: Seconds between decisions
+        """
+        self.minimum = minimum
+        self.maximum = max(minimum, maximum)
+        self.limit = min(self.maximum, max(minimum, initial))
+        self.increase = increase
+        self.decrease = decrease
+        self.target_p95 = target_p95
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.interval = interval
+        self.in_flight = 0
+        self.peak = 0  # Most slots held at once since the last decision
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.decided_at = time.monotonic()
+        self.lock = threading.Lock()  # observe() is also called from threads running sync web3
+        self.changed = asyncio.Condition()
+
+    def observe(self, latency: float, ok: bool) -> None:
+        """Record one RPC response, deciding on the limit when an interval is complete"""
+        with self.lock:
+            self.latencies.append(latency)
+            if not ok:
+                self.errors += 1
+            now = time.monotonic()
+            if len(self.latencies) >= self.min_samples and now - self.decided_at >= self.interval:
+                self._decide(now)
+
+    def _decide(self, now: float) -> None:
+        latencies = sorted(self.latencies)
+        p95 = latencies[int(0.95 * (len(latencies) - 1))]
+        error_rate = self.errors / len(latencies)
+        limit = self.limit
+
+        if p95 > self.target_p95 or error_rate > self.max_error_rate:
+            self.limit = max(self.minimum, int(self.limit * self.decrease))
+            metrics.incr('concurrency.decrease')
+        elif self.peak >= self.limit:
+            self.limit = min(self.maximum, self.limit + self.increase)
+            metrics.incr('concurrency.increase')
+
+        if self.limit != limit:
+            logger.info(f"Concurrency {limit} -> {self.limit} (p95 {p95:.2f}s, errors {error_rate:.0%})")
+        self.latencies.clear()
+        self.errors = 0
+        self.peak = self.in_flight
+        self.decided_at = now
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one of the `limit` slots for the duration of the block"""
+        async with self.changed:
+            while self.in_flight >= self.limit:
+                await self.changed.wait()
+            with self.lock:
+                self.in_flight += 1
+                self.peak = max(self.peak, self.in_flight)
+        try:
+            yield
+        finally:
+            async with self.changed:
+                with self.lock:
+                    self.in_flight -= 1
+                # Wake every waiter: the limit may have grown since they started waiting
+                self.changed.notify_all()
+
+    async def gather(self, *aws, return_exceptions: bool = False) -> list:
+        """asyncio.gather() that starts each awaitable only once it holds a slot, e.g. one per account"""
+
+        async def held(aw):
+            async with self.slot():
+                return await aw
+
+        return await asyncio.gather(*(held(aw) for aw in aws), return_exceptions=return_exceptions)
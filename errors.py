@@ -0,0 +1,162 @@
+import asyncio
+import re
+from enum import Enum
+from typing import Optional
+
+import aiohttp
+from eth_abi import decode
+from web3.exceptions import ContractLogicError, TimeExhausted
+
+
+class ErrorClass(Enum):
+    FUNDING = "funding"  # Wallet can't pay for value + gas, fund it and retry
+    NONCE = "nonce"  # Nonce already used or out of sequence, rebuild the transaction
+    FEE = "fee"  # Fee or gas limit too low, rebuild the transaction
+    RATE_LIMIT = "rate_limit"  # Node or API throttling, back off
+    TRANSIENT = "transient"  # Network hiccup or 5xx, retry quickly
+    REVERT = "revert"  # Deterministic contract revert, retrying won't help
+    UNKNOWN = "unknown"
+
+
+# Message patterns per class, in priority order: "execution reverted: insufficient balance" is funding
+_PATTERNS = [
+    (ErrorClass.FUNDING, [
+        r"insufficient (?:funds|balance|eth balance|native token)",
+        r"intrinsic gas greater than limit",
+        r"gas required exceeds allowance",
+        r"not enough balance",
+        r"balance too low",
+        r"sender doesn't have enough funds",
+    ]),
+    (ErrorClass.NONCE, [
+        r"nonce too (?:low|high)",
+        r"invalid nonce",
+        r"already known",
+        r"known transaction",
+    ]),
+    (ErrorClass.FEE, [
+        r"(?:replacement )?transaction underpriced",
+        r"fee too low",
+        r"max fee per gas less than block base fee",
+        r"out of gas",
+    ]),
+    (ErrorClass.RATE_LIMIT, [
+        r"\b429\b",
+        r"too many requests",
+        r"rate.?limit",
+        r"request limit",
+        r"limit exceeded",
+    ]),
+    (ErrorClass.TRANSIENT, [
+        r"time(?:d)? ?out",
+        r"connection (?:reset|refused|aborted|closed|error)",
+        r"server disconnected",
+        r"failed to connect",
+        r"temporarily unavailable",
+        r"bad gateway",
+        r"service unavailable",
+        r"\b50[234]\b",
+        r"is not in the chain after",
+        r"max retries exceeded",
+    ]),
+    (ErrorClass.REVERT, [
+        r"execution reverted",
+        r"\brevert",
+        r"exceeds (?:balance|allowance)",  # ERC20 token balance/allowance, funding MON won't help
+        r"insufficient allowance",
+    ]),
+]
+_PRIORITY = [error_class for error_class, _ in _PATTERNS]
+_MATCHER = re.compile(
+    "|".join(f"(?P<{error_class.name}>{'|'.join(patterns)})" for error_class, patterns in _PATTERNS),
+    re.IGNORECASE,
+)
+
+# JSON-RPC error codes that decide the class when the message doesn't
+_RPC_CODES = {
+    -32005: ErrorClass.RATE_LIMIT,  # Limit exceeded
+    3: ErrorClass.REVERT,  # Execution reverted
+}
+
+ERROR_SELECTOR = "08c379a0"  # Error(string)
+PANIC_SELECTOR = "4e487b71"  # Panic(uint256)
+# A selector and whole 32-byte words, standing alone: a tx hash or an address in a message is not revert data
+_REVERT_DATA = re.compile(r"\b0x[0-9a-f]{8}(?:[0-9a-f]{64})*\b", re.IGNORECASE)
+
+
+def plain_hex(value) -> str:
+    """Lowercase hex without 0x for HexBytes, bytes or str"""
+    if isinstance(value, (bytes, bytearray)):
+        value = value.hex()
+    value = str(value).lower()
+    return value[2:] if value.startswith('0x') else value
+
+
+def decode_revert(data) -> Optional[str]:
+    """Reason of Error(string) revert data, Panic(0x..) for panics, or the selector of a custom error"""
+    if isinstance(data, dict):
+        data = data.get('data')
+    if not isinstance(data, (str, bytes, bytearray)):
+        return None
+    data = plain_hex(data)
+    if len(data) < 8:
+        return None
+
+    selector = data[:8]
+    try:
+        payload = bytes.fromhex(data[8:])
+        if selector == ERROR_SELECTOR:
+            return decode(['string'], payload)[0]
+        if selector == PANIC_SELECTOR:
+            return f"Panic({hex(decode(['uint256'], payload)[0])})"
+    except Exception:
+        pass
+    return f"custom error 0x{selector}"
+
+
+def _rpc_error(exc) -> dict:
+    response = getattr(exc, 'rpc_response', None) or {}
+    error = response.get('error') if isinstance(response, dict) else None
+    return error if isinstance(error, dict) else {}
+
+
+def revert_reason(exc: BaseException) -> Optional[str]:
+    """Decoded revert reason carried by an exception, from its revert data or its message"""
+    if isinstance(exc, ContractLogicError) and exc.data:
+        return decode_revert(exc.data)
+    rpc_data = _rpc_error(exc).get('data')
+    if rpc_data:
+        return decode_revert(rpc_data)
+    match = _REVERT_DATA.search(str(exc))
+    return decode_revert(match.group(0)) if match else None
+
+
+def _http_status(exc) -> Optional[int]:
+    if isinstance(exc, aiohttp.ClientResponseError):
+        return exc.status
+    response = getattr(exc, 'response', None)  # requests.HTTPError
+    return getattr(response, 'status_code', None)
+
+
+def classify(exc: BaseException) -> ErrorClass:
+    """Map an exception from web3, aiohttp or requests to an ErrorClass"""
+    status = _http_status(exc)
+    if status == 429:
+        return ErrorClass.RATE_LIMIT
+    if status is not None and status >= 500:
+        return ErrorClass.TRANSIENT
+
+    error = _rpc_error(exc)
+    text = f"{exc} {error.get('message', '')} {revert_reason(exc) or ''}"
+    matched = {match.lastgroup for match in _MATCHER.finditer(text)}
+    for error_class in _PRIORITY:
+        if error_class.name in matched:
+            return error_class
+
+    if error.get('code') in _RPC_CODES:
+        return _RPC_CODES[error['code']]
+    if isinstance(exc, ContractLogicError):
+        return ErrorClass.REVERT
+    if isinstance(exc, (TimeExhausted, asyncio.TimeoutError, TimeoutError, ConnectionError, aiohttp.ClientError)):
+        return ErrorClass.TRANSIENT
+    return ErrorClass.UNKNOWN
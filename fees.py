@@ -0,0 +1,103 @@
+import asyncio
+import statistics
+import threading
+import time
+from typing import Dict, List, Optional
+
+GWEI = 10 ** 9
+BLOCK_TIME = 1.0  # Seconds a fee snapshot stays fresh, about one Monad block
+HISTORY_BLOCKS = 5
+REWARD_PERCENTILES = [25, 50, 75]
+SPEEDS = {'slow': 0, 'medium': 1, 'fast': 2}  # Index into REWARD_PERCENTILES
+MIN_PRIORITY_FEE = 1 * GWEI  # Floor when recent blocks paid no tips
+
+
+class FeeOracle:
+    def __init__(self, ttl=BLOCK_TIME, history_blocks=HISTORY_BLOCKS):
+        """
+        Process-wide EIP-1559 fee suggestions built from eth_feeHistory
+
+        A snapshot is fetched at most once per `ttl` seconds and shared by every account; concurrent
+        callers that find it stale wait on the same refresh instead of each issuing their own RPC.
+
+        :param ttl: Seconds a snapshot stays fresh
+        :param history_blocks: Number of recent blocks the tip percentiles are taken over
+        """
+        self.ttl = ttl
+        self.history_blocks = history_blocks
+        self.next_base_fee: Optional[int] = None
+        self.priority_fees: List[int] = []
+        self.updated_at = 0.0
+        self.refreshes = 0
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._sync_lock = threading.Lock()
+
+    def _is_fresh(self) -> bool:
+        return self.next_base_fee is not None and time.monotonic() - self.updated_at < self.ttl
+
+    def _update(self, history) -> None:
+        """Store the next block's base fee and the median tip of each percentile over the window"""
+        # baseFeePerGas has one extra entry: the base fee of the block after the newest one
+        self.next_base_fee = history['baseFeePerGas'][-1]
+        rewards = [r for r in history.get('reward') or [] if r]
+        self.priority_fees = [
+            max(MIN_PRIORITY_FEE, int(statistics.median(r[i] for r in rewards))) if rewards else MIN_PRIORITY_FEE
+            for i in range(len(REWARD_PERCENTILES))
+        ]
+        self.updated_at = time.monotonic()
+        self.refreshes += 1
+
+    async def _refresh(self, w3) -> None:
+        try:
+            self._update(await w3.eth.fee_history(self.history_blocks, 'latest', REWARD_PERCENTILES))
+        finally:
+            self._refresh_task = None
+
+    async def refresh(self, w3) -> None:
+        """Fetch a new snapshot unless the current one is fresh, sharing one in-flight request"""
+        if self._is_fresh():
+            return
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.ensure_future(self._refresh(w3))
+        await asyncio.shield(self._refresh_task)
+
+    def refresh_sync(self, w3) -> None:
+        """refresh() for a sync Web3 client"""
+        with self._sync_lock:
+            if not self._is_fresh():
+                self._update(w3.eth.fee_history(self.history_blocks, 'latest', REWARD_PERCENTILES))
+
+    def _suggestion(self, speed: str) -> Dict[str, int]:
+        priority_fee = self.priority_fees[SPEEDS[speed]]
+        return {
+            # Twice the base fee keeps the transaction valid through a run of full blocks
+            'maxFeePerGas': 2 * self.next_base_fee + priority_fee,
+            'maxPriorityFeePerGas': priority_fee,
+        }
+
+    def _legacy_price(self, speed: str) -> int:
+        return self.next_base_fee + self.priority_fees[SPEEDS[speed]]
+
+    async def suggest(self, w3, speed: str = 'medium') -> Dict[str, int]:
+        """maxFeePerGas/maxPriorityFeePerGas for a type 2 transaction"""
+        await self.refresh(w3)
+        return self._suggestion(speed)
+
+    async def gas_price(self, w3, speed: str = 'medium') -> int:
+        """gasPrice for a legacy transaction: next base fee plus the suggested tip"""
+        await self.refresh(w3)
+        return self._legacy_price(speed)
+
+    def suggest_sync(self, w3, speed: str = 'medium') -> Dict[str, int]:
+        """suggest() for a sync Web3 client"""
+        self.refresh_sync(w3)
+        return self._suggestion(speed)
+
+    def gas_price_sync(self, w3, speed: str = 'medium') -> int:
+        """gas_price() for a sync Web3 client"""
+        self.refresh_sync(w3)
+        return self._legacy_price(speed)
+
+
+# One oracle per process, shared by every script
+fee_oracle = FeeOracle()
@@ -0,0 +1,91 @@
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+import metrics
+
+
+class GasModel:
+    def __init__(self, percentile=0.95, headroom=1.2, min_samples=3, window=50):
+        """
+        Learn gas limits from the receipts of successful transactions
+
+        Samples of `gasUsed` are kept per (contract, function selector, payable) and served as a
+        high-percentile estimate plus headroom, so estimate_gas is only needed while a key is cold.
+
+        :param percentile: Percentile of the observed gasUsed samples to serve
+        :param headroom: Multiplier applied on top of the percentile
+        :param min_samples: Samples needed before a key is served from the model
+        :param window: Number of most recent samples kept per key
+        """
+        self.percentile = percentile
+        self.headroom = headroom
+        self.min_samples = min_samples
+        self.window = window
+        self.samples: Dict[Tuple[str, str, bool], Deque[int]] = {}
+
+    @staticmethod
+    def key(tx: Dict[str, Any]) -> Tuple[str, str, bool]:
+        """(to, selector, payable) of a transaction; plain transfers get an empty selector"""
+        data = tx.get('data') or tx.get('input') or ''
+        if isinstance(data, (bytes, bytearray)):
+            data = '0x' + data.hex()
+        if not data.startswith('0x'):
+            data = '0x' + data
+        return str(tx.get('to', '')).lower(), data[:10].lower(), bool(tx.get('value'))
+
+    def limit(self, tx: Dict[str, Any]) -> Optional[int]:
+        """Learned gas limit for the transaction, or None while its key is cold"""
+        samples = self.samples.get(self.key(tx))
+        if not samples or len(samples) < self.min_samples:
+            metrics.incr('gas_model.miss')
+            return None
+        metrics.incr('gas_model.hit')
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(self.percentile * len(ordered)))
+        return int(ordered[index] * self.headroom)
+
+    def limit_for(self, contract_function, value=0) -> Optional[int]:
+        """Learned gas limit for a web3 contract function call, or None while its key is cold"""
+        return self.limit({'to': contract_function.address, 'data': contract_function.selector, 'value': value})
+
+    def with_limit(self, contract_function, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        build_transaction params with the learned gas limit filled in
+
+        While the key is cold the params are returned untouched, so build_transaction falls back to
+        any hardcoded 'gas' in them or to estimate_gas.
+        """
+        learned = self.limit_for(contract_function, params.get('value', 0))
+        if learned is None:
+            return params
+        return {**params, 'gas': learned}
+
+    def observe(self, tx: Dict[str, Any], receipt: Dict[str, Any]) -> None:
+        """Record a mined transaction; an out-of-gas failure invalidates its key"""
+        if receipt['status'] == 1:
+            key = self.key(tx)
+            self.samples.setdefault(key, deque(maxlen=self.window)).append(receipt['gasUsed'])
+        elif tx.get('gas') and receipt['gasUsed'] >= tx['gas']:
+            self.invalidate(tx)
+
+    def invalidate(self, tx: Dict[str, Any]) -> None:
+        """Forget what was learned for the transaction's key so it is estimated again"""
+        self.samples.pop(self.key(tx), None)
+
+    def estimate(self, w3, tx: Dict[str, Any], buffer=1.0) -> int:
+        """Gas limit from the model, falling back to estimate_gas (times `buffer`) on a sync client"""
+        learned = self.limit(tx)
+        if learned is not None:
+            return learned
+        return int(w3.eth.estimate_gas(tx) * buffer)
+
+    async def async_estimate(self, w3, tx: Dict[str, Any], buffer=1.0) -> int:
+        """Gas limit from the model, falling back to estimate_gas (times `buffer`) on an async client"""
+        learned = self.limit(tx)
+        if learned is not None:
+            return learned
+        return int(await w3.eth.estimate_gas(tx) * buffer)
+
+
+# Shared by every script so gas learned by one account is reused by all the others
+gas_model = GasModel()
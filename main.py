@@ -5,8 +5,9 @@ import os
 import random
 from datetime import datetime, timedelta
 from colorama import Fore, Style, init
-from utils import data
+from utils import data, account_limiter
 from logger import logger
+import metrics
 
 # Initialize colorama
 init(autoreset=True)
@@ -26,8 +27,8 @@ def print_border(message, color=Fore.WHITE):
     print(f"{color}{message:^{BORDER_WIDTH}}{Style.RESET_ALL}")
 
 
-async def run_script(script_name):
-    """Run a single script module from the src folder."""
+def load_script(script_name):
+    """Import a script module from the src folder, or return None if it can't be run."""
     try:
         # Construct the file path
         script_path = os.path.join(SRC_FOLDER, f"{script_name}.py")
@@ -50,19 +51,28 @@ async def run_script(script_name):
         spec.loader.exec_module(module)
 
         # Check if the module has a run function
-        if hasattr(module, "run"):
-            logger.info(f"Running {script_name}...")
-            print_border(f"RUNNING {script_name.upper()}", Fore.CYAN)
-
-            # Run the script's main function
-            result = await module.run()
-
-            logger.info(f"Completed {script_name}")
-            return result
-        else:
+        if not hasattr(module, "run"):
             logger.error(f"No run function found in {script_name}.py")
             print_border(f"ERROR: No run function in {script_name}.py", Fore.RED)
             return None
+        return module
+    except Exception as e:
+        logger.error(f"Error loading {script_name}: {str(e)}")
+        print_border(f"ERROR in {script_name}: {str(e)}", Fore.RED)
+        return None
+
+
+async def run_script(script_name, module):
+    """Run a loaded script for every account; the script fans out over them within the shared account limiter."""
+    try:
+        logger.info(f"Running {script_name}...")
+        print_border(f"RUNNING {script_name.upper()}", Fore.CYAN)
+
+        # Run the script's main function
+        result = await module.run()
+
+        logger.info(f"Completed {script_name}")
+        return result
     except Exception as e:
         logger.error(f"Error running {script_name}: {str(e)}")
         print_border(f"ERROR in {script_name}: {str(e)}", Fore.RED)
@@ -70,7 +80,7 @@ async def run_script(script_name):
 
 
 async def schedule_scripts():
-    """Run all scripts in sequence with intervals, then wait for next cycle."""
+    """Run all scripts in sequence with intervals, each over as many accounts at a time as the RPC sustains."""
     execution_count = 0
 
     while True:
@@ -81,13 +91,14 @@ async def schedule_scripts():
         print_border(f"EXECUTION CYCLE #{execution_count} - {current_time.strftime('%Y-%m-%d %H:%M:%S')}", Fore.MAGENTA)
         print(f"{Fore.MAGENTA}{'═' * BORDER_WIDTH}{Style.RESET_ALL}")
 
-        random.shuffle(SCRIPTS)
+        scripts = [(name, module) for name in random.sample(SCRIPTS, len(SCRIPTS))
+                   if (module := load_script(name)) is not None]
         # Run each script with a random interval between them
-        for i, script_name in enumerate(SCRIPTS):
-            await run_script(script_name)
+        for i, (script_name, module) in enumerate(scripts):
+            await run_script(script_name, module)
 
             # Add a random interval between scripts (except after the last one)
-            if i < len(SCRIPTS) - 1:
+            if i < len(scripts) - 1:
                 minutes = random.uniform(MIN_INTERVAL, MAX_INTERVAL)
                 wait_msg = f"Waiting {minutes:.2f} minutes before next script..."
                 print(f"{Fore.YELLOW}⏳ {wait_msg:^{BORDER_WIDTH}}{Style.RESET_ALL}")
@@ -104,7 +115,8 @@ async def schedule_scripts():
         print_border(next_run_msg, Fore.CYAN)
         print(f"{Fore.CYAN}{'═' * BORDER_WIDTH}{Style.RESET_ALL}")
 
-        logger.info(f"Completed execution cycle #{execution_count}")
+        logger.info(f"Completed execution cycle #{execution_count} (concurrency {account_limiter.limit})")
+        metrics.log_summary()
         logger.info(f"Next cycle scheduled for {next_run_time.strftime('%Y-%m-%d %H:%M:%S')} (in {hours:.2f} hours)")
 
         # Sleep until next run cycle
@@ -0,0 +1,29 @@
+import threading
+from collections import Counter
+
+from logger import logger
+
+_counters = Counter()
+_lock = threading.Lock()
+
+
+def incr(name, amount=1):
+    """Increase a process-wide counter, e.g. incr("rpc_cache.hit")"""
+    with _lock:
+        _counters[name] += amount
+
+
+def snapshot():
+    """Copy of all counters"""
+    with _lock:
+        return dict(_counters)
+
+
+def log_summary():
+    """Log every counter, grouped by prefix, e.g. 'rpc_cache: hit=120 miss=14'"""
+    groups = {}
+    for name, value in sorted(snapshot().items()):
+        group, _, key = name.partition('.')
+        groups.setdefault(group, []).append(f"{key or group}={value}")
+    for group, values in groups.items():
+        logger.info(f"Metrics {group}: {' '.join(values)}")
@@ -1,8 +1,16 @@
 import requests
 import concurrent.futures
 import random
+import threading
 import time
 
+import metrics
+from state import load_state, save_state
+
+PROXY_TTL = 1800  # Seconds a validated proxy list is served before it's revalidated in the background
+PROXY_MAX_AGE = 7200  # Seconds after which an unrevalidated list is no longer served
+MIN_WORKING_PROXIES = 3  # Fewer survivors than this triggers a fresh fetch and test of the public list
+
 
 class ProxyTester:
     def __init__(self,
@@ -136,3 +144,83 @@ def get_free_proxy():
             if response:
                 # print("Successful request response:", response)
                 return working_proxy
+
+
+class ProxyCache:
+    def __init__(self, name="free_proxies", ttl=PROXY_TTL, max_age=PROXY_MAX_AGE):
+        """
+        Validated free proxies shared by every connection, persisted in state/<name>.json
+
+        get() only reads the cache. Once the list is older than `ttl` it is revalidated in a background
+        thread while the current one keeps being served; past `max_age` nothing is served.
+
+        :param name: State store name
+        :param ttl: Seconds before a background revalidation starts
+        :param max_age: Seconds after the last validation until the list is no longer served
+        """
+        self.name = name
+        self.ttl = ttl
+        self.max_age = max_age
+        stored = load_state(name, {}) or {}
+        self.proxies = stored.get('proxies', [])  # [{'proxy': {'http': .., 'https': ..}, 'response_time': ..}]
+        self.checked_at = stored.get('checked_at', 0.0)
+        self.lock = threading.Lock()
+        self.refreshing = None
+
+    def get(self):
+        """A validated proxy dict for requests, or None when none is cached"""
+        with self.lock:
+            age = time.time() - self.checked_at
+            if age >= self.ttl:
+                self._revalidate_in_background()
+            if not self.proxies or age >= self.max_age:
+                metrics.incr('proxy_cache.miss')
+                return None
+            metrics.incr('proxy_cache.hit')
+            # Spread accounts over the fastest few instead of piling onto one free proxy
+            return random.choice(self.proxies[:5])['proxy']
+
+    def ensure(self):
+        """Block until the cache holds fresh proxies, testing now only if the stored list is stale"""
+        if not self.proxies or time.time() - self.checked_at >= self.ttl:
+            self.revalidate()
+        return bool(self.proxies)
+
+    def revalidate(self):
+        """Re-test the cached proxies, topping up from the public list when too few still work"""
+        tester = ProxyTester()
+        tester.proxies = [{'proxy': entry['proxy']['http']} for entry in self.proxies]
+        working = tester.test_proxies(max_workers=20, max_proxies=len(tester.proxies)) if tester.proxies else []
+
+        if len(working) < MIN_WORKING_PROXIES:
+            known = {entry['proxy']['http'] for entry in working}
+            tester.fetch_proxies()
+            print("Testing for working proxies...")
+            fresh = tester.test_proxies(max_workers=20, max_proxies=50)
+            working += [entry for entry in fresh if entry['proxy']['http'] not in known]
+            working.sort(key=lambda x: x['response_time'])
+
+        metrics.incr('proxy_cache.revalidate')
+        with self.lock:
+            # An empty result keeps the old list, which max_age stops serving eventually
+            if working:
+                self.proxies = working
+                self.checked_at = time.time()
+                save_state(self.name, {'checked_at': self.checked_at, 'proxies': self.proxies})
+        return working
+
+    def _revalidate_in_background(self):
+        if self.refreshing is not None and self.refreshing.is_alive():
+            return
+        self.refreshing = threading.Thread(target=self._revalidate_quietly, name="proxy-revalidate", daemon=True)
+        self.refreshing.start()
+
+    def _revalidate_quietly(self):
+        try:
+            self.revalidate()
+        except Exception as e:
+            print(f"Error revalidating proxies: {e}")
+
+
+# Shared by every connection in the process
+proxy_cache = ProxyCache()
@@ -0,0 +1,84 @@
+import asyncio
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import metrics
+
+# Requests per second each host accepts, shared by every account in the process
+DEFAULT_LIMITS = {
+    "testnet-rpc.monad.xyz": 25,
+    "testnet-pathfinder-v2.monorail.xyz": 10,
+    "testnet-api.monorail.xyz": 10,
+    "api.aicraft.fun": 5,
+}
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        """
+        Token bucket refilled at `rate` tokens per second, holding at most `burst` tokens
+
+        Tokens are reserved up front and the balance may go negative, so concurrent callers queue
+        behind each other in arrival order instead of waking together and bursting past the limit.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take one token and return the seconds to wait before it may be used"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+
+class HostRateLimiter:
+    def __init__(self, limits: Dict[str, float], default_rate: Optional[float] = None, burst: float = 1.0):
+        """
+        Per-host request budgets for RPC endpoints and HTTP APIs
+
+        :param limits: Requests per second by host name, e.g. {"api.aicraft.fun": 5}
+        :param default_rate: Budget of hosts missing from `limits`; None leaves them unlimited
+        :param burst: Seconds of budget an idle host may spend at once
+        """
+        self.limits = dict(limits)
+        self.default_rate = default_rate
+        self.burst = burst
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.lock = threading.Lock()
+
+    def bucket(self, url: str) -> Optional[TokenBucket]:
+        host = urlparse(url).hostname or url
+        rate = self.limits.get(host, self.default_rate)
+        if not rate:
+            return None
+        with self.lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(rate, max(1.0, rate * self.burst))
+            return self.buckets[host]
+
+    def reserve(self, url: str) -> float:
+        bucket = self.bucket(url)
+        delay = bucket.reserve() if bucket else 0.0
+        if delay:
+            metrics.incr('ratelimit.delayed')
+        return delay
+
+    async def acquire(self, url: str) -> None:
+        """Wait until a request to `url`'s host fits its budget"""
+        delay = self.reserve(url)
+        if delay:
+            await asyncio.sleep(delay)
+
+    def acquire_sync(self, url: str) -> None:
+        """Blocking acquire() for synchronous clients"""
+        delay = self.reserve(url)
+        if delay:
+            time.sleep(delay)
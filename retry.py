@@ -0,0 +1,73 @@
+import asyncio
+import random
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import metrics
+from errors import ErrorClass, classify
+from logger import logger
+
+T = TypeVar('T')
+
+
+class RetryPolicy:
+    def __init__(self, attempts: int, base_delay: float, max_delay: float):
+        """
+        How often and how fast to retry one class of error
+
+        :param attempts: Total attempts, including the first one
+        :param base_delay: Backoff in seconds before the first retry, doubled for every further retry
+        :param max_delay: Upper bound of the backoff in seconds
+        """
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int) -> float:
+        """Full-jitter exponential backoff after `attempt` failed attempts"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+POLICIES = {
+    ErrorClass.TRANSIENT: RetryPolicy(attempts=5, base_delay=0.05, max_delay=2),  # Dropped connection, 5xx
+    ErrorClass.RATE_LIMIT: RetryPolicy(attempts=5, base_delay=1, max_delay=30),
+    ErrorClass.NONCE: RetryPolicy(attempts=3, base_delay=0.2, max_delay=2),  # Rebuilt with a fresh nonce
+    ErrorClass.FEE: RetryPolicy(attempts=3, base_delay=0.2, max_delay=2),  # Rebuilt with fresh fees and gas
+    ErrorClass.FUNDING: RetryPolicy(attempts=2, base_delay=2, max_delay=5),  # Once, after the wallet was funded
+    ErrorClass.UNKNOWN: RetryPolicy(attempts=3, base_delay=1, max_delay=10),
+    ErrorClass.REVERT: RetryPolicy(attempts=1, base_delay=0, max_delay=0),  # Deterministic, fail immediately
+}
+
+
+def retry_delay(error: Exception, attempt: int) -> Optional[float]:
+    """
+    Seconds to wait before retrying after `attempt` failed attempts, the last one failing with `error`
+
+    Returns None when the error's class has no attempts left. Every decision is counted in metrics
+    as retry.<class> or retry.<class>_gave_up.
+    """
+    error_class = classify(error)
+    if attempt >= POLICIES[error_class].attempts:
+        metrics.incr(f"retry.{error_class.value}_gave_up")
+        return None
+    metrics.incr(f"retry.{error_class.value}")
+    return POLICIES[error_class].delay(attempt)
+
+
+async def retry(operation: Callable[[], Awaitable[T]], label: str = "operation") -> T:
+    """
+    Await `operation()` until it succeeds or its error class runs out of attempts
+
+    `operation` is called again for every attempt, so anything it builds (nonce, fees, gas) is fresh.
+    The last error is raised when giving up.
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            return await operation()
+        except Exception as e:
+            delay = retry_delay(e, attempt)
+            if delay is None:
+                raise
+            logger.warning(f"{label} failed ({classify(e).value}): {str(e)[:120]}. Retry {attempt} in {delay:.2f}s")
+            await asyncio.sleep(delay)
@@ -0,0 +1,139 @@
+import json
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from web3.middleware import Web3Middleware
+
+import metrics
+
+FOREVER = float('inf')
+PER_BLOCK = 1.0  # Seconds, about one Monad block
+CONNECTIVITY = 30.0  # Seconds a successful connectivity check is trusted
+
+# Seconds a response stays valid per JSON-RPC method. Anything not listed (sends, balances, nonces,
+# receipts, estimates...) is never cached.
+METHOD_TTLS = {
+    'eth_chainId': FOREVER,
+    'net_version': FOREVER,
+    'web3_clientVersion': CONNECTIVITY,
+    'eth_blockNumber': PER_BLOCK,
+    'eth_gasPrice': PER_BLOCK,
+    'eth_maxPriorityFeePerGas': PER_BLOCK,
+    'eth_feeHistory': PER_BLOCK,
+}
+
+# ERC20 metadata selectors: name(), symbol(), decimals()
+TOKEN_METADATA_SELECTORS = {'0x06fdde03', '0x95d89b41', '0x313ce567'}
+
+
+def method_ttl(method: str, params: Any) -> Optional[float]:
+    """How long a response may be served from cache, or None if it must never be cached"""
+    if method in METHOD_TTLS:
+        return METHOD_TTLS[method]
+    if method == 'eth_getBlockByNumber' and params and params[0] == 'latest':
+        return PER_BLOCK
+    if method == 'eth_call' and params:
+        data = str(params[0].get('data') or params[0].get('input') or '')
+        if data[:10].lower() in TOKEN_METADATA_SELECTORS:
+            return FOREVER
+    return None
+
+
+class ResponseCache:
+    def __init__(self):
+        """Process-wide store of RPC responses shared by every Web3 instance"""
+        self.entries: Dict[Tuple[str, str, str], Tuple[float, Any]] = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(endpoint: str, method: str, params: Any) -> Tuple[str, str, str]:
+        return endpoint, method, json.dumps(params, sort_keys=True, default=str)
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def put(self, key, ttl: float, response) -> None:
+        if 'error' in response:
+            return
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, response)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+
+response_cache = ResponseCache()
+
+
+def _connectivity_key(w3) -> Tuple[str, str, str]:
+    return ResponseCache.key(getattr(w3.provider, 'endpoint_uri', ''), 'is_connected', [])
+
+
+async def is_connected(w3) -> bool:
+    """w3.is_connected() for an AsyncWeb3, remembered for CONNECTIVITY seconds per endpoint"""
+    # Providers answer is_connected() themselves, below the middleware stack
+    key = _connectivity_key(w3)
+    if response_cache.get(key) is not None:
+        metrics.incr('rpc_cache.hit')
+        return True
+    metrics.incr('rpc_cache.miss')
+    connected = await w3.is_connected()
+    if connected:
+        response_cache.put(key, CONNECTIVITY, {'result': True})
+    return connected
+
+
+def is_connected_sync(w3) -> bool:
+    """is_connected() for a sync Web3"""
+    key = _connectivity_key(w3)
+    if response_cache.get(key) is not None:
+        metrics.incr('rpc_cache.hit')
+        return True
+    metrics.incr('rpc_cache.miss')
+    connected = w3.is_connected()
+    if connected:
+        response_cache.put(key, CONNECTIVITY, {'result': True})
+    return connected
+
+
+class RpcCacheMiddleware(Web3Middleware):
+    """Serve immutable and per-block RPC responses from `response_cache`"""
+
+    def _lookup(self, method, params):
+        ttl = method_ttl(method, params)
+        if ttl is None:
+            return None, None, None
+        key = ResponseCache.key(getattr(self._w3.provider, 'endpoint_uri', ''), method, params)
+        cached = response_cache.get(key)
+        metrics.incr('rpc_cache.hit' if cached is not None else 'rpc_cache.miss')
+        return ttl, key, cached
+
+    def wrap_make_request(self, make_request):
+        def middleware(method, params):
+            ttl, key, cached = self._lookup(method, params)
+            if cached is not None:
+                return cached
+            response = make_request(method, params)
+            if ttl is not None:
+                response_cache.put(key, ttl, response)
+            return response
+
+        return middleware
+
+    async def async_wrap_make_request(self, make_request):
+        async def middleware(method, params):
+            ttl, key, cached = self._lookup(method, params)
+            if cached is not None:
+                return cached
+            response = await make_request(method, params)
+            if ttl is not None:
+                response_cache.put(key, ttl, response)
+            return response
+
+        return middleware
@@ -0,0 +1,185 @@
+import json
+import threading
+import time
+from collections import deque
+from typing import Callable, List, Optional
+
+from web3 import AsyncHTTPProvider, HTTPProvider
+
+import metrics
+from errors import ErrorClass, classify
+from ratelimit import HostRateLimiter
+
+# Methods sent to the connection's pinned endpoint, so nonces are read where transactions are sent
+PINNED_METHODS = {'eth_sendRawTransaction', 'eth_sendTransaction', 'eth_getTransactionCount'}
+BATCH = 'batch'  # Routed like a read
+
+
+def _batch_response(response):
+    if not isinstance(response, list):
+        # RPC errors return only one response with the error object
+        return response
+    # Servers may answer a batch in any order, web3 pairs the results with its requests by position
+    if all(isinstance(item, dict) and 'id' in item for item in response):
+        return sorted(response, key=lambda item: item['id'])
+    return response
+
+
+class Endpoint:
+    def __init__(self, url: str, window: int):
+        self.url = url
+        self.samples = deque(maxlen=window)  # True for a healthy response, False for a failure
+        self.latency: Optional[float] = None  # Moving average of healthy response times in seconds
+        self.open_until = 0.0  # Circuit breaker: not routed to before this monotonic time
+
+    @property
+    def error_rate(self) -> float:
+        return self.samples.count(False) / len(self.samples) if self.samples else 0.0
+
+    def is_open(self, now: float) -> bool:
+        return now < self.open_until
+
+
+class RpcRouter:
+    def __init__(self, urls: List[str], window=20, alpha=0.2, max_error_rate=0.5, min_samples=5, cooldown=30.0,
+                 max_failover=3, limiter: Optional[HostRateLimiter] = None):
+        """
+        Route JSON-RPC requests over several endpoints by rolling latency and error rate
+
+        Reads go to the fastest endpoint whose circuit breaker is closed and fail over to the next one
+        on transport errors, 5xx and rate limits. Sends stick to the endpoint pinned by their connection.
+        An endpoint whose error rate over the window reaches `max_error_rate` is skipped for `cooldown`
+        seconds, then tried again with a fresh window.
+
+        :param urls: RPC endpoints, each tried once before they are ranked by measured latency
+        :param window: Number of recent responses the error rate is computed over
+        :param alpha: Weight of the newest sample in the latency moving average
+        :param max_error_rate: Error rate that trips the circuit breaker
+        :param min_samples: Responses needed before the breaker can trip
+        :param cooldown: Seconds a tripped endpoint is skipped
+        :param max_failover: Endpoints tried for one read
+        :param limiter: Per-host request budgets acquired before every request
+        """
+        self.endpoints = [Endpoint(url, window) for url in urls]
+        self.alpha = alpha
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self.max_failover = max_failover
+        self.limiter = limiter or HostRateLimiter({})
+        self.listeners: List[Callable[[float, bool], None]] = []  # Called with every (latency, ok) sample
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _rank(endpoint: Endpoint):
+        if endpoint.latency is not None:
+            return 0, endpoint.latency
+        # Never tried: first, so it gets measured. Only failures so far: after every measured one
+        return (0, 0.0) if not endpoint.samples else (1, 0.0)
+
+    def ranked(self) -> List[Endpoint]:
+        """Endpoints with a closed breaker, fastest first; untried ones first so they get measured"""
+        now = time.monotonic()
+        with self.lock:
+            healthy = [e for e in self.endpoints if not e.is_open(now)] or list(self.endpoints)
+            return sorted(healthy, key=self._rank)
+
+    def pin(self, connection) -> Endpoint:
+        """Endpoint the connection sends through, re-pinned when its breaker trips"""
+        pinned = getattr(connection, 'pinned_endpoint', None)
+        if pinned is None or pinned.is_open(time.monotonic()):
+            pinned = self.ranked()[0]
+            connection.pinned_endpoint = pinned
+        return pinned
+
+    def candidates(self, method: str, connection) -> List[Endpoint]:
+        if method in PINNED_METHODS:
+            return [self.pin(connection)]
+        return self.ranked()[:self.max_failover]
+
+    def record(self, endpoint: Endpoint, latency: float, ok: bool) -> None:
+        with self.lock:
+            endpoint.samples.append(ok)
+            if ok:
+                endpoint.latency = latency if endpoint.latency is None else (
+                        self.alpha * latency + (1 - self.alpha) * endpoint.latency)
+            elif len(endpoint.samples) >= self.min_samples and endpoint.error_rate >= self.max_error_rate:
+                endpoint.open_until = time.monotonic() + self.cooldown
+                endpoint.samples.clear()
+                metrics.incr('rpc_router.breaker_open')
+        metrics.incr('rpc_router.ok' if ok else 'rpc_router.failure')
+        for listener in self.listeners:
+            listener(latency, ok)
+
+    @staticmethod
+    def healthy_response(raw: bytes) -> bool:
+        """False for JSON-RPC errors that reflect the endpoint (rate limits, overload), not the request"""
+        if b'"error"' not in raw:
+            return True
+        try:
+            error = json.loads(raw).get('error') or {}
+        except (ValueError, AttributeError):
+            return True
+        exc = Exception(error.get('message', ''))
+        exc.rpc_response = {'error': error}
+        return classify(exc) not in (ErrorClass.RATE_LIMIT, ErrorClass.TRANSIENT)
+
+
+class RoutedHTTPProvider(HTTPProvider):
+    def __init__(self, router: RpcRouter, request_kwargs=None):
+        """HTTPProvider that sends every request through `router`"""
+        super().__init__(router.endpoints[0].url, request_kwargs=request_kwargs, exception_retry_configuration=None)
+        self.router = router
+        self.pinned_endpoint: Optional[Endpoint] = None
+
+    def _make_request(self, method, request_data: bytes) -> bytes:
+        candidates = self.router.candidates(method, self)
+        for attempt, endpoint in enumerate(candidates, 1):
+            self.router.limiter.acquire_sync(endpoint.url)
+            start = time.monotonic()
+            try:
+                raw = self._request_session_manager.make_post_request(
+                    endpoint.url, request_data, **self.get_request_kwargs())
+            except Exception:
+                self.router.record(endpoint, time.monotonic() - start, False)
+                if attempt == len(candidates):
+                    raise
+                continue
+            ok = self.router.healthy_response(raw)
+            self.router.record(endpoint, time.monotonic() - start, ok)
+            if ok or attempt == len(candidates):
+                return raw
+
+    def make_batch_request(self, batch_requests):
+        raw = self._make_request(BATCH, self.encode_batch_rpc_request(batch_requests))
+        return _batch_response(self.decode_rpc_response(raw))
+
+
+class RoutedAsyncHTTPProvider(AsyncHTTPProvider):
+    def __init__(self, router: RpcRouter, request_kwargs=None):
+        """AsyncHTTPProvider that sends every request through `router`"""
+        super().__init__(router.endpoints[0].url, request_kwargs=request_kwargs, exception_retry_configuration=None)
+        self.router = router
+        self.pinned_endpoint: Optional[Endpoint] = None
+
+    async def _make_request(self, method, request_data: bytes) -> bytes:
+        candidates = self.router.candidates(method, self)
+        for attempt, endpoint in enumerate(candidates, 1):
+            await self.router.limiter.acquire(endpoint.url)
+            start = time.monotonic()
+            try:
+                raw = await self._request_session_manager.async_make_post_request(
+                    endpoint.url, request_data, **self.get_request_kwargs())
+            except Exception:
+                self.router.record(endpoint, time.monotonic() - start, False)
+                if attempt == len(candidates):
+                    raise
+                continue
+            ok = self.router.healthy_response(raw)
+            self.router.record(endpoint, time.monotonic() - start, ok)
+            if ok or attempt == len(candidates):
+                return raw
+
+    async def make_batch_request(self, batch_requests):
+        raw = await self._make_request(BATCH, self.encode_batch_rpc_request(batch_requests))
+        return _batch_response(self.decode_rpc_response(raw))
@@ -1,14 +1,26 @@
-import requests
-import time
+import aiohttp
+from eth_account import Account
 from eth_account.messages import encode_defunct
 from headers import get_phantom_headers
 from src.stakers import MonadStaker
+from src.monorail import HTTP_TIMEOUT, balance_service
 import asyncio
+import base64
+import json
 import logging
+import time
 from web3.exceptions import Web3RPCError
 import random
+import metrics
 
-from utils import timeout, color_print, get_web3_connection, data, private_keys
+from utils import (timeout, color_print, get_web3_connection, data, private_keys, PIPELINED_TXS,
+                   rate_limiter, account_limiter, log_account_failures)
+from gas import gas_model
+from balances import wallet_balances
+from fees import fee_oracle
+from state import load_state, save_state
+from errors import ErrorClass, classify
+from retry import retry
 
 
 # Constants
@@ -18,19 +30,135 @@ COUNTRIES_TO_VOTE = data["AICRAFT"]["countryCodeToVote"]
 
 FUND_AMT = data["FUND_AMOUNT"]
 FUNDER_PRIVATE_KEY = data["FUNDER_PRIVATE_KEY"]
+CANDIDATES_TTL = 600  # Seconds before the candidate list is revalidated with its ETag
+AUTH_TOKEN_MARGIN = 300  # Seconds before expiry a cached auth token is no longer reused
+VOTE_CONFIRMED = 201  # statusCode of a confirmation the API recorded the vote for
+
+
+def _jwt_expiry(token):
+    """`exp` claim of a JWT (unverified), or None if it can't be read"""
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        return json.loads(base64.urlsafe_b64decode(payload)).get('exp')
+    except (IndexError, ValueError, AttributeError):
+        return None
+
+
+class AuthTokenCache:
+    def __init__(self, name="aicraft_tokens", margin=AUTH_TOKEN_MARGIN):
+        """
+        Persistent wallet -> AICraft auth token store, so a run doesn't sign in every account again
+
+        Args:
+            name: State file the tokens are stored in (state/<name>.json)
+            margin: Seconds before expiry a token is considered expired
+        """
+        self.name = name
+        self.margin = margin
+        self.tokens = load_state(name, {})
+
+    def get(self, address):
+        """Cached token that is still valid for at least `margin` seconds, or None"""
+        entry = self.tokens.get(address.lower())
+        if entry and entry['expires_at'] - time.time() > self.margin:
+            return entry['token']
+        return None
+
+    def set(self, address, token):
+        expires_at = _jwt_expiry(token)
+        if expires_at is None:
+            return  # Unknown lifetime, only used for this session
+        self.tokens[address.lower()] = {"token": token, "expires_at": expires_at}
+        save_state(self.name, self.tokens)
+
+    def forget(self, address):
+        """Drop a token the API rejected"""
+        if self.tokens.pop(address.lower(), None) is not None:
+            save_state(self.name, self.tokens)
+
+
+auth_tokens = AuthTokenCache()
+
+
+class CandidateIndex:
+    def __init__(self, ttl=CANDIDATES_TTL):
+        """
+        Candidate list of each project, fetched once and shared by every account
+
+        Candidates are ranked by feed count and grouped by country code, so picking a vote target is a
+        dict lookup instead of a full download plus filter and sort. Stale lists are revalidated with
+        If-None-Match; concurrent callers wait on the same request.
+
+        Args:
+            ttl: Seconds a list is used before it is revalidated
+        """
+        self.ttl = ttl
+        self.projects = {}  # project_id -> {"ranked", "by_country", "etag", "fetched_at"}
+        self.locks = {}
+
+    def _build(self, candidate_list):
+        ranked = sorted(candidate_list, key=lambda x: x['feedCount'], reverse=True)
+        by_country = {}
+        for candidate in ranked:
+            country_code = candidate.get('metadata', {}).get('countryCode')
+            if country_code:
+                by_country.setdefault(country_code, []).append(candidate)
+        return ranked, by_country
+
+    async def get(self, ai_craft, project_id):
+        """Fresh index entry for a project, fetching or revalidating it through `ai_craft` if needed"""
+        entry = self.projects.get(project_id)
+        if entry and time.monotonic() - entry['fetched_at'] < self.ttl:
+            return entry
+
+        async with self.locks.setdefault(project_id, asyncio.Lock()):
+            entry = self.projects.get(project_id)
+            if entry and time.monotonic() - entry['fetched_at'] < self.ttl:
+                return entry  # Refreshed while we were waiting
+
+            status, candidates, etag = await ai_craft.fetch_candidates(project_id, entry and entry['etag'])
+            if status == 304 and entry:
+                metrics.incr('candidates.not_modified')
+                entry['fetched_at'] = time.monotonic()
+                return entry
+
+            metrics.incr('candidates.fetch')
+
+            ranked, by_country = self._build(candidates['data'])
+            entry = {"ranked": ranked, "by_country": by_country, "etag": etag, "fetched_at": time.monotonic()}
+            self.projects[project_id] = entry
+            return entry
+
+    async def top(self, ai_craft, project_id, category=None, limit=10):
+        """Top candidates by feed count, optionally filtered by category"""
+        ranked = (await self.get(ai_craft, project_id))['ranked']
+        if category:
+            ranked = [c for c in ranked if c['category']['name'] == category]
+        return ranked[:limit]
+
+    async def top_for_country(self, ai_craft, project_id, country_code):
+        """Candidate with the most feeds in a country, or None"""
+        country_candidates = (await self.get(ai_craft, project_id))['by_country'].get(country_code)
+        return country_candidates[0] if country_candidates else None
+
+
+# Shared by all accounts of the run
+candidate_index = CandidateIndex()
 
 
 class AiCraftFun(MonadStaker):
-    def __init__(self, w3, private_key):
+    def __init__(self, w3, private_key, session=None):
         """
         Initialize aicraft.fun with your private key
 
         Args:
-            w3: Web3 instance connected to Monad testnet
+            w3: AsyncWeb3 instance connected to Monad testnet
             private_key (str): Private key of wallet you want to automate
+            session: Shared aiohttp session used for the AICraft and Monorail APIs
 
         """
-        super().__init__(w3, private_key)  # Call parent constructor
+        super().__init__(w3, private_key, session)  # Call parent constructor
 
         self.w3 = w3
         self.private_key = private_key
@@ -38,7 +166,10 @@ class AiCraftFun(MonadStaker):
         self.display_address = f"{self.wallet_address[:4]}...{self.wallet_address[-4:]}"
         self.base_url = "https://api.aicraft.fun"
         self.token = None
+        self.ref_code = None
         self.headers = get_phantom_headers()
+        self.user = None  # Last known /users/me data, kept current from our own votes
+        self.referral_applied = False
 
     def sign_message(self, message):
         """Sign a message with the private key"""
@@ -46,70 +177,116 @@ class AiCraftFun(MonadStaker):
         signed_message = self.w3.eth.account.sign_message(message_hash, private_key=self.private_key)
         return '0x' + signed_message.signature.hex()
 
-    def send_transaction(self, contract_address, abi, function_name, params):
+    async def _request(self, method, url, payload=None, headers=None):
+        """Send a request to the AICraft API and return (status, json body), signing in again once on 401"""
+        status, data, _ = await self._exchange(method, url, payload, headers)
+        return status, data
+
+    async def _exchange(self, method, url, payload=None, headers=None, extra_headers=None):
+        """
+        _request() that also returns the response headers. `extra_headers` (e.g. If-None-Match) are sent
+        on top of `headers`, and still on top of the fresh auth headers when retrying after a 401
+        """
+        if self.session is None:
+            raise ValueError("An aiohttp session is required for AICraft API calls")
+
+        async def send(request_headers):
+            if extra_headers:
+                request_headers = {**(request_headers or {}), **extra_headers}
+            await rate_limiter.acquire(url)
+            async with self.session.request(method, url, json=payload, headers=request_headers,
+                                            timeout=HTTP_TIMEOUT) as response:
+                # A 304 has no body, which reads as None
+                return response.status, await response.json(content_type=None), response.headers
+
+        status, data, response_headers = await send(headers)
+        if status == 401 and headers is self.headers and self.token:
+            # Cached or expired token rejected, get a fresh one and retry
+            logging.info(f"Account {self.display_address}: Auth token rejected, signing in again")
+            auth_tokens.forget(self.wallet_address)
+            await self.sign_in(self.ref_code)
+            status, data, response_headers = await send(self.headers)
+        return status, data, response_headers
+
+    def _use_token(self, token):
+        self.token = token
+        self.headers["Authorization"] = f"Bearer {self.token}"
+        self.user = None
+
+    async def ensure_signed_in(self, ref_code=None):
+        """Reuse this wallet's cached auth token when still valid, otherwise sign in"""
+        if ref_code:
+            self.ref_code = ref_code
+        if self.token:
+            return
+        token = auth_tokens.get(self.wallet_address)
+        if token:
+            metrics.incr('aicraft.token_reused')
+            self._use_token(token)
+            return
+        await self.sign_in(self.ref_code)
+
+    async def send_call(self, function_call, nonce=None):
+        """Build, sign and send a contract call without waiting for it. Returns (tx, tx_hash)"""
+        # Get current gas price from the shared fee oracle
+        gas_price = await fee_oracle.gas_price(self.w3)
+
+        # Build transaction
+        if nonce is None:
+            nonce = await self.w3.eth.get_transaction_count(self.wallet_address)
+        tx = await function_call.build_transaction(gas_model.with_limit(function_call, {
+            'from': self.wallet_address,
+            'nonce': nonce,
+            'gasPrice': gas_price
+        }))
+
+        # Sign and send transaction
+        signed_tx = self.w3.eth.account.sign_transaction(tx, private_key=self.private_key)
+        tx_hash = await self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+        logging.info(f"Account {self.display_address}: Bal. {await self.get_bal()} MON.  Tx #{nonce} sent!: 0x{tx_hash.hex()}")
+        return tx, tx_hash
+
+    async def wait_call(self, tx, tx_hash):
+        """Wait for a transaction sent with send_call to be mined and return its receipt"""
+        logging.info(f"Account {self.display_address}: Waiting for transaction to be mined...")
+        receipt = await self.w3.eth.wait_for_transaction_receipt(tx_hash, timeout=120)
+        gas_model.observe(tx, receipt)
+        wallet_balances.observe(tx, receipt)
+        eth_spent = self.w3.from_wei(receipt.gasUsed * receipt.effectiveGasPrice, 'ether')
+
+        logging.info(
+            f"Account {self.display_address}: Transaction mined! "
+            f"Status: {'Success' if receipt.status == 1 else 'Failed'}. Fees: {eth_spent:.5f} MON")
+        return receipt
+
+    async def send_transaction(self, contract_address, abi, function_name, params):
         """Build and send a transaction to the blockchain"""
         try:
             # Convert contract address to checksum format
             checksum_address = self.w3.to_checksum_address(contract_address)
             contract = self.w3.eth.contract(address=checksum_address, abi=abi)
 
-            # Get function from contract
-            contract_function = getattr(contract.functions, function_name)
-
             # Build function call with parameters
-            function_call = contract_function(*params)
-
-            # Get current gas price with a slight increase
-            gas_price = self.w3.eth.gas_price
-
-            # Build transaction
-            nonce = self.w3.eth.get_transaction_count(self.wallet_address)
-            tx = function_call.build_transaction({
-                'from': self.wallet_address,
-                'nonce': nonce,
-                'gasPrice': gas_price
-            })
-
-            estimated_gas = self.w3.eth.estimate_gas(tx)
-            tx['gas'] = estimated_gas
-
-            # Sign transaction
-            signed_tx = self.w3.eth.account.sign_transaction(tx, private_key=self.private_key)
+            function_call = getattr(contract.functions, function_name)(*params)
 
-            # Send transaction
-            tx_hash = self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
-            tx_hash_hex = '0x' + tx_hash.hex()
-
-            # Wait for transaction to be mined
-            logging.info(f"Account {self.display_address}: Bal. {self.get_bal()} MON.  Tx #{nonce} sent!: {tx_hash_hex}")
-            logging.info(f"Account {self.display_address}: Waiting for transaction to be mined...")
-            receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash, timeout=120)
-            gas_used = receipt.gasUsed
-            gas_price = self.w3.eth.gas_price
-            eth_spent = self.w3.from_wei(gas_used * gas_price, 'ether')
-
-            logging.info(
-                f"Account {self.display_address}: Transaction mined! "
-                f"Status: {'Success' if receipt.status == 1 else 'Failed'}. Fees: {eth_spent:.5f} MON")
-
-            # Return transaction hash
-            return tx_hash_hex
+            tx, tx_hash = await self.send_call(function_call)
+            await self.wait_call(tx, tx_hash)
+            return '0x' + tx_hash.hex()
 
         except Exception as e:
             logging.error(f"Error in transaction: {str(e)}")
             raise e
 
-    def get_sign_in_msg(self):
+    async def get_sign_in_msg(self):
         """Get the sign-in message to be signed"""
         url = f"{self.base_url}/auths/wallets/sign-in/message?address={self.wallet_address}&type=ETHEREUM_BASED"
-        response = requests.get(url)
-        data = response.json()
+        _, data = await self._request("GET", url)
         return data['data']['message']
 
-    def sign_in(self, ref_code=None):
+    async def sign_in(self, ref_code=None):
         """Sign in to get auth token using wallet signature"""
         # Get message to sign
-        message = self.get_sign_in_msg()
+        message = await self.get_sign_in_msg()
 
         # Sign the message with private key
         signature = self.sign_message(message)
@@ -124,44 +301,64 @@ class AiCraftFun(MonadStaker):
 
         # Add referral code if provided
         if ref_code:
+            self.ref_code = ref_code
             payload["refCode"] = ref_code
 
         # Send sign-in request
         url = f"{self.base_url}/auths/wallets/sign-in"
-        response = requests.post(url, json=payload)
+        status, data = await self._request("POST", url, payload)
 
-        if response.status_code == 200 or response.status_code == 201:
+        if status == 200 or status == 201:
             logging.info(f"Account {self.display_address}: User sign in success!")
-            data = response.json()
         else:
-            raise Exception(f"Error during sign in {response.status_code} {response.text}")
+            raise Exception(f"Error during sign in {status} {data}")
 
         # Store token for future requests
-        self.token = data['data']['token']
-        self.headers["Authorization"] = f"Bearer {self.token}"
+        metrics.incr('aicraft.sign_in')
+        self._use_token(data['data']['token'])
+        auth_tokens.set(self.wallet_address, self.token)
 
         return data
 
-    def get_candidates(self, project_id):
+    async def get_candidates(self, project_id):
         """Get list of candidates for a specific project"""
         url = f"{self.base_url}/candidates?projectID={project_id}"
-        response = requests.get(url, headers=self.headers)
-        return response.json()
+        _, data = await self._request("GET", url, headers=self.headers)
+        return data
 
-    def set_referral_code(self, ref_code):
+    async def fetch_candidates(self, project_id, etag=None):
+        """Get the candidate list, revalidating with `etag`. Returns (status, data, etag); data is None on 304"""
+        url = f"{self.base_url}/candidates?projectID={project_id}"
+        status, data, headers = await self._exchange("GET", url, headers=self.headers,
+                                                     extra_headers={"If-None-Match": etag} if etag else None)
+        if status == 304:
+            return 304, None, etag
+        if status != 200:
+            raise Exception(f"Error fetching candidates {status}")
+        return status, data, headers.get("ETag")
+
+    async def set_referral_code(self, ref_code):
         """Set referral code for user"""
         url = f"{self.base_url}/users/referral"
         payload = {"refCode": ref_code}
-        response = requests.post(url, json=payload, headers=self.headers)
-        return response.json()
+        _, data = await self._request("POST", url, payload, headers=self.headers)
+        return data
 
-    def get_user_info(self):
+    async def get_user_info(self):
         """Get user information including wallet ID needed for voting"""
         url = f"{self.base_url}/users/me?includePresalePurchasedAmount=true"
-        response = requests.get(url, headers=self.headers)
-        return response.json()
+        status, data = await self._request("GET", url, headers=self.headers)
+        if status == 200:
+            self.user = data['data']
+        return data
 
-    def create_feed_order(self, candidate_id, wallet_id, feed_amount=1, chain_id="10143", ref_code=None):
+    async def user_state(self, refresh=False):
+        """Known user state (wallet ID, todayFeedCount, point...), fetched only when unknown or on `refresh`"""
+        if self.user is None or refresh:
+            await self.get_user_info()
+        return self.user
+
+    async def create_feed_order(self, candidate_id, wallet_id, feed_amount=1, chain_id="10143", ref_code=None):
         """Create a feed order to get transaction data for voting"""
         url = f"{self.base_url}/feeds/orders"
         payload = {
@@ -174,10 +371,10 @@ class AiCraftFun(MonadStaker):
         if ref_code:
             payload["refCode"] = ref_code
 
-        response = requests.post(url, json=payload, headers=self.headers)
-        return response.json()
+        _, data = await self._request("POST", url, payload, headers=self.headers)
+        return data
 
-    def confirm_transaction(self, order_id, tx_hash, ref_code=None):
+    async def confirm_transaction(self, order_id, tx_hash, ref_code=None):
         """Confirm transaction after sending to blockchain"""
         url = f"{self.base_url}/feeds/orders/{order_id}/confirm"
         payload = {
@@ -187,30 +384,31 @@ class AiCraftFun(MonadStaker):
         if ref_code:
             payload["refCode"] = ref_code
 
-        response = requests.post(url, json=payload, headers=self.headers)
-        return response.json()
+        _, data = await self._request("POST", url, payload, headers=self.headers)
+        return data
 
-    def vote_for_candidate(self, candidate_id, ref_code=None, feed_amount=1):
-        """Complete full voting process for a candidate with proper message signing"""
+    async def create_vote_order(self, candidate_id, ref_code=None, feed_amount=1):
+        """Create a feed order and sign it. Returns (order ID, contract call that pays for the order)"""
         # 1. Ensure we're signed in
-        if not self.token:
-            self.sign_in(ref_code)
+        await self.ensure_signed_in(ref_code)
 
         # 2. Get user info to find wallet ID
-        user_info = self.get_user_info()
-        wallet_id = user_info['data']['wallets'][0]['_id']
+        user = await self.user_state()
+        wallet_id = user['wallets'][0]['_id']
 
-        # 3. Set referral code if provided
-        if ref_code:
-            self.set_referral_code(ref_code)
+        # 3. Set referral code if provided, once per session
+        if ref_code and not self.referral_applied:
+            await self.set_referral_code(ref_code)
+            self.referral_applied = True
 
-        # 4. Check if your daily votes have been exceeded
-        daily_feed_count = user_info['data'].get('todayFeedCount', 0)
+        # 4. Check if your daily votes have been exceeded, and reserve one
+        daily_feed_count = user.get('todayFeedCount', 0)
         if daily_feed_count <= 0:
             raise Exception(f"Cannot create order! You've exceeded your remaining vote count")
+        user['todayFeedCount'] = daily_feed_count - 1
 
         # 5. Create feed/vote order to get transaction data
-        order_response = self.create_feed_order(
+        order_response = await self.create_feed_order(
             candidate_id=candidate_id,
             wallet_id=wallet_id,
             feed_amount=feed_amount,
@@ -242,60 +440,111 @@ class AiCraftFun(MonadStaker):
             bytes.fromhex(payment_data['params']['integritySignature'][2:])
         ]
 
-        contract_address = self.w3.to_checksum_address(contract_address)
+        contract = self.w3.eth.contract(address=self.w3.to_checksum_address(contract_address), abi=abi)
+        function_call = getattr(contract.functions, function_name)(*params)
+        return payment_data['params']['requestID'], function_call
 
-        # Send transaction to blockchain
-        tx_hash = self.send_transaction(
-            contract_address=contract_address,
-            abi=abi,
-            function_name=function_name,
-            params=params
-        )
+    async def confirm_vote(self, order_id, tx, tx_hash, ref_code=None):
+        """Wait for a vote transaction and confirm it with the API, retrying the confirmation on its own"""
+        await self.wait_call(tx, tx_hash)
 
-        # Confirm transaction in API
-        order_id = payment_data['params']['requestID']
-        confirmation = self.confirm_transaction(
-            order_id=order_id,
-            tx_hash=tx_hash,
-            ref_code=ref_code
-        )
+        async def confirm():
+            confirmation = await self.confirm_transaction(order_id=order_id, tx_hash='0x' + tx_hash.hex(),
+                                                          ref_code=ref_code)
+            if confirmation.get("statusCode") != VOTE_CONFIRMED:
+                raise Exception(f"Vote confirmation returned {confirmation.get('statusCode')}")
+            return confirmation
 
-        if confirmation["statusCode"] == 201:
-            user_info = self.get_user_info()  # get updated points
+        # Backoff and attempts come from the retry policy of the failure's class
+        try:
+            confirmation = await retry(confirm, f"Account {self.display_address}: Vote confirmation")
+        except Exception as e:
+            logging.warning(f"Account {self.display_address}: Vote confirmation failed: {e}")
+            confirmation = None
 
-        points = user_info['data']["point"]
-        today_feed_count = user_info['data']["todayFeedCount"]
-        logging.info(f"Account {self.display_address}: Point {points} | Votes left {today_feed_count}")
+        if confirmation is None:
+            self.user = None  # Unknown outcome, re-read on next use
+        elif self.user is not None:
+            logging.info(f"Account {self.display_address}: Votes left {self.user['todayFeedCount']}")
         return confirmation
 
-    def get_top_candidates(self, project_id, category=None, limit=10):
-        """Get top candidates by feed count, optionally filtered by category"""
-        candidates = self.get_candidates(project_id)
-        candidate_list = candidates['data']
+    async def vote_for_candidate(self, candidate_id, ref_code=None, feed_amount=1):
+        """Complete full voting process for a candidate with proper message signing"""
+        order_id, function_call = await self.create_vote_order(candidate_id, ref_code, feed_amount)
 
-        # Filter by category if specified
-        if category:
-            candidate_list = [c for c in candidate_list if c['category']['name'] == category]
+        # Send transaction to blockchain
+        try:
+            tx, tx_hash = await self.send_call(function_call)
+        except Exception as e:
+            logging.error(f"Error in transaction: {str(e)}")
+            raise e
+
+        # Confirm transaction in API
+        return await self.confirm_vote(order_id, tx, tx_hash, ref_code)
 
-        # Sort by feed count (votes)
-        sorted_candidates = sorted(candidate_list, key=lambda x: x['feedCount'], reverse=True)
+    async def vote_pipeline(self, project_id, ref_code, country_codes, feed_amount=1):
+        """
+        Vote for the top candidate of each country with order creation, sending and confirmation overlapped
+
+        The order for vote k+1 is created while vote k is being sent, and vote k-1 is mined and confirmed
+        in the background. Sends use consecutive nonces, so nothing waits for a receipt before the next
+        send. Returns the confirmations in vote order.
+        """
+        await self.ensure_signed_in(ref_code)
+        orders = asyncio.Queue(maxsize=1)
 
-        # Return top candidates
-        return sorted_candidates[:limit]
+        async def create_orders():
+            try:
+                for country_code in country_codes:
+                    candidate = await candidate_index.top_for_country(self, project_id, country_code)
+                    if candidate is None:
+                        logging.warning(f"Account {self.display_address}: No candidate found for {country_code}")
+                        continue
+                    logging.info(f"Account {self.display_address}: Prepping to vote {country_code}..")
+                    await orders.put(await self.create_vote_order(candidate['_id'], ref_code, feed_amount))
+            except asyncio.CancelledError:
+                raise  # Sending stopped, nothing waits for the end of the orders
+            except Exception:
+                await orders.put(None)  # Votes already ordered are still sent before the error surfaces
+                raise
+            await orders.put(None)
+
+        confirmations = []
+
+        async def send_votes():
+            nonce = await self.w3.eth.get_transaction_count(self.wallet_address, 'pending')
+            while (order := await orders.get()) is not None:
+                order_id, function_call = order
+                tx, tx_hash = await self.send_call(function_call, nonce)
+                nonce += 1
+                confirmations.append(asyncio.create_task(self.confirm_vote(order_id, tx, tx_hash, ref_code)))
+
+        creator = asyncio.create_task(create_orders())
+        try:
+            await send_votes()
+            await creator  # Done once the end of the orders was sent, raises if creating an order failed
+        finally:
+            # No-op once done; if sending failed, stops it waiting for room in the queue without an end marker
+            creator.cancel()
+            results = await asyncio.gather(*confirmations, return_exceptions=True)
+        return results
+
+    async def get_top_candidates(self, project_id, category=None, limit=10):
+        """Get top candidates by feed count, optionally filtered by category"""
+        return await candidate_index.top(self, project_id, category, limit)
 
-    def auto_vote(self, project_id, ref_code, top_n=5):
+    async def auto_vote(self, project_id, ref_code, top_n=5):
         """Automatically vote for top N candidates in a project"""
         # Sign in with referral code
-        if not self.token:
-            self.sign_in(ref_code)
+        await self.ensure_signed_in(ref_code)
 
         # Get top candidates
-        top_candidates = self.get_top_candidates(project_id, limit=top_n)
+        top_candidates = await self.get_top_candidates(project_id, limit=top_n)
 
         results = []
         for candidate in top_candidates:
             try:
-                result = self.vote_for_candidate(
+                result = await self.vote_for_candidate(
                     candidate_id=candidate['_id'],
                     ref_code=ref_code
                 )
@@ -304,8 +553,6 @@ class AiCraftFun(MonadStaker):
                     'success': True,
                     'result': result
                 })
-                # Sleep to avoid rate limiting
-                time.sleep(2)
             except Exception as e:
                 results.append({
                     'candidate': candidate['name'],
@@ -315,29 +562,18 @@ class AiCraftFun(MonadStaker):
 
         return results
 
-    def vote_by_country(self, project_id, ref_code, country_code, feed_amount=1):
+    async def vote_by_country(self, project_id, ref_code, country_code, feed_amount=1):
         """Vote for a candidate from a specific country"""
         # Sign in
-        if not self.token:
-            self.sign_in(ref_code)
+        await self.ensure_signed_in(ref_code)
 
-        # Get all candidates
-        candidates = self.get_candidates(project_id)
-        candidate_list = candidates['data']
-
-        # Find candidate from specified country
-        country_candidates = [c for c in candidate_list if 'metadata' in c and
-                              'countryCode' in c['metadata'] and
-                              c['metadata']['countryCode'] == country_code]
-
-        if not country_candidates:
+        # Top candidate of the country from the shared candidate index
+        top_candidate = await candidate_index.top_for_country(self, project_id, country_code)
+        if top_candidate is None:
             return {"success": False, "error": f"No candidate found for country code {country_code}"}
 
-        # Sort by feed count and pick the top one
-        top_candidate = sorted(country_candidates, key=lambda x: x['feedCount'], reverse=True)[0]
-
         # Vote for the candidate
-        result = self.vote_for_candidate(
+        result = await self.vote_for_candidate(
             candidate_id=top_candidate['_id'],
             ref_code=ref_code,
             feed_amount=feed_amount
@@ -349,15 +585,14 @@ class AiCraftFun(MonadStaker):
             "result": result
         }
 
-    def daily_votes(self, project_id, ref_code, countries=None):
+    async def daily_votes(self, project_id, ref_code, countries=None):
         """Use daily voting limit on specified countries or top candidates"""
         # Sign in
-        if not self.token:
-            self.sign_in(ref_code)
+        await self.ensure_signed_in(ref_code)
 
         # Get user info to check daily vote limit
-        user_info = self.get_user_info()
-        daily_feed_count = user_info['data'].get('todayFeedCount', 0)
+        user = await self.user_state()
+        daily_feed_count = user.get('todayFeedCount', 0)
         # remaining_votes = 20 - daily_feed_count  # Assuming 20 is the daily limit
         remaining_votes = daily_feed_count
 
@@ -371,15 +606,14 @@ class AiCraftFun(MonadStaker):
             # Vote for specific countries
             for vote in range(remaining_votes):
                 country = random.choice(countries)
-                result = self.vote_by_country(project_id, ref_code, country)
+                result = await self.vote_by_country(project_id, ref_code, country)
                 results.append(result)
-                time.sleep(2)  # Avoid rate limiting
         else:
             # Vote for top candidates
-            top_candidates = self.get_top_candidates(project_id, limit=remaining_votes)
+            top_candidates = await self.get_top_candidates(project_id, limit=remaining_votes)
             for candidate in top_candidates:
                 try:
-                    result = self.vote_for_candidate(
+                    result = await self.vote_for_candidate(
                         candidate_id=candidate['_id'],
                         ref_code=ref_code
                     )
@@ -388,7 +622,6 @@ class AiCraftFun(MonadStaker):
                         "candidate": candidate['name'],
                         "result": result
                     })
-                    time.sleep(2)  # Avoid rate limiting
                 except Exception as e:
                     results.append({
                         "success": False,
@@ -403,29 +636,40 @@ class AiCraftFun(MonadStaker):
         }
 
 
-async def ai_craft_voting(private_key):
+async def ai_craft_voting(private_key, session):
     while True:  # Infinite loop, till you interrupt
         try:
-            ai_craft = AiCraftFun(get_web3_connection(), private_key)
+            ai_craft = await AiCraftFun(get_web3_connection(use_async=True), private_key, session).connect()
 
-            # Sign in with a referral code
-            ai_craft.sign_in(ref_code=REFERRAL_CODE)
+            # Sign in with a referral code, or reuse this wallet's cached token
+            await ai_craft.ensure_signed_in(ref_code=REFERRAL_CODE)
 
             project_id = "678376133438e102d6ff5c6e"  # for all voting regions (Africa, South america, Asia) etc
             # Display balances for a specific address
-            ai_craft.display_wallet_balances()
+            await ai_craft.display_wallet_balances()
 
-            profile = ai_craft.get_user_info()
-            today_vote_count = profile['data']['todayFeedCount']
+            profile = await ai_craft.user_state()
+            today_vote_count = profile['todayFeedCount']
             if today_vote_count > DAILY_VOTES:
                 remaining_voting = DAILY_VOTES
             else:
                 remaining_voting = today_vote_count
-            if remaining_voting >= 0:
+            if remaining_voting <= 0:
+                logging.info(f"Account {ai_craft.display_address}: No AI Craft votes left today")
+                return
+            if PIPELINED_TXS:
+                country_codes = [random.choice(COUNTRIES_TO_VOTE) for _ in range(remaining_voting)]
+                results = await ai_craft.vote_pipeline(project_id, REFERRAL_CODE, country_codes)
+                confirmed = sum(1 for r in results if isinstance(r, dict) and r.get("statusCode") == VOTE_CONFIRMED)
+                logging.info(f"Account {ai_craft.display_address}: AI Craft votes confirmed: {confirmed}/{len(results)}")
+                profile = await ai_craft.user_state(refresh=True)
+                logging.info(f"Account {ai_craft.display_address}: Voting complete. Point {profile['point']}")
+                return
+            else:
                 for vote in range(remaining_voting):
                     country_code = random.choice(COUNTRIES_TO_VOTE)
                     logging.info(f"Account {ai_craft.display_address}: Prepping to vote {country_code}..")
-                    ai_craft.vote_by_country(
+                    await ai_craft.vote_by_country(
                         project_id=project_id,
                         ref_code=REFERRAL_CODE,
                         country_code=country_code
@@ -433,24 +677,22 @@ async def ai_craft_voting(private_key):
                     logging.info(f"Account {ai_craft.display_address}: AI Craft vote success! ({vote + 1})")
                     await timeout()  # Normal wait between swaps
 
-                logging.info(f"Account {ai_craft.display_address}: Voting complete.")
+                profile = await ai_craft.user_state(refresh=True)  # Points are only known server side
+                logging.info(f"Account {ai_craft.display_address}: Voting complete. Point {profile['point']}")
                 return
 
         except Web3RPCError as e:
-            error_list = ["intrinsic gas greater than limit", "Signer had insufficient balance"]
-            for error in error_list:
-                if error in str(e):
-                    logging.warning(
-                        f"Account {ai_craft.display_address}: Ai craft error: {error}..")
-                    # initialise funder
-                    funder = AiCraftFun(get_web3_connection(), FUNDER_PRIVATE_KEY)
-                    funder.send_base_tokens(ai_craft.wallet_address, FUND_AMT)
-                else:
-                    logging.error(f"Error in aicraft: {e}.")
-                    raise e
-
-
-async def run():
+            if classify(e) is ErrorClass.FUNDING:
+                logging.warning(f"Account {ai_craft.display_address}: Ai craft funding error: {e}..")
+                # initialise funder
+                funder = AiCraftFun(get_web3_connection(use_async=True), FUNDER_PRIVATE_KEY)
+                await funder.send_base_tokens(ai_craft.wallet_address, FUND_AMT)
+            else:
+                logging.error(f"Error in aicraft: {e}.")
+                raise e
+
+
+async def run(private_keys=private_keys):
     """Run AI Craft voting with multiple private keys from private_keys.txt."""
 
     if not private_keys:
@@ -460,13 +702,19 @@ async def run():
 
     color_print(f"Starting AI Craft voting with {len(private_keys)} accounts...", "GREEN")
 
-    # Create tasks for each private key
-    tasks = []
-    for private_key in private_keys:
-        tasks.append(ai_craft_voting(private_key))
+    async with aiohttp.ClientSession() as session:
+        # Fetch every wallet's balances in one concurrent sweep for the first display
+        await balance_service.fetch_many(session, [Account.from_key(pk).address for pk in private_keys])
+
+        # Create tasks for each private key
+        tasks = []
+        for private_key in private_keys:
+            tasks.append(ai_craft_voting(private_key, session))
 
-    # Run all tasks concurrently
-    await asyncio.gather(*tasks)
+        # Run all tasks concurrently, as many at a time as the shared account limiter allows. Failures are
+        # collected, so one account raising doesn't close the session the others are still using
+        results = await account_limiter.gather(*tasks, return_exceptions=True)
+        log_account_failures("AI Craft", private_keys, results)
 
 
 if __name__ == "__main__":
@@ -7,14 +7,19 @@ from decimal import Decimal
 from logger import logger
 import aiohttp
 from colorama import init, Fore, Style
-from utils import get_web3_connection, private_keys, handle_funding_error
+from utils import get_web3_connection, private_keys, handle_funding_error, PIPELINED_TXS, APPROVE_MAX, account_limiter
+from transactions import send_pipelined
+from gas import gas_model
+from balances import NATIVE, wallet_balances
+from fees import fee_oracle
+from allowances import allowance_index, approval_amount
+from retry import retry_delay
 
 
 # Initialize colorama
 init(autoreset=True)
 
 # Constants
-RPC_URL = "https://testnet-rpc.monad.xyz/"
 EXPLORER_URL = "https://testnet.monadexplorer.com/tx/0x"
 AMBIENT_CONTRACT = "0x88B96aF200c8a9c35442C8AC6cd3D22695AaE4F0"
 ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
@@ -26,7 +31,7 @@ MIN_SQRT_PRICE = 65537
 BORDER_WIDTH = 80
 ATTEMPTS = 3
 PAUSE_BETWEEN_SWAPS = [30, 120]
-PAUSE_BETWEEN_ACTIONS = [30, 300]
+COLLECT_SWAP_GAS_LIMIT = 250000  # Swaps signed before their approval is mined can't be estimated
 
 AMBIENT_TOKENS = {
     "usdt": {"address": "0x88b8E2161DEDC77EF4ab7585569D2415a1C1055D", "decimals": 6},
@@ -123,14 +128,8 @@ class AmbientDex:
         self.router_contract = self.web3.eth.contract(address=AMBIENT_CONTRACT, abi=AMBIENT_ABI)
 
     async def get_gas_params(self) -> Dict[str, int]:
-        """Get gas parameters from the network."""
-        latest_block = await self.web3.eth.get_block('latest')
-        base_fee = latest_block['baseFeePerGas']
-        max_priority_fee = await self.web3.eth.max_priority_fee
-        return {
-            "maxFeePerGas": base_fee + max_priority_fee,
-            "maxPriorityFeePerGas": max_priority_fee,
-        }
+        """Get gas parameters from the shared fee oracle."""
+        return await fee_oracle.suggest(self.web3)
 
     def convert_to_wei(self, amount: float, token: str) -> int:
         """Convert amount to wei based on token decimals."""
@@ -150,8 +149,15 @@ class AmbientDex:
         """Get list of tokens with balance greater than 0."""
         tokens_with_balance = []
 
+        try:
+            # Fill the shared balance cache in one batched request; reads below go one by one if it fails
+            await wallet_balances.async_scan(self.web3, self.account.address,
+                                             [NATIVE, *(token["address"] for token in AMBIENT_TOKENS.values())])
+        except Exception as e:
+            logger.warning(f"[{self.account_index}] Batched balance read failed: {str(e)}")
+
         # Check native token (MON) balance
-        native_balance = await self.web3.eth.get_balance(self.account.address)
+        native_balance = await wallet_balances.async_read(self.web3, self.account.address)
         if native_balance > 0:
             native_amount = self.convert_from_wei(native_balance, "native")
             tokens_with_balance.append(("native", native_amount))
@@ -159,11 +165,8 @@ class AmbientDex:
         # Check other token balances
         for token in AMBIENT_TOKENS:
             try:
-                token_contract = self.web3.eth.contract(
-                    address=self.web3.to_checksum_address(AMBIENT_TOKENS[token]["address"]),
-                    abi=ERC20_ABI
-                )
-                balance = await token_contract.functions.balanceOf(self.account.address).call()
+                balance = await wallet_balances.async_read(self.web3, self.account.address,
+                                                           AMBIENT_TOKENS[token]["address"])
                 if balance > 0:
                     amount = self.convert_from_wei(balance, token)
                     # Skip SETH and WETH if balance is too low
@@ -176,8 +179,14 @@ class AmbientDex:
 
         return tokens_with_balance
 
-    async def generate_swap_data(self, token_in: str, token_out: str, amount_in_wei: int) -> Dict:
-        """Tạo dữ liệu giao dịch swap cho Ambient DEX."""
+    async def generate_swap_data(self, token_in: str, token_out: str, amount_in_wei: int,
+                                 default_gas: Optional[int] = None) -> Dict:
+        """
+        Tạo dữ liệu giao dịch swap cho Ambient DEX.
+
+        The gas limit comes from the gas model; while it is cold the swap is estimated, or `default_gas`
+        is used if given (the swap depends on a pending approval and can't be estimated yet).
+        """
         for retry in range(ATTEMPTS):
             try:
                 is_native = token_in == "native"
@@ -204,21 +213,18 @@ class AmbientDex:
                 cmd_params = abi.encode(['uint16', 'bytes'], [1, encode_data])
                 tx_data = function_selector.hex() + cmd_params.hex()
 
-                gas_estimate = await self.web3.eth.estimate_gas({
-                    'to': AMBIENT_CONTRACT,
-                    'from': self.account.address,
-                    'data': '0x' + tx_data,
-                    'value': amount_in_wei if is_native else 0
-                })
-
-                return {
+                swap_tx = {
                     "to": AMBIENT_CONTRACT,
                     "data": '0x' + tx_data,
                     "value": amount_in_wei if is_native else 0,
-                    "gas": int(gas_estimate * 1.1)
                 }
+                gas = gas_model.limit(swap_tx) or default_gas
+                if gas is None:
+                    gas = int(await self.web3.eth.estimate_gas({**swap_tx, 'from': self.account.address}) * 1.1)
+                return {**swap_tx, "gas": gas}
             except Exception as e:
-                await self._handle_error("generate_swap_data", e)
+                if not await self._handle_error("generate_swap_data", e, retry + 1):
+                    break
         raise Exception("Failed to generate swap data after retries")
 
     async def execute_transaction(self, tx_data: Dict) -> str:
@@ -239,57 +245,117 @@ class AmbientDex:
                 tx_hash = await self.web3.eth.send_raw_transaction(signed_txn.raw_transaction)
                 print_step('swap', "Waiting for transaction confirmation...")
                 receipt = await self.web3.eth.wait_for_transaction_receipt(tx_hash, poll_latency=2)
+                gas_model.observe(transaction, receipt)
+                wallet_balances.observe(transaction, receipt)
                 if receipt['status'] == 1:
                     logger.success(f"[{self.account_index}] Transaction successful! TX: {EXPLORER_URL}{tx_hash.hex()}")
                     return tx_hash.hex()
                 else:
                     raise Exception(f"Transaction failed: {EXPLORER_URL}{tx_hash.hex()}")
             except Exception as e:
-                await self._handle_error("execute_transaction", e)
+                if not await self._handle_error("execute_transaction", e, retry + 1):
+                    break
         raise Exception("Transaction execution failed after retries")
 
+    def token_address(self, token: str) -> str:
+        return self.web3.to_checksum_address(AMBIENT_TOKENS[token.lower()]["address"])
+
+    async def get_allowance(self, token: str, amount: int) -> int:
+        """Allowance of the Ambient router, from the allowance index when it already covers `amount`."""
+        token_contract = self.web3.eth.contract(address=self.token_address(token), abi=ERC20_ABI)
+        return await allowance_index.async_read(token_contract, self.account.address, AMBIENT_CONTRACT, amount)
+
     async def approve_token(self, token: str, amount: int) -> Optional[str]:
-        """Phê duyệt token cho Ambient DEX."""
+        """Phê duyệt token cho Ambient DEX. Returns None when no approval was needed."""
         for retry in range(ATTEMPTS):
             try:
-                token_contract = self.web3.eth.contract(
-                    address=self.web3.to_checksum_address(AMBIENT_TOKENS[token.lower()]["address"]),
-                    abi=ERC20_ABI
-                )
-                current_allowance = await token_contract.functions.allowance(
-                    self.account.address, AMBIENT_CONTRACT
-                ).call()
-                if current_allowance >= amount:
+                token_contract = self.web3.eth.contract(address=self.token_address(token), abi=ERC20_ABI)
+                if await self.get_allowance(token, amount) >= amount:
                     logger.info(f"[{self.account_index}] Allowance sufficient for {token}")
                     return None
 
                 nonce = await self.web3.eth.get_transaction_count(self.account.address)
                 gas_params = await self.get_gas_params()
-                approve_tx = await token_contract.functions.approve(
-                    AMBIENT_CONTRACT, amount
-                ).build_transaction({
+                approve = token_contract.functions.approve(AMBIENT_CONTRACT, approval_amount(amount, APPROVE_MAX))
+                approve_tx = await approve.build_transaction(gas_model.with_limit(approve, {
                     'from': self.account.address,
                     'nonce': nonce,
                     'type': 2,
                     'chainId': 10143,
                     **gas_params,
-                })
+                }))
                 signed_txn = self.web3.eth.account.sign_transaction(approve_tx, self.account.key)
                 tx_hash = await self.web3.eth.send_raw_transaction(signed_txn.raw_transaction)
                 print_step('approve', f"Approving {self.convert_from_wei(amount, token):.4f} {token.upper()}...")
                 receipt = await self.web3.eth.wait_for_transaction_receipt(tx_hash, poll_latency=2)
+                gas_model.observe(approve_tx, receipt)
+                wallet_balances.observe(approve_tx, receipt)
                 if receipt['status'] == 1:
+                    allowance_index.record_receipt(receipt)
                     logger.success(f"[{self.account_index}] Approval successful! TX: {EXPLORER_URL}{tx_hash.hex()}")
                     print_step('approve', f"{Fore.GREEN}✔ Approved! TX: {EXPLORER_URL}{tx_hash.hex()}{Style.RESET_ALL}")
                     return tx_hash.hex()
                 raise Exception("Approval failed")
             except Exception as e:
-                await self._handle_error("approve_token", e)
+                if not await self._handle_error("approve_token", e, retry + 1):
+                    break
         raise Exception(f"Failed to approve {token} after retries")
 
+    async def collect_pipelined(self, tokens_to_swap: List[Tuple[str, float]]) -> None:
+        """
+        Collect every token to native in a few blocks.
+
+        All needed approvals are sent first, then all swaps, with consecutive nonces and a single
+        confirmation wait. Swaps whose approval is still in flight get a fixed gas limit.
+        """
+        planned = []
+        for token_in, balance in tokens_to_swap:
+            if token_in.lower() == "seth":
+                balance -= random.uniform(0.00001, 0.0001)
+            planned.append((token_in, balance, self.convert_to_wei(balance, token_in)))
+
+        allowances = await asyncio.gather(*(self.get_allowance(token, amount_wei) for token, _, amount_wei in planned))
+        gas_params = await self.get_gas_params()
+        base_tx = {"from": self.account.address, "type": 2, "chainId": 10143, **gas_params}
+
+        approvals, swaps, steps = [], [], []
+        for (token_in, balance, amount_wei), allowance in zip(planned, allowances):
+            needs_approval = allowance < amount_wei
+            if needs_approval:
+                token_contract = self.web3.eth.contract(address=self.token_address(token_in), abi=ERC20_ABI)
+                approve = token_contract.functions.approve(AMBIENT_CONTRACT, approval_amount(amount_wei, APPROVE_MAX))
+                approvals.append(await approve.build_transaction(gas_model.with_limit(approve, base_tx)))
+                steps.append(('approve', f"Approved {balance:.4f} {token_in.upper()}"))
+            tx_data = await self.generate_swap_data(
+                token_in, "native", amount_wei, default_gas=COLLECT_SWAP_GAS_LIMIT if needs_approval else None
+            )
+            swaps.append({**base_tx, **tx_data})
+        steps += [('swap', f"Swapped {balance:.4f} {token_in.upper()} to MON") for token_in, balance, _ in planned]
+        # Receipts to account in the allowance index: approvals record their event, swaps spend it
+        spends = [None] * len(approvals)
+        spends += [(self.token_address(token_in), amount_wei) for token_in, _, amount_wei in planned]
+
+        print_step('swap', f"Sending {len(approvals)} approvals and {len(swaps)} swaps back-to-back...")
+        tx_hashes, receipts = await send_pipelined(self.web3, self.account.key, approvals + swaps)
+
+        for (step, message), spend, tx_hash, receipt in zip(steps, spends, tx_hashes, receipts):
+            if receipt['status'] == 1:
+                if spend is None:
+                    allowance_index.record_receipt(receipt)
+                else:
+                    allowance_index.spend(self.account.address, spend[0], AMBIENT_CONTRACT, spend[1])
+                logger.success(f"[{self.account_index}] {message}! TX: {EXPLORER_URL}{tx_hash}")
+                print_step(step, f"{Fore.GREEN}✔ {message}! TX: {EXPLORER_URL}{tx_hash}{Style.RESET_ALL}")
+            else:
+                if spend is not None:
+                    allowance_index.forget(self.account.address, spend[0], AMBIENT_CONTRACT)
+                logger.error(f"[{self.account_index}] Failed: {message}. TX: {EXPLORER_URL}{tx_hash}")
+                print_step(step, f"{Fore.RED}✘ Failed: {EXPLORER_URL}{tx_hash}{Style.RESET_ALL}")
+
     async def swap(self, percentage_to_swap: float = 100.0, swap_type: str = "regular") -> Optional[str]:
         """Perform a swap on Ambient DEX."""
         for retry in range(ATTEMPTS):
+            token_in = "native"
             try:
                 tokens_with_balance = await self.get_tokens_with_balance()
                 if not tokens_with_balance:
@@ -302,20 +368,28 @@ class AmbientDex:
                         print_step('swap', f"{Fore.YELLOW}⚠ No tokens to collect to native{Style.RESET_ALL}")
                         return None
 
+                    if PIPELINED_TXS:
+                        await self.collect_pipelined(tokens_to_swap)
+                        print_step('swap', f"{Fore.GREEN}✔ Collection to native completed{Style.RESET_ALL}")
+                        return "Collection complete"
+
                     for token_in, balance in tokens_to_swap:
                         try:
                             if token_in.lower() == "seth":
                                 leave_amount = random.uniform(0.00001, 0.0001)
                                 balance -= leave_amount
                             amount_wei = self.convert_to_wei(balance, token_in)
-                            await self.approve_token(token_in, amount_wei)
-                            await asyncio.sleep(random.uniform(*PAUSE_BETWEEN_SWAPS))
+                            if await self.approve_token(token_in, amount_wei):
+                                await asyncio.sleep(random.uniform(*PAUSE_BETWEEN_SWAPS))
                             print_step('swap', f"Swapping {balance:.4f} {token_in.upper()} to MON...")
                             tx_data = await self.generate_swap_data(token_in, "native", amount_wei)
                             tx_hash = await self.execute_transaction(tx_data)
+                            allowance_index.spend(self.account.address, self.token_address(token_in), AMBIENT_CONTRACT,
+                                                  amount_wei)
                             if token_in != tokens_to_swap[-1][0]:
                                 await asyncio.sleep(random.uniform(5, 10))
                         except Exception as e:
+                            allowance_index.forget(self.account.address, self.token_address(token_in), AMBIENT_CONTRACT)
                             logger.error(f"[{self.account_index}] Failed to collect {token_in} to native: {str(e)}")
                             continue
                     print_step('swap', f"{Fore.GREEN}✔ Collection to native completed{Style.RESET_ALL}")
@@ -338,35 +412,63 @@ class AmbientDex:
                             balance -= leave_amount
                         amount_wei = self.convert_to_wei(balance, token_in)
                         amount_token = balance
-                        await self.approve_token(token_in, amount_wei)
-                        await asyncio.sleep(random.uniform(*PAUSE_BETWEEN_SWAPS))
+                        if await self.approve_token(token_in, amount_wei):
+                            await asyncio.sleep(random.uniform(*PAUSE_BETWEEN_SWAPS))
 
                     print_step('swap', f"Swapping {amount_token:.6f} {token_in.upper()} to {token_out.upper()}...")
                     tx_data = await self.generate_swap_data(token_in, token_out, amount_wei)
-                    return await self.execute_transaction(tx_data)
+                    tx_hash = await self.execute_transaction(tx_data)
+                    if token_in != "native":
+                        allowance_index.spend(self.account.address, self.token_address(token_in), AMBIENT_CONTRACT,
+                                              amount_wei)
+                    return tx_hash
 
             except Exception as e:
-                await self._handle_error("swap", e)
+                if swap_type != "collect" and token_in != "native":
+                    # The swap may have relied on a stale allowance entry; re-read it next time
+                    allowance_index.forget(self.account.address, self.token_address(token_in), AMBIENT_CONTRACT)
+                if not await self._handle_error("swap", e, retry + 1):
+                    break
         print_step('swap', f"{Fore.RED}✘ Swap failed after {ATTEMPTS} attempts{Style.RESET_ALL}")
         return None
 
-    async def _handle_error(self, action: str, error: Exception) -> None:
-        """Xử lý lỗi với pause ngẫu nhiên."""
+    async def _handle_error(self, action: str, error: Exception, attempt: int) -> bool:
+        """Fund or back off according to the error class. Returns False when retrying won't help."""
 
-        # Check if this is a funding error and attempt to fund
-        if handle_funding_error(error, self.account.address):
+        # Check if this is a funding error and attempt to fund; the funder uses the sync client, so off the loop
+        if await asyncio.to_thread(handle_funding_error, error, self.account.address):
             logger.info(f"[{self.account_index}] Funding attempted for {action} error")
-            print_step(action, f"{Fore.YELLOW}💰 Funding attempted. Retrying in 10s{Style.RESET_ALL}")
-            await asyncio.sleep(10)  # Shorter wait after funding
-        else:
-            # Original error handling for non-funding errors
-            pause = random.uniform(*PAUSE_BETWEEN_ACTIONS)
-            logger.error(f"[{self.account_index}] Error in {action}: {error}. Sleeping for {pause:.2f}s")
-            print_step(action, f"{Fore.RED}✘ Error: {str(error)}. Retrying in {pause:.2f}s{Style.RESET_ALL}")
-            await asyncio.sleep(pause)
-
-
-async def run() -> None:
+            print_step(action, f"{Fore.YELLOW}💰 Funding attempted. Retrying{Style.RESET_ALL}")
+            return True
+
+        pause = retry_delay(error, attempt)
+        if pause is None:
+            logger.error(f"[{self.account_index}] Error in {action}: {error}. Not retrying")
+            print_step(action, f"{Fore.RED}✘ Error: {str(error)}{Style.RESET_ALL}")
+            return False
+        logger.error(f"[{self.account_index}] Error in {action}: {error}. Sleeping for {pause:.2f}s")
+        print_step(action, f"{Fore.RED}✘ Error: {str(error)}. Retrying in {pause:.2f}s{Style.RESET_ALL}")
+        await asyncio.sleep(pause)
+        return True
+
+
+async def swap_account(idx: int, total: int, private_key: str, session: aiohttp.ClientSession) -> bool:
+    """Swap for one account. Returns True when a swap went through."""
+    wallet = Account.from_key(private_key).address
+    print_border(f"ACCOUNT {idx}/{total} - {wallet[:5]}...{wallet[-5:]}", Fore.BLUE)
+    ambient = AmbientDex(idx, private_key, session)
+    logger.info(f"Processing account {idx}/{total}: {ambient.account.address}")
+
+    # Execute swap
+    try:
+        return bool(await ambient.swap(percentage_to_swap=100.0, swap_type="regular"))
+    except Exception as e:
+        logger.error(f"[{idx}] Failed to execute swap: {str(e)}")
+        print_step('swap', f"{Fore.RED}✘ Swap failed: {str(e)}{Style.RESET_ALL}")
+        return False
+
+
+async def run(private_keys=private_keys) -> None:
     """Run Ambient script with multiple private keys from pvkey.txt."""
 
     if not private_keys:
@@ -380,38 +482,15 @@ async def run() -> None:
     print(f"{Fore.GREEN}{'═' * BORDER_WIDTH}{Style.RESET_ALL}")
     print(f"{Fore.CYAN}👥 Accounts: {len(private_keys):^76}{Style.RESET_ALL}")
 
-    success_count = 0
+    # Swap for every account, as many at a time as the shared account limiter allows
     async with aiohttp.ClientSession() as session:
-        try:  # Add try block
-            for idx, private_key in enumerate(private_keys, start=1):
-                wallet = Account.from_key(private_key).address
-                wallet_short = f"{wallet[:5]}...{wallet[-5:]}"
-                account_msg = f"ACCOUNT {idx}/{len(private_keys)} - {wallet_short}"
-                print_border(account_msg, Fore.BLUE)
-                ambient = AmbientDex(idx, private_key, session)
-                logger.info(f"Processing account {idx}/{len(private_keys)}: {ambient.account.address}")
-
-                # Execute swap
-                try:
-                    tx_hash = await ambient.swap(percentage_to_swap=100.0, swap_type="regular")
-                    if tx_hash:
-                        success_count += 1
-                except Exception as e:
-                    logger.error(f"[{idx}] Failed to execute swap: {str(e)}")
-                    print_step('swap', f"{Fore.RED}✘ Swap failed: {str(e)}{Style.RESET_ALL}")
-
-                # Pause between accounts
-                if idx < len(private_keys):
-                    pause = random.uniform(10, 30)
-                    pause_msg = f"Waiting {pause:.2f}s before next account..."
-                    print(f"{Fore.YELLOW}⏳ {pause_msg:^76}{Style.RESET_ALL}")
-                    await asyncio.sleep(pause)
-
-        finally:  # Ensure session is properly closed
-            pass  # Session will be closed by async with context manager
+        results = await account_limiter.gather(*(
+            swap_account(idx, len(private_keys), private_key, session)
+            for idx, private_key in enumerate(private_keys, start=1)
+        ))
 
     # Display completion message
-    print_completion_message(accounts=len(private_keys), success_count=success_count)
+    print_completion_message(accounts=len(private_keys), success_count=sum(results))
 
 if __name__ == "__main__":
     asyncio.run(run())
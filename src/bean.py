@@ -2,7 +2,12 @@ import random
 import asyncio
 import time
 from colorama import init, Fore, Style
-from utils import get_web3_connection, private_keys, data, handle_funding_error
+from utils import get_web3_connection, private_keys, data, handle_funding_error, APPROVE_MAX, account_limiter
+from gas import gas_model
+from balances import NATIVE, wallet_balances
+from fees import fee_oracle
+from retry import retry_delay
+from allowances import allowance_index, approval_amount
 
 # Initialize colorama
 init(autoreset=True)
@@ -56,7 +61,9 @@ ERC20_ABI = [
      "name": "approve", "outputs": [{"name": "", "type": "bool"}], "type": "function"},
     {"constant": True, "inputs": [{"name": "account", "type": "address"}], "name": "balanceOf",
      "outputs": [{"name": "", "type": "uint256"}], "type": "function"},
-    {"constant": True, "inputs": [], "name": "symbol", "outputs": [{"name": "", "type": "string"}], "type": "function"}
+    {"constant": True, "inputs": [], "name": "symbol", "outputs": [{"name": "", "type": "string"}], "type": "function"},
+    {"constant": True, "inputs": [{"name": "owner", "type": "address"}, {"name": "spender", "type": "address"}],
+     "name": "allowance", "outputs": [{"name": "", "type": "uint256"}], "type": "function"}
 ]
 
 # ABI for router
@@ -124,30 +131,40 @@ async def approve_token(w3, private_key, token_address, amount, decimals, max_re
             account = w3.eth.account.from_key(private_key)
             wallet = account.address[:5] + "..." + account.address[-5:]
             token_contract = w3.eth.contract(address=token_address, abi=ERC20_ABI)
-            symbol = token_contract.functions.symbol().call()
+            symbol = await token_contract.functions.symbol().call()
 
             print_step('approve', f'Checking approval for {symbol}')
             amount_in_decimals = w3.to_wei(amount, 'ether') if decimals == 18 else int(amount * 10 ** decimals)
-            tx = token_contract.functions.approve(ROUTER_ADDRESS, amount_in_decimals).build_transaction({
+            allowance = await allowance_index.async_read(token_contract, account.address, ROUTER_ADDRESS,
+                                                         amount_in_decimals)
+            if allowance >= amount_in_decimals:
+                print_step('approve', f"{Fore.GREEN}✔ {symbol} already approved{Style.RESET_ALL}")
+                return amount_in_decimals
+
+            approve = token_contract.functions.approve(ROUTER_ADDRESS, approval_amount(amount_in_decimals, APPROVE_MAX))
+            tx = await approve.build_transaction(gas_model.with_limit(approve, {
                 'from': account.address,
                 'gas': 100000,
-                'gasPrice': w3.eth.gas_price,
-                'nonce': w3.eth.get_transaction_count(account.address),
-            })
+                'gasPrice': await fee_oracle.gas_price(w3),
+                'nonce': await w3.eth.get_transaction_count(account.address),
+            }))
 
             signed_tx = w3.eth.account.sign_transaction(tx, private_key)
-            tx_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+            tx_hash = await w3.eth.send_raw_transaction(signed_tx.raw_transaction)
             await asyncio.sleep(2)
-            receipt = w3.eth.wait_for_transaction_receipt(tx_hash, timeout=180)
+            receipt = await w3.eth.wait_for_transaction_receipt(tx_hash, timeout=180)
+            gas_model.observe(tx, receipt)
+            wallet_balances.observe(tx, receipt)
             if receipt.status == 1:
+                allowance_index.record_receipt(receipt)
                 print_step('approve', f"{Fore.GREEN}✔ {symbol} approved{Style.RESET_ALL}")
                 return amount_in_decimals
             else:
                 raise Exception(f"Approve failed: Status {receipt.status}")
         except Exception as e:
-            if "429 Client Error" in str(e) and attempt < max_retries - 1:
-                delay = 2 ** attempt  # Exponential backoff: 1s, 2s, 4s
-                print_step('approve', f"{Fore.YELLOW}Rate limited, retrying in {delay} seconds...{Style.RESET_ALL}")
+            delay = retry_delay(e, attempt + 1)
+            if delay is not None and attempt < max_retries - 1:
+                print_step('approve', f"{Fore.YELLOW}Retrying in {delay:.2f} seconds...{Style.RESET_ALL}")
                 await asyncio.sleep(delay)
             else:
                 print_step('approve', f"{Fore.RED}✘ Failed: {str(e)}{Style.RESET_ALL}")
@@ -166,31 +183,34 @@ async def swap_token_to_mon(w3, private_key, token_symbol, amount):
         amount_in_decimals = await approve_token(w3, private_key, token['address'], amount, token['decimals'])
 
         router = w3.eth.contract(address=ROUTER_ADDRESS, abi=ROUTER_ABI)
-        tx = router.functions.swapExactTokensForETH(
+        swap = router.functions.swapExactTokensForETH(
             amount_in_decimals, 0, [token['address'], WMON_ADDRESS], account.address, int(time.time()) + 600
-        ).build_transaction({
+        )
+        tx = await swap.build_transaction(gas_model.with_limit(swap, {
             'from': account.address,
-            'gasPrice': w3.eth.gas_price,
-            'nonce': w3.eth.get_transaction_count(account.address),
-        })
-
-        estimated_gas = w3.eth.estimate_gas(tx)
-        tx['gas'] = estimated_gas
+            'gasPrice': await fee_oracle.gas_price(w3),
+            'nonce': await w3.eth.get_transaction_count(account.address),
+        }))
 
         print_step('swap', 'Sending swap transaction...')
         signed_tx = w3.eth.account.sign_transaction(tx, private_key)
-        tx_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+        tx_hash = await w3.eth.send_raw_transaction(signed_tx.raw_transaction)
 
         print_step('swap', f"Tx Hash: {Fore.YELLOW}{EXPLORER_URL}{tx_hash.hex()}{Style.RESET_ALL}")
         await asyncio.sleep(2)
-        receipt = w3.eth.wait_for_transaction_receipt(tx_hash, timeout=180)
+        receipt = await w3.eth.wait_for_transaction_receipt(tx_hash, timeout=180)
+        gas_model.observe(tx, receipt)
+        wallet_balances.observe(tx, receipt)
 
         if receipt.status == 1:
+            allowance_index.spend(account.address, token['address'], ROUTER_ADDRESS, amount_in_decimals)
             print_step('swap', f"{Fore.GREEN}✔ Swap successful!{Style.RESET_ALL}")
             return True
         else:
             raise Exception(f"Transaction failed: Status {receipt.status}")
     except Exception as e:
+        # The swap may have relied on a stale allowance entry; re-read it next time
+        allowance_index.forget(w3.eth.account.from_key(private_key).address, token['address'], ROUTER_ADDRESS)
         print_step('swap', f"{Fore.RED}✘ Failed: {str(e)}{Style.RESET_ALL}")
         raise e
 
@@ -204,23 +224,26 @@ async def swap_mon_to_token(w3, private_key, token_symbol, amount):
 
         print_border(f"Swap {amount} MON to {token_symbol} | {wallet}", Fore.MAGENTA)
 
-        tx = w3.eth.contract(address=ROUTER_ADDRESS, abi=ROUTER_ABI).functions.swapExactETHForTokens(
+        swap = w3.eth.contract(address=ROUTER_ADDRESS, abi=ROUTER_ABI).functions.swapExactETHForTokens(
             0, [WMON_ADDRESS, token['address']], account.address, int(time.time()) + 600
-        ).build_transaction({
+        )
+        tx = await swap.build_transaction(gas_model.with_limit(swap, {
             'from': account.address,
             'value': w3.to_wei(amount, 'ether'),
             'gas': 300000,
-            'gasPrice': w3.eth.gas_price,
-            'nonce': w3.eth.get_transaction_count(account.address),
-        })
+            'gasPrice': await fee_oracle.gas_price(w3),
+            'nonce': await w3.eth.get_transaction_count(account.address),
+        }))
 
         print_step('swap', 'Sending swap transaction...')
         signed_tx = w3.eth.account.sign_transaction(tx, private_key)
-        tx_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+        tx_hash = await w3.eth.send_raw_transaction(signed_tx.raw_transaction)
 
         print_step('swap', f"Tx Hash: {Fore.YELLOW}{EXPLORER_URL}{tx_hash.hex()}{Style.RESET_ALL}")
         await asyncio.sleep(2)
-        receipt = w3.eth.wait_for_transaction_receipt(tx_hash, timeout=180)
+        receipt = await w3.eth.wait_for_transaction_receipt(tx_hash, timeout=180)
+        gas_model.observe(tx, receipt)
+        wallet_balances.observe(tx, receipt)
 
         if receipt.status == 1:
             print_step('swap', f"{Fore.GREEN}✔ Swap successful!{Style.RESET_ALL}")
@@ -239,7 +262,14 @@ async def check_balance(w3, private_key, max_retries=3):
     print_border(f"💰 Balance | {wallet}", Fore.CYAN)
 
     try:
-        mon_balance = w3.eth.get_balance(account.address)
+        # Fill the shared balance cache in one batched request; reads below retry one by one if it fails
+        await wallet_balances.async_scan(w3, account.address,
+                                         [NATIVE, *(token['address'] for token in TOKENS.values())])
+    except Exception as e:
+        print_step('swap', f"{Fore.YELLOW}Batched balance read failed: {str(e)[:50]}{Style.RESET_ALL}")
+
+    try:
+        mon_balance = await wallet_balances.async_read(w3, account.address)
         print_step('swap', f"MON: {Fore.CYAN}{w3.from_wei(mon_balance, 'ether')}{Style.RESET_ALL}")
     except Exception as e:
         print_step('swap', f"MON: {Fore.RED}Error reading balance - {str(e)}{Style.RESET_ALL}")
@@ -247,20 +277,18 @@ async def check_balance(w3, private_key, max_retries=3):
     for symbol, token in TOKENS.items():
         for attempt in range(max_retries):
             try:
-                token_contract = w3.eth.contract(address=token['address'], abi=ERC20_ABI)
-                balance = token_contract.functions.balanceOf(account.address).call()
+                balance = await wallet_balances.async_read(w3, account.address, token['address'])
                 print_step('swap', f"{symbol}: {Fore.CYAN}{balance / 10 ** token['decimals']}{Style.RESET_ALL}")
                 break
             except Exception as e:
-                if "429 Client Error" in str(e) and attempt < max_retries - 1:
-                    delay = 2 ** attempt  # Exponential backoff: 1s, 2s, 4s
+                delay = retry_delay(e, attempt + 1)
+                if delay is not None and attempt < max_retries - 1:
                     print_step('swap',
-                               f"{Fore.YELLOW}{symbol}: Rate limited, retrying in {delay} seconds...{Style.RESET_ALL}")
+                               f"{Fore.YELLOW}{symbol}: Retrying in {delay:.2f} seconds...{Style.RESET_ALL}")
                     await asyncio.sleep(delay)
                 else:
                     print_step('swap', f"{symbol}: {Fore.RED}Error reading balance - {str(e)}{Style.RESET_ALL}")
                     break
-            await asyncio.sleep(1)  # Delay between tokens
 
 
 # Function to perform random swap
@@ -283,76 +311,74 @@ async def perform_random_swap(w3, private_key):
         return await swap_token_to_mon(w3, private_key, token_symbol, amount)
 
 
-# Run swap cycle
-async def run_swap_cycle(cycles, private_keys):
-    successful_accounts = 0
+# Run the swap cycles for one account, retrying the account up to 3 times. Returns True on success
+async def run_account(account_idx, private_key, cycles, total):
+    account_retries = 1
 
-    for account_idx, private_key in enumerate(private_keys, 1):
-        account_retries = 1
+    while account_retries <= 3:
+        try:
+            # Initialize web3 provider
+            w3 = get_web3_connection(use_async=True)
+            account = w3.eth.account.from_key(private_key)
+            wallet = account.address[:5] + "..." + account.address[-5:]
 
-        while account_retries <= 3:
-            try:
-                # Initialize web3 provider
-                w3 = get_web3_connection()
-                account = w3.eth.account.from_key(private_key)
-                wallet = account.address[:5] + "..." + account.address[-5:]
+            if account_retries == 1:
+                print_border(f"🏦 ACCOUNT {account_idx}/{total} | {wallet}", Fore.BLUE)
+            else:
+                print_border(f"🏦 ACCOUNT {account_idx}/{total} RETRY {account_retries}/3 | {wallet}", Fore.YELLOW)
+
+            await check_balance(w3, private_key)
+
+            for i in range(cycles):
+                print_border(f"🔄 BEAN SWAP CYCLE {i + 1}/{cycles} | {wallet}", Fore.CYAN)
+                retries = 1
+                while retries <= 3:
+                    try:
+                        success = await perform_random_swap(w3, private_key)
+                        if success:
+                            await check_balance(w3, private_key)
+                            break
+                    except Exception as e:
+                        # The funder still uses the sync client, so keep it off the event loop
+                        if await asyncio.to_thread(handle_funding_error, e, account.address):
+                            retries += 1
+                            continue
+                        else:
+                            raise e
+
+                if i < cycles - 1:
+                    delay = get_random_delay()
+                    print(f"\n{Fore.YELLOW}⏳ Waiting {delay / 60:.1f} minutes before next cycle...{Style.RESET_ALL}")
+                    await asyncio.sleep(delay)
 
-                if account_retries == 1:
-                    print_border(f"🏦 ACCOUNT {account_idx}/{len(private_keys)} | {wallet}", Fore.BLUE)
-                else:
-                    print_border(f"🏦 ACCOUNT {account_idx}/{len(private_keys)} RETRY {account_retries}/3 | {wallet}",
-                                 Fore.YELLOW)
-
-                await check_balance(w3, private_key)
-
-                for i in range(cycles):
-                    print_border(f"🔄 BEAN SWAP CYCLE {i + 1}/{cycles} | {wallet}", Fore.CYAN)
-                    retries = 1
-                    while retries <= 3:
-                        try:
-                            success = await perform_random_swap(w3, private_key)
-                            if success:
-                                await check_balance(w3, private_key)
-                                break
-                        except Exception as e:
-                            if handle_funding_error(e, account.address):
-                                time.sleep(30)
-                                retries += 1
-                                continue
-                            else:
-                                raise e
-
-                    if i < cycles - 1:
-                        delay = get_random_delay()
-                        print(
-                            f"\n{Fore.YELLOW}⏳ Waiting {delay / 60:.1f} minutes before next cycle...{Style.RESET_ALL}")
-                        await asyncio.sleep(delay)
-
-                # If we reach here, all cycles completed successfully
-                successful_accounts += 1
-                print(f"{Fore.GREEN}✅ Account {account_idx} completed successfully{Style.RESET_ALL}")
-                break  # Exit retry loop on success
+            # If we reach here, all cycles completed successfully
+            print(f"{Fore.GREEN}✅ Account {account_idx} completed successfully{Style.RESET_ALL}")
+            return True
 
-            except Exception as e:
-                print(
-                    f"{Fore.RED}❌ Account {account_idx} attempt {account_retries} failed: {str(e)[:50]}...{Style.RESET_ALL}")
-
-                if handle_funding_error(e, account.address if 'account' in locals() else 'Unknown'):
-                    account_retries += 1
-                    continue
-                elif account_retries < 3:
-                    print(f"{Fore.YELLOW}🔄 Retrying account in 30 seconds...{Style.RESET_ALL}")
-                    await asyncio.sleep(30)
-                    account_retries += 1
-                    continue
-                else:
-                    print(f"{Fore.RED}💀 Account {account_idx} failed after 3 attempts, skipping...{Style.RESET_ALL}")
-                    break
+        except Exception as e:
+            print(f"{Fore.RED}❌ Account {account_idx} attempt {account_retries} failed: {str(e)[:50]}..."
+                  f"{Style.RESET_ALL}")
+
+            wallet_address = account.address if 'account' in locals() else 'Unknown'
+            if await asyncio.to_thread(handle_funding_error, e, wallet_address):
+                account_retries += 1
+                continue
+            elif account_retries < 3 and (delay := retry_delay(e, account_retries)) is not None:
+                print(f"{Fore.YELLOW}🔄 Retrying account in {delay:.2f} seconds...{Style.RESET_ALL}")
+                await asyncio.sleep(delay)
+                account_retries += 1
+                continue
+            else:
+                print(f"{Fore.RED}💀 Account {account_idx} failed after 3 attempts, skipping...{Style.RESET_ALL}")
+                return False
+    return False
 
-        if account_idx < len(private_keys):
-            delay = get_random_delay()
-            print(f"\n{Fore.YELLOW}⏳ Waiting {delay / 60:.1f} minutes before next account...{Style.RESET_ALL}")
-            await asyncio.sleep(delay)
+
+# Run swap cycle for every account, as many at a time as the shared account limiter allows
+async def run_swap_cycle(cycles, private_keys):
+    results = await account_limiter.gather(*(run_account(account_idx, private_key, cycles, len(private_keys))
+                                             for account_idx, private_key in enumerate(private_keys, 1)))
+    successful_accounts = sum(1 for result in results if result)
 
     print(f"{Fore.GREEN}{'═' * 60}{Style.RESET_ALL}")
     print(
@@ -361,7 +387,7 @@ async def run_swap_cycle(cycles, private_keys):
 
 
 # Main function
-async def run():
+async def run(private_keys=private_keys):
     print(f"{Fore.GREEN}{'═' * 60}{Style.RESET_ALL}")
     print(f"{Fore.GREEN}│ {'BEAN SWAP - MONAD TESTNET':^56} │{Style.RESET_ALL}")
     print(f"{Fore.GREEN}{'═' * 60}{Style.RESET_ALL}")
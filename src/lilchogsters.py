@@ -1,23 +1,27 @@
 import asyncio
 import random
-from typing import Dict, List
+from typing import Dict, List, Optional
 from eth_account import Account
 import aiohttp
 from logger import logger
 from colorama import init, Fore, Style
-from utils import get_web3_connection, private_keys
+from utils import get_web3_connection, private_keys, account_limiter
+from concurrency import AimdLimiter
+from fees import fee_oracle
+from gas import gas_model
+from balances import wallet_balances
+from retry import retry_delay
 
 # Initialize colorama
 init(autoreset=True)
 
 # Constants
-RPC_URL = "https://testnet-rpc.monad.xyz/"
 EXPLORER_URL = "https://testnet.monadexplorer.com/tx/0x"
 NFT_CONTRACT_ADDRESS = "0xb33D7138c53e516871977094B249C8f2ab89a4F4"
 BORDER_WIDTH = 80
 ATTEMPTS = 3
-PAUSE_BETWEEN_ACTIONS = [5, 15]
 MAX_AMOUNT_FOR_EACH_ACCOUNT = [1, 3]
+MINTED_COUNT_BATCH = 100  # mintedCount calls per batched JSON-RPC request
 
 # ERC1155 ABI
 ERC1155_ABI = [
@@ -104,35 +108,44 @@ class Lilchogstars:
                 logger.info(f"[{self.account_index}] NFT balance: {balance}")
                 return balance
             except Exception as e:
-                await self._handle_error("get_nft_balance", e)
+                if not await self._handle_error("get_nft_balance", e, retry + 1):
+                    break
         raise Exception("Failed to get NFT balance after retries")
 
-    async def mint(self) -> bool:
-        """Mint Lilchogstars NFT."""
-        for retry in range(ATTEMPTS):
-            try:
-                balance = await self.get_nft_balance()
-                random_amount = random.randint(MAX_AMOUNT_FOR_EACH_ACCOUNT[0], MAX_AMOUNT_FOR_EACH_ACCOUNT[1])
+    async def mint(self, balance: Optional[int] = None, target: Optional[int] = None) -> bool:
+        """Mint one Lilchogstars NFT unless `balance` already reached `target` (both read/drawn when omitted)."""
+        if balance is None:
+            balance = await self.get_nft_balance()
+        if target is None:
+            target = random.randint(MAX_AMOUNT_FOR_EACH_ACCOUNT[0], MAX_AMOUNT_FOR_EACH_ACCOUNT[1])
 
-                print_step('balance',
-                           f"Current NFT balance: {Fore.CYAN}{balance} / Target: {random_amount}{Style.RESET_ALL}")
-
-                if balance >= random_amount:
-                    print_step('mint', f"{Fore.GREEN}✔ Already minted: {balance} NFTs{Style.RESET_ALL}")
-                    return True
+        print_step('balance', f"Current NFT balance: {Fore.CYAN}{balance} / Target: {target}{Style.RESET_ALL}")
+        if balance >= target:
+            print_step('mint', f"{Fore.GREEN}✔ Already minted: {balance} NFTs{Style.RESET_ALL}")
+            return True
 
+        mint_function = self.nft_contract.functions.mint(1)
+        for retry in range(ATTEMPTS):
+            try:
                 print_step('mint', "Minting Lilchogstars NFT...")
-                mint_txn = await self.nft_contract.functions.mint(1).build_transaction({
+                # Simulate even when the gas model is warm and skips estimate_gas, so a mint that would
+                # revert (e.g. the account reached its cap) fails here instead of burning gas on-chain
+                await mint_function.call({"from": self.account.address, "value": 0})
+                params = {
                     "from": self.account.address,
                     "value": 0,  # Free mint
-                    "nonce": await self.web3.eth.get_transaction_count(self.account.address),
+                    "nonce": await self.web3.eth.get_transaction_count(self.account.address, 'pending'),
                     "type": 2,
                     "chainId": 10143,
                     **(await self._get_gas_params()),
-                })
+                }
+                # Gas limit from the gas model; estimated by build_transaction while it is cold
+                mint_txn = await mint_function.build_transaction(gas_model.with_limit(mint_function, params))
                 signed_txn = self.web3.eth.account.sign_transaction(mint_txn, self.private_key)
                 tx_hash = await self.web3.eth.send_raw_transaction(signed_txn.raw_transaction)
                 receipt = await self.web3.eth.wait_for_transaction_receipt(tx_hash)
+                gas_model.observe(mint_txn, receipt)
+                wallet_balances.observe(mint_txn, receipt)
 
                 if receipt["status"] == 1:
                     print_step('mint',
@@ -144,29 +157,57 @@ class Lilchogstars:
                     print_step('mint', f"{Fore.RED}✘ Mint failed: {EXPLORER_URL}{tx_hash.hex()}{Style.RESET_ALL}")
                     return False
             except Exception as e:
-                await self._handle_error("mint", e)
+                if not await self._handle_error("mint", e, retry + 1):
+                    break
         print_step('mint', f"{Fore.RED}✘ Failed to mint after {ATTEMPTS} attempts{Style.RESET_ALL}")
         return False
 
     async def _get_gas_params(self) -> Dict[str, int]:
-        """Get gas parameters from the network."""
-        latest_block = await self.web3.eth.get_block('latest')
-        base_fee = latest_block['baseFeePerGas']
-        max_priority_fee = await self.web3.eth.max_priority_fee
-        return {
-            "maxFeePerGas": base_fee + max_priority_fee,
-            "maxPriorityFeePerGas": max_priority_fee,
-        }
-
-    async def _handle_error(self, action: str, error: Exception) -> None:
-        """Handle errors with random pause."""
-        pause = random.uniform(*PAUSE_BETWEEN_ACTIONS)
+        """Get gas parameters from the shared fee oracle."""
+        return await fee_oracle.suggest(self.web3)
+
+    async def _handle_error(self, action: str, error: Exception, attempt: int) -> bool:
+        """Back off according to the error class. Returns False when retrying won't help."""
+        pause = retry_delay(error, attempt)
+        if pause is None:
+            logger.error(f"[{self.account_index}] Error in {action}: {error}. Not retrying")
+            print_step(action, f"{Fore.RED}✘ Error: {str(error)}{Style.RESET_ALL}")
+            return False
         logger.error(f"[{self.account_index}] Error in {action}: {error}. Sleeping for {pause:.2f}s")
         print_step(action, f"{Fore.RED}✘ Error: {str(error)}. Retrying in {pause:.2f}s{Style.RESET_ALL}")
         await asyncio.sleep(pause)
-
-
-async def run() -> None:
+        return True
+
+
+async def minted_counts(addresses: List[str]) -> Dict[str, Optional[int]]:
+    """mintedCount of every address, read in batched JSON-RPC requests; None where a batch failed."""
+    web3 = get_web3_connection(use_async=True)
+    nft_contract = web3.eth.contract(address=NFT_CONTRACT_ADDRESS, abi=ERC1155_ABI)
+    counts = {}
+    for start in range(0, len(addresses), MINTED_COUNT_BATCH):
+        chunk = addresses[start:start + MINTED_COUNT_BATCH]
+        try:
+            async with web3.batch_requests() as batch:
+                for address in chunk:
+                    batch.add(nft_contract.functions.mintedCount(address))
+                counts.update(zip(chunk, await batch.async_execute()))
+        except Exception as e:
+            logger.warning(f"Batched mintedCount read failed, falling back to per-account reads: {e}")
+            counts.update(dict.fromkeys(chunk))
+    return counts
+
+
+async def mint_account(idx: int, total: int, private_key: str, balance: Optional[int], target: int,
+                       session: aiohttp.ClientSession) -> bool:
+    """Mint for one account."""
+    lilchogstars = Lilchogstars(idx, private_key, session)
+    wallet = lilchogstars.account.address
+    print_border(f"ACCOUNT {idx}/{total} - {wallet[:5]}...{wallet[-5:]}", Fore.BLUE)
+    logger.info(f"Processing account {idx}/{total}: {wallet}")
+    return await lilchogstars.mint(balance, target)
+
+
+async def run(private_keys=private_keys, limiter: AimdLimiter = account_limiter) -> None:
     """Run Lilchogstars script with multiple private keys from pvkey.txt."""
 
     if not private_keys:
@@ -180,26 +221,28 @@ async def run() -> None:
     print(f"{Fore.GREEN}{'═' * BORDER_WIDTH}{Style.RESET_ALL}")
     print(f"{Fore.CYAN}👥 {'Accounts'}: {len(private_keys):^76}{Style.RESET_ALL}")
 
+    # Read every account's mintedCount up front and skip those that already reached their target
+    addresses = [Account.from_key(private_key).address for private_key in private_keys]
+    counts = await minted_counts(addresses)
+    pending = []
     success_count = 0
+    for idx, (private_key, address) in enumerate(zip(private_keys, addresses), start=1):
+        target = random.randint(MAX_AMOUNT_FOR_EACH_ACCOUNT[0], MAX_AMOUNT_FOR_EACH_ACCOUNT[1])
+        balance = counts.get(address)
+        if balance is not None and balance >= target:
+            logger.info(f"[{idx}] Already minted {balance}/{target} NFTs, skipping")
+            success_count += 1
+        else:
+            pending.append((idx, private_key, balance, target))
+    print(f"{Fore.CYAN}🎯 {'To mint'}: {len(pending):^76}{Style.RESET_ALL}")
+
+    # Mint for the remaining accounts, as many at a time as the shared account limiter allows
     async with aiohttp.ClientSession() as session:
-        for idx, private_key in enumerate(private_keys, start=1):
-            wallet = Account.from_key(private_key).address
-            wallet_short = f"{wallet[:5]}...{wallet[-5:]}"
-            account_msg = f"ACCOUNT {idx}/{len(private_keys)} - {wallet_short}"
-            print_border(account_msg, Fore.BLUE)
-            lilchogstars = Lilchogstars(idx, private_key, session)
-            logger.info(f"Processing account {idx}/{len(private_keys)}: {lilchogstars.account.address}")
-
-            # Perform mint
-            if await lilchogstars.mint():
-                success_count += 1
-
-            # Pause between accounts
-            if idx < len(private_keys):
-                pause = random.uniform(30, 60)
-                pause_msg = f"Waiting {pause:.2f}s before next account..."
-                print(f"{Fore.YELLOW}⏳ {pause_msg:^76}{Style.RESET_ALL}")
-                await asyncio.sleep(pause)
+        results = await limiter.gather(*(
+            mint_account(idx, len(private_keys), private_key, balance, target, session)
+            for idx, private_key, balance, target in pending
+        ))
+    success_count += sum(results)
 
     # Display completion message
     print_completion_message(accounts=len(private_keys), success_count=success_count)
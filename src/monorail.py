@@ -1,16 +1,210 @@
-import requests
-from web3 import Web3
+import aiohttp
+from eth_account import Account
+from web3 import AsyncWeb3
 from typing import Dict, Any, Optional, List
-import time
 import asyncio
+import math
 import random
+import time
+from array import array
 from logger import logger as logging
-from utils import timeout, color_print, get_web3_connection, get_phantom_headers, data, private_keys
+import metrics
+from utils import (timeout, color_print, get_web3_connection, get_phantom_headers, data, private_keys,
+                   rate_limiter, account_limiter, log_account_failures, hold_funder_lock)
+from gas import gas_model
+from balances import wallet_balances
+from fees import fee_oracle
+from rpc_cache import is_connected
+from errors import ErrorClass, classify
+from retry import retry_delay
 
 # Constants
 DAILY_SWAPS = data["DAILY_INTERACTION"]["DEX"]["monorail"]
 FUND_AMT = data["FUND_AMOUNT"]
 FUNDER_PRIVATE_KEY = data["FUNDER_PRIVATE_KEY"]
+HTTP_TIMEOUT = aiohttp.ClientTimeout(total=30)
+QUOTE_TTL = 5  # Seconds a pathfinder quote is reused, well inside its 60s deadline
+QUOTE_AMOUNT_DIGITS = 8  # Significant digits amounts are bucketed to before quoting
+BALANCE_TTL = 30  # Seconds a wallet balance snapshot is reused for display
+BALANCE_CONCURRENCY = 20  # Parallel balance API requests
+BALANCE_URL = "https://testnet-api.monorail.xyz/v1/wallet/{address}/balances"
+PRICE_TTL = 60  # Seconds the price matrix is served before the next sweep
+NUMERAIRE = "MON"  # Every listed token is quoted against this one
+DUMMY_SENDER = "0x0000000000000000000000000000000000000000"  # Sender for quotes that are never sent
+DECIMALS_ABI = [
+    {"constant": True, "inputs": [], "name": "decimals", "outputs": [{"name": "", "type": "uint8"}],
+     "type": "function"}
+]
+
+
+async def get_json(session: aiohttp.ClientSession, url: str, params: Optional[Dict[str, str]] = None,
+                   headers: Optional[Dict[str, str]] = None) -> Any:
+    """GET a Monorail API endpoint through a shared session."""
+    if session is None:
+        raise ValueError("An aiohttp session is required for Monorail API calls")
+
+    await rate_limiter.acquire(url)
+    async with session.get(url, params=params, headers=headers, timeout=HTTP_TIMEOUT) as response:
+        if response.status != 200:
+            raise Exception(f"API request failed with status {response.status}: {await response.text()}")
+        return await response.json()
+
+
+class QuoteCache:
+    def __init__(self, ttl: float = QUOTE_TTL):
+        """
+        Short-lived pathfinder quotes shared by every account, keyed by (from, to, amount bucket, sender)
+
+        Concurrent requests for the same key share one HTTP call; failed requests are not cached.
+
+        Args:
+            ttl: Seconds a quote is served from cache
+        """
+        self.ttl = ttl
+        self.quotes = {}  # key -> (expires_at, quote)
+        self.in_flight = {}  # key -> task fetching the quote
+
+    async def get(self, key, fetch) -> Dict[str, Any]:
+        """Cached quote for `key`, or the result of `fetch()` shared with any concurrent caller"""
+        cached = self.quotes.get(key)
+        if cached and cached[0] > time.monotonic():
+            metrics.incr('monorail_quote.hit')
+            return cached[1]
+
+        task = self.in_flight.get(key)
+        if task is None:
+            metrics.incr('monorail_quote.miss')
+            task = asyncio.ensure_future(fetch())
+            self.in_flight[key] = task
+            task.add_done_callback(lambda done: self._store(key, done))
+        else:
+            metrics.incr('monorail_quote.coalesced')
+        # Shielded so one cancelled caller doesn't cancel the request for the others
+        return await asyncio.shield(task)
+
+    def _store(self, key, task) -> None:
+        self.in_flight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        now = time.monotonic()
+        self.quotes = {k: v for k, v in self.quotes.items() if v[0] > now}
+        self.quotes[key] = (now + self.ttl, task.result())
+
+
+# Shared by all accounts of the run
+quote_cache = QuoteCache()
+
+
+class BalanceService:
+    def __init__(self, ttl: float = BALANCE_TTL, concurrency: int = BALANCE_CONCURRENCY):
+        """
+        Wallet token balances from the Monorail balances API, cached briefly and fetched in bulk
+
+        The response includes MON, so displaying balances needs no RPC call.
+
+        Args:
+            ttl: Seconds a snapshot is served from cache
+            concurrency: Maximum parallel requests to the balances API
+        """
+        self.ttl = ttl
+        self.snapshots = {}  # address -> (fetched_at, balances)
+        self.in_flight = {}  # address -> task fetching the balances
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+    async def _fetch(self, session, address: str) -> List[Dict[str, Any]]:
+        async with self.semaphore:
+            balances = await get_json(session, BALANCE_URL.format(address=address))
+        self.snapshots[address.lower()] = (time.monotonic(), balances)
+        return balances
+
+    async def get(self, session, address: str) -> List[Dict[str, Any]]:
+        """Balances of `address`, from a snapshot younger than the TTL when there is one"""
+        snapshot = self.snapshots.get(address.lower())
+        if snapshot and time.monotonic() - snapshot[0] < self.ttl:
+            metrics.incr('balances.hit')
+            return snapshot[1]
+
+        task = self.in_flight.get(address.lower())
+        if task is None:
+            metrics.incr('balances.miss')
+            task = asyncio.ensure_future(self._fetch(session, address))
+            self.in_flight[address.lower()] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(address.lower(), None))
+        return await asyncio.shield(task)
+
+    async def fetch_many(self, session, addresses: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """Balances of many wallets at once; wallets whose request fails are left out"""
+        results = await asyncio.gather(*(self.get(session, address) for address in addresses), return_exceptions=True)
+        for address, result in zip(addresses, results):
+            if isinstance(result, Exception):
+                logging.warning(f"Could not fetch balances of {address}: {result}")
+        return {address: result for address, result in zip(addresses, results) if not isinstance(result, Exception)}
+
+    def invalidate(self, address: str) -> None:
+        """Forget a wallet's snapshot after it sent a transaction"""
+        self.snapshots.pop(address.lower(), None)
+
+
+# Shared by all accounts of the run
+balance_service = BalanceService()
+
+
+class PriceMatrix:
+    def __init__(self, ttl: float = PRICE_TTL, numeraire: str = NUMERAIRE):
+        """
+        Prices of every listed token in one numeraire, refreshed in a single concurrent sweep
+
+        Cross prices are derived as price[base] / price[quote], so a lookup is two array reads
+        until the TTL expires. Tokens whose quote failed are NaN, and pairs involving them can't be priced.
+
+        Args:
+            ttl: Seconds between sweeps
+            numeraire: Token every price is expressed in
+        """
+        self.ttl = ttl
+        self.numeraire = numeraire
+        self.index = {}  # symbol -> position in prices
+        self.prices = array('d')
+        self.updated_at = None
+        self.lock = asyncio.Lock()
+
+    async def _quote(self, swapper, token: str) -> float:
+        if token == self.numeraire:
+            return 1.0
+        try:
+            quote = await swapper.get_swap_quote(1.0, token, self.numeraire, DUMMY_SENDER)
+        except Exception as e:
+            logging.warning(f"Could not price {token} in {self.numeraire}: {e}")
+            return math.nan
+        return float(quote['output']) / 10 ** swapper.token_decimals(self.numeraire)
+
+    async def refresh(self, swapper) -> None:
+        """Quote every listed token against the numeraire at once"""
+        symbols = list(swapper.TOKENS)
+        prices = await asyncio.gather(*(self._quote(swapper, symbol) for symbol in symbols))
+        self.index = {symbol: i for i, symbol in enumerate(symbols)}
+        self.prices = array('d', prices)
+        self.updated_at = time.monotonic()
+        metrics.incr('price_matrix.sweep')
+
+    async def price(self, swapper, base_token: str, quote_token: str) -> Optional[float]:
+        """Price of one base_token in quote_token, sweeping first if the matrix is stale; None if unpriced"""
+        if self.updated_at is None or time.monotonic() - self.updated_at >= self.ttl:
+            async with self.lock:
+                if self.updated_at is None or time.monotonic() - self.updated_at >= self.ttl:
+                    await self.refresh(swapper)
+        if base_token not in self.index or quote_token not in self.index:
+            return None
+        base_price = self.prices[self.index[base_token]]
+        quote_price = self.prices[self.index[quote_token]]
+        if math.isnan(base_price) or math.isnan(quote_price) or quote_price == 0:
+            metrics.incr('price_matrix.unpriced')
+            return None
+        return base_price / quote_price
+
+
+# Shared by all accounts of the run
+price_matrix = PriceMatrix()
 
 
 class MonorailSwapper:
@@ -29,21 +223,27 @@ class MonorailSwapper:
         "sMON": "0x07aabd925866e8353407e67c1d157836f7ad923e"
     }
 
+    # Token decimals by symbol, read on-chain once per process by load_decimals(); 18 until known
+    TOKEN_DECIMALS = {
+        "MON": 18,  # Native token, no contract to ask
+    }
+    _decimals_lock = asyncio.Lock()
+
     # Base URLs for Monorail APIs
     BASE_URL = "https://testnet-pathfinder-v2.monorail.xyz/v1/quote"
-    BALANCE_URL = "https://testnet-api.monorail.xyz/v1/wallet/{address}/balances"
 
-    def __init__(self, w3: Web3, private_key: Optional[str] = None) -> None:
+    def __init__(self, w3: AsyncWeb3, private_key: Optional[str] = None,
+                 session: Optional[aiohttp.ClientSession] = None) -> None:
         """
         Initialize the MonadSwapper with optional Web3 connection details.
 
         Args:
+            w3: AsyncWeb3 instance connected to Monad testnet
             private_key: Optional private key for signing transactions
+            session: Shared aiohttp session used for the Monorail APIs
         """
         self.w3 = w3
-        if not self.w3.is_connected():
-            raise Exception("Failed to connect to Monad network")
-
+        self.session = session
         self.private_key = private_key
 
         if private_key:
@@ -51,7 +251,40 @@ class MonorailSwapper:
             self.wallet_address = self.account.address
             self.display_address = f"{self.wallet_address[:6]}...{self.wallet_address[-4:]}"
 
-    def send_base_tokens(self, to_address, amount_to_send):
+    async def connect(self) -> "MonorailSwapper":
+        """Make sure the RPC is reachable before doing any work."""
+        if not await is_connected(self.w3):
+            raise Exception("Failed to connect to Monad network")
+        await self.load_decimals()
+        return self
+
+    async def load_decimals(self) -> None:
+        """Read decimals() of every listed token not known yet, in one batched request"""
+        async with self._decimals_lock:
+            missing = [symbol for symbol in self.TOKENS if symbol not in self.TOKEN_DECIMALS]
+            if not missing:
+                return
+            try:
+                async with self.w3.batch_requests() as batch:
+                    for symbol in missing:
+                        contract = self.w3.eth.contract(address=self.w3.to_checksum_address(self.TOKENS[symbol]),
+                                                        abi=DECIMALS_ABI)
+                        batch.add(contract.functions.decimals())
+                    results = await batch.async_execute()
+            except Exception as e:
+                # Left unknown, so the next connect() tries again
+                logging.warning(f"Could not read token decimals: {e}")
+                return
+            for symbol, decimals in zip(missing, results):
+                self.TOKEN_DECIMALS[symbol] = decimals
+            metrics.incr('token_decimals.load', len(missing))
+
+    async def _get_json(self, url: str, params: Optional[Dict[str, str]] = None,
+                        headers: Optional[Dict[str, str]] = None) -> Any:
+        """GET a Monorail API endpoint through the shared session."""
+        return await get_json(self.session, url, params=params, headers=headers)
+
+    async def send_base_tokens(self, to_address, amount_to_send):
         """
         Send native MON tokens to an address.
 
@@ -67,25 +300,27 @@ class MonorailSwapper:
         # Prepare transaction data
         logging.info(f"Account {self.wallet_address}: Prepping to send {amount_to_send} MON to {to_address}")
 
-        tx_data = {
-            'to': to_address,
-            'value': amount,
-            'gas': 21000,  # Standard gas limit for simple transfers
-            'gasPrice': self.w3.eth.gas_price,
-            'nonce': self.w3.eth.get_transaction_count(self.wallet_address),
-            'chainId': self.w3.eth.chain_id
-        }
+        # Funding transfers run concurrently for many accounts: one at a time, from nonce read to receipt
+        async with hold_funder_lock():
+            tx_data = {
+                'to': to_address,
+                'value': amount,
+                'gas': 21000,  # Standard gas limit for simple transfers
+                'gasPrice': await fee_oracle.gas_price(self.w3),
+                'nonce': await self.w3.eth.get_transaction_count(self.wallet_address),
+                'chainId': await self.w3.eth.chain_id
+            }
+
+            # Sign the transaction
+            signed_tx = self.w3.eth.account.sign_transaction(tx_data, self.private_key)
 
-        # Sign the transaction
-        signed_tx = self.w3.eth.account.sign_transaction(tx_data, self.private_key)
+            # Send the transaction
+            tx_hash = await self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
 
-        # Send the transaction
-        tx_hash = self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+            tx_receipt = await self.w3.eth.wait_for_transaction_receipt(tx_hash, timeout=120)
 
-        tx_receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash, timeout=120)
         gas_used = tx_receipt.gasUsed
-        gas_price = self.w3.eth.gas_price
-        eth_spent = self.w3.from_wei(gas_used * gas_price, 'ether')
+        eth_spent = self.w3.from_wei(gas_used * tx_receipt.effectiveGasPrice, 'ether')
 
         if tx_receipt.status == 1:
             logging.info(f"Account {self.display_address}: "
@@ -95,7 +330,7 @@ class MonorailSwapper:
 
         return tx_hash.hex()
 
-    def get_wallet_balances(self, address: str) -> List[Dict[str, Any]]:
+    async def get_wallet_balances(self, address: str) -> List[Dict[str, Any]]:
         """
         Get all token balances for a wallet address.
 
@@ -103,16 +338,11 @@ class MonorailSwapper:
             address: The wallet address to check balances for
 
         Returns:
-            List of token balance objects
+            List of token balance objects, possibly from a snapshot up to BALANCE_TTL seconds old
         """
-        url = self.BALANCE_URL.format(address=address)
-        response = requests.get(url)
+        return await balance_service.get(self.session, address)
 
-        if response.status_code != 200:
-            raise Exception(f"API request failed with status {response.status_code}: {response.text}")
-        return response.json()
-
-    def display_wallet_balances(self, address: Optional[str] = None) -> None:
+    async def display_wallet_balances(self, address: Optional[str] = None) -> None:
         """
         Display all token balances for a wallet address in a formatted way.
         MON is always displayed first with max 3 decimal places.
@@ -126,10 +356,10 @@ class MonorailSwapper:
                 raise ValueError("Either provide an address or set a private key")
             address = self.wallet_address
 
-        balances = self.get_wallet_balances(address)
+        balances = await self.get_wallet_balances(address)
 
         # Sort balances so MON is first, then alphabetically by symbol
-        balances.sort(key=lambda x: (
+        balances = sorted(balances, key=lambda x: (
             0 if x['symbol'] == 'MON' else 1,  # MON first
             x['symbol']  # Then alphabetically
         ))
@@ -139,20 +369,16 @@ class MonorailSwapper:
 
         for token in balances:
             if float(token['balance']) > 0:
-                symbol = token['symbol']
-                if symbol == "MON":
-                    formatted_balance = self.get_bal()
-                else:
-                    formatted_balance = round(float(token['balance']), 3)  # 3 decimal places
-                balance_parts.append(f"{formatted_balance} {symbol}")
+                formatted_balance = round(float(token['balance']), 3)  # 3 decimal places
+                balance_parts.append(f"{formatted_balance} {token['symbol']}")
 
         # Changed color_print to logging.info since color_print is not defined
         color_print(
             f"Account {self.wallet_address}: Monad Testnet Ecosystem Token Balances: \n{' | '.join(balance_parts)}")
 
-    def get_swap_quote(self, amount: float, from_token: str, to_token: str,
-                       sender_address: str, slippage: float = 1,
-                       deadline: int = 60, source: str = "fe") -> Dict[str, Any]:
+    async def get_swap_quote(self, amount: float, from_token: str, to_token: str,
+                             sender_address: str, slippage: float = 1,
+                             deadline: int = 60, source: str = "fe") -> Dict[str, Any]:
         """
         Get a swap quote from the Monorail pathfinder API.
 
@@ -166,11 +392,12 @@ class MonorailSwapper:
             source: Source identifier (default 'fe')
 
         Returns:
-            Complete response from the pathfinder API
+            Complete response from the pathfinder API, shared with other callers (don't modify it)
         """
         # Convert token symbols to addresses
         from_address = self._get_token_address(from_token)
         to_address = self._get_token_address(to_token)
+        amount = float(f"{amount:.{QUOTE_AMOUNT_DIGITS}g}")  # Bucket, so the quote matches the cache key
 
         # Construct API query parameters
         params = {
@@ -188,14 +415,11 @@ class MonorailSwapper:
         headers["referer"] = "https://testnet-preview.monorail.xyz/"
         headers['origin'] = "https://testnet-preview.monorail.xyz/"
 
-        response = requests.get(self.BASE_URL, params=params, headers=headers)
-        if response.status_code != 200:
-            raise Exception(f"API request failed with status {response.status_code}: {response.text}")
-
-        return response.json()
+        key = (from_address, to_address, amount, slippage, deadline, sender_address.lower())
+        return await quote_cache.get(key, lambda: self._get_json(self.BASE_URL, params=params, headers=headers))
 
-    def build_swap_transaction(self, amount: float, from_token: str, to_token: str,
-                               sender_address: str) -> Dict[str, Any]:
+    async def build_swap_transaction(self, amount: float, from_token: str, to_token: str,
+                                     sender_address: str, quote: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Build a swap transaction for the given token pair.
 
@@ -204,11 +428,13 @@ class MonorailSwapper:
             from_token: Token symbol to swap from
             to_token: Token symbol to swap to
             sender_address: Address of the transaction sender
+            quote: Quote already fetched for this sender and amount, fetched if not given
 
         Returns:
             Transaction object ready to be signed and sent
         """
-        quote = self.get_swap_quote(amount, from_token, to_token, sender_address)
+        if quote is None:
+            quote = await self.get_swap_quote(amount, from_token, to_token, sender_address)
 
         # Extract transaction details from the quote - updated for new response format
         tx_data = quote['transaction']
@@ -220,32 +446,24 @@ class MonorailSwapper:
             'data': tx_data['data'],
             'value': int(tx_data['value'], 16) if isinstance(tx_data['value'], str) and tx_data['value'].startswith(
                 '0x') else int(tx_data['value']),
-            'nonce': self.w3.eth.get_transaction_count(sender_address),
+            'nonce': await self.w3.eth.get_transaction_count(sender_address),
             'chainId': 10143  # Monad testnet chain ID
         }
 
-        # Use the gas estimated from quote if available, otherwise use a reasonable estimate
-        # Let the node estimate the gas to avoid hardcoding
+        # Use the gas limit learned from earlier swaps if available, otherwise let the node estimate it
         try:
-            transaction['gas'] = self.w3.eth.estimate_gas(transaction)
+            transaction['gas'] = await gas_model.async_estimate(self.w3, transaction)
         except Exception as e:
             logging.error(f"Account {self.display_address}: Error estimating gas {e}")
             # Fallback to a conservative estimate if estimation fails
             transaction['gas'] = 300000
 
-        # Add appropriate gas price parameters
-        block = self.w3.eth.get_block('latest')
-        if hasattr(block, 'baseFeePerGas') and block.baseFeePerGas is not None:
-            # Use EIP-1559 style gas parameters
-            transaction['maxFeePerGas'] = int(block.baseFeePerGas * 1.5)
-            transaction['maxPriorityFeePerGas'] = int(self.w3.eth.gas_price * 0.1)
-        else:
-            # Use legacy gas price
-            transaction['gasPrice'] = self.w3.eth.gas_price
+        # EIP-1559 fee parameters from the shared fee oracle
+        transaction.update(await fee_oracle.suggest(self.w3))
 
         return transaction
 
-    def execute_swap(self, amount: float, from_token: str, to_token: str) -> str:
+    async def execute_swap(self, amount: float, from_token: str, to_token: str) -> str:
         """
         Execute a token swap with the given parameters. If transaction fails,
         retry up to 3 times with increased gas.
@@ -268,12 +486,12 @@ class MonorailSwapper:
         # Use the class attributes instead of recreating them
         sender_address = self.wallet_address
 
-        # Updated to use the new estimate_max_output function
-        estimate = self.estimate_max_output(from_token, to_token, amount)
-        expected_output = estimate['output_amount']
+        # One quote gives both the expected output and the transaction
+        quote = await self.get_swap_quote(amount, from_token, to_token, sender_address)
+        expected_output = float(quote['output']) / 10 ** self.token_decimals(to_token)
 
         # Build the transaction
-        transaction = self.build_swap_transaction(amount, from_token, to_token, sender_address)
+        transaction = await self.build_swap_transaction(amount, from_token, to_token, sender_address, quote)
 
         # Set up retry logic
         max_retries = 1
@@ -300,25 +518,28 @@ class MonorailSwapper:
                         transaction['gasPrice'] = int(transaction['gasPrice'] * gas_multiplier)
 
                     # Update nonce in case previous transaction was mined
-                    transaction['nonce'] = self.w3.eth.get_transaction_count(sender_address)
+                    transaction['nonce'] = await self.w3.eth.get_transaction_count(sender_address)
 
                 # Sign the transaction
                 signed_tx = self.w3.eth.account.sign_transaction(transaction, self.private_key)
 
                 # Send the transaction
-                tx_hash = self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+                tx_hash = await self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
                 nonce = transaction['nonce']
-                mon_bal = self.get_bal()
+                mon_bal = await self.get_bal()
 
                 logging.info(
                     f"Account {self.display_address}: Bal {mon_bal} MON. Transaction #{nonce} sent! Hash: 0x{tx_hash.hex()}")
 
                 # Wait for transaction to be mined
-                tx_receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash, timeout=120)
+                tx_receipt = await self.w3.eth.wait_for_transaction_receipt(tx_hash, timeout=120)
+                gas_model.observe(transaction, tx_receipt)
+                wallet_balances.observe(transaction, tx_receipt)
                 gas_used = tx_receipt.gasUsed
-                eth_spent = self.w3.from_wei(gas_used * self.w3.eth.gas_price, 'ether')
+                eth_spent = self.w3.from_wei(gas_used * tx_receipt.effectiveGasPrice, 'ether')
 
                 # Check if transaction succeeded
+                balance_service.invalidate(sender_address)
                 if tx_receipt.status == 1:
                     logging.info(
                         f"Account {self.display_address}: Successfully swapped {amount} {from_token} -> {expected_output} {to_token}. Tx fees: {eth_spent:.5f} MON")
@@ -336,22 +557,20 @@ class MonorailSwapper:
                     continue
 
             except Exception as e:
-                if attempt == max_retries:
-                    logging.error(f"Account {self.display_address}: All {max_retries} swap attempts failed: {str(e)}")
+                # The class's policy decides, e.g. a revert or a funding error is never retried as is
+                delay = retry_delay(e, attempt) if attempt < max_retries else None
+                if delay is None:
+                    logging.error(f"Account {self.display_address}: Swap attempt {attempt}/{max_retries} failed: {str(e)}")
                     raise Exception(
-                        f"Account {self.display_address}: Failed to swap {amount} {from_token} -> {expected_output} {to_token} after {max_retries} attempts: {str(e)}")
-                elif "Signer had insufficient balance" in str(e):
-                    raise e
-                else:
-                    logging.warning(
-                        f"Account {self.display_address}: Swap attempt {attempt} failed: {str(e)}. Retrying...")
-                    # Sleep briefly before retrying
-                    time.sleep(2)
+                        f"Account {self.display_address}: Failed to swap {amount} {from_token} -> {expected_output} {to_token} after {attempt} attempts: {str(e)}")
+                logging.warning(
+                    f"Account {self.display_address}: Swap attempt {attempt} failed: {str(e)}. Retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
 
         # This should never be reached due to exceptions in the loop
         raise Exception("Unexpected error: reached end of execute_swap without success or exception")
 
-    def calculate_token_price(self, base_token: str, quote_token: str, amount: float = 1.0) -> float:
+    async def calculate_token_price(self, base_token: str, quote_token: str, amount: float = 1.0) -> float:
         """
         Calculate the price of one token in terms of another.
 
@@ -363,19 +582,22 @@ class MonorailSwapper:
         Returns:
             The price of base_token in terms of quote_token
         """
-        # Use a dummy address for the sender
-        dummy_address = "0x0000000000000000000000000000000000000000"
+        # Listed tokens at unit size come from the shared price matrix, unless it couldn't price the pair
+        if amount == 1.0 and base_token in self.TOKENS and quote_token in self.TOKENS:
+            price = await price_matrix.price(self, base_token, quote_token)
+            if price is not None:
+                return price
 
         # Get the quote
-        quote = self.get_swap_quote(amount, base_token, quote_token, dummy_address)
+        quote = await self.get_swap_quote(amount, base_token, quote_token, DUMMY_SENDER)
 
-        # Extract the output amount - updated for new response format
-        output_amount = float(quote['output']) / 10 ** 18  # Assuming the value is in wei format
+        # Extract the output amount in the quote token's units
+        output_amount = float(quote['output']) / 10 ** self.token_decimals(quote_token)
 
         # Calculate and return the price
         return output_amount / amount
 
-    def estimate_max_output(self, from_token: str, to_token: str, input_amount: float) -> Dict[str, Any]:
+    async def estimate_max_output(self, from_token: str, to_token: str, input_amount: float) -> Dict[str, Any]:
         """
         Estimate the maximum output amount and route details for a swap.
 
@@ -387,19 +609,18 @@ class MonorailSwapper:
         Returns:
             Dictionary with output amount, route details, and more
         """
-        # Use a dummy address for the sender
-        dummy_address = "0x0000000000000000000000000000000000000000"
-
         # Get the quote
-        quote = self.get_swap_quote(input_amount, from_token, to_token, dummy_address)
+        quote = await self.get_swap_quote(input_amount, from_token, to_token, DUMMY_SENDER)
 
-        # Extract relevant information - updated for new response format
+        # Extract relevant information, converting from each token's smallest unit
+        output_amount = float(quote['output']) / 10 ** self.token_decimals(to_token)
+        input_amount_quoted = float(quote['input']) / 10 ** self.token_decimals(from_token)
         result = {
             'input_amount': input_amount,
-            'output_amount': float(quote['output']) / 10 ** 18,  # Convert from wei
-            'min_output_amount': float(quote['min_output']) / 10 ** 18,  # Convert from wei
+            'output_amount': output_amount,
+            'min_output_amount': float(quote['min_output']) / 10 ** self.token_decimals(to_token),
             'hops': quote['hops'],
-            'effective_price': float(quote['output']) / (float(quote['input']) or 1)  # Calculate price ratio
+            'effective_price': output_amount / (input_amount_quoted or 1)  # Calculate price ratio
         }
 
         return result
@@ -427,21 +648,31 @@ class MonorailSwapper:
 
         raise ValueError(f"Unknown token: {token}. Available tokens: {', '.join(self.TOKENS.keys())}")
 
-    def get_bal(self):
+    def token_decimals(self, token: str) -> int:
+        """Decimals of a listed token symbol or address"""
+        if token not in self.TOKENS:
+            token = next((symbol for symbol, address in self.TOKENS.items() if address == token.lower()), token)
+        return self.TOKEN_DECIMALS.get(token, 18)
+
+    async def get_bal(self):
         # get MON bal
-        balance = self.w3.eth.get_balance(self.wallet_address)
+        balance = await wallet_balances.async_read(self.w3, self.wallet_address)
         balance_eth = round(self.w3.from_wei(balance, 'ether'), 3)
         return balance_eth
 
 
-async def swap_tokens(private_key, cycles=DAILY_SWAPS):
+async def swap_tokens(private_key, session, cycles=DAILY_SWAPS):
+    # Known before connecting, so a failed connection can still be reported and funded
+    wallet_address = Account.from_key(private_key).address
+    display_address = f"{wallet_address[:6]}...{wallet_address[-4:]}"
     count = 0
+    failures = 0  # Consecutive transient failures, bounded by the error class's retry policy
     while True:
         try:
             # Initialize the swapper
-            swapper = MonorailSwapper(get_web3_connection(), private_key)
+            swapper = await MonorailSwapper(get_web3_connection(use_async=True), private_key, session).connect()
             # Display balances for a specific address
-            swapper.display_wallet_balances()
+            await swapper.display_wallet_balances()
 
             rand_int = random.randint(1, 100)
             random_swap_amt = f"0.000{rand_int}"
@@ -449,13 +680,14 @@ async def swap_tokens(private_key, cycles=DAILY_SWAPS):
             random_token = random.choice(to_tokens)
 
             # Execute a swap (will sign and broadcast the transaction)
-            tx_hash = swapper.execute_swap(
+            tx_hash = await swapper.execute_swap(
                 amount=float(random_swap_amt),
                 from_token="MON",
                 to_token=random_token
             )
             count += 1
-            logging.info(f"Account {swapper.display_address}: Swap count: {count}/{cycles}..")
+            failures = 0
+            logging.info(f"Account {display_address}: Swap count: {count}/{cycles}..")
 
             # Check if cycle is complete
             if count >= cycles:
@@ -465,22 +697,28 @@ async def swap_tokens(private_key, cycles=DAILY_SWAPS):
                 await timeout()  # Normal wait between swaps
 
         except Exception as e:
-            if 'Signer had insufficient balance' in str(e):
+            error_class = classify(e)
+            if error_class is ErrorClass.FUNDING:
                 logging.warning(
-                    f"Account {swapper.display_address}: Signer had insufficient balance. Funding from Fund wallet..")
+                    f"Account {display_address}: Signer had insufficient balance. Funding from Fund wallet..")
                 # initialise funder
-                funder = MonorailSwapper(get_web3_connection(), FUNDER_PRIVATE_KEY)
-                funder.send_base_tokens(swapper.wallet_address, FUND_AMT)
-            elif 'Failed to connect to Monad network' in str(e):
-                logging.warning(f"Failed to connect to Monad network. Trying again")
-                await asyncio.sleep(5)
+                funder = MonorailSwapper(get_web3_connection(use_async=True), FUNDER_PRIVATE_KEY)
+                await funder.send_base_tokens(wallet_address, FUND_AMT)
+            elif error_class in (ErrorClass.TRANSIENT, ErrorClass.RATE_LIMIT):
+                failures += 1
+                delay = retry_delay(e, failures)
+                if delay is None:
+                    logging.error(f"Account {display_address}: Giving up after {failures} {error_class.value} errors ({e})")
+                    raise e
+                logging.warning(f"Account {display_address}: {error_class.value} error ({e}). Trying again in {delay:.2f}s")
+                await asyncio.sleep(delay)
 
             else:
                 logging.error(f"Error in Monorail swap {e}")
                 raise e
 
 
-async def run():
+async def run(private_keys=private_keys):
     """Run swapper with multiple private keys from private_keys.txt."""
 
     if not private_keys:
@@ -490,13 +728,19 @@ async def run():
 
     color_print(f"Starting Monad Swapper with {len(private_keys)} accounts...", "GREEN")
 
-    # Create tasks for each private key
-    tasks = []
-    for private_key in private_keys:
-        tasks.append(swap_tokens(private_key))
+    async with aiohttp.ClientSession() as session:
+        # Fetch every wallet's balances in one concurrent sweep for the first display
+        await balance_service.fetch_many(session, [Account.from_key(pk).address for pk in private_keys])
+
+        # Create tasks for each private key
+        tasks = []
+        for private_key in private_keys:
+            tasks.append(swap_tokens(private_key, session))
 
-    # Run all tasks concurrently
-    await asyncio.gather(*tasks)
+        # Run all tasks concurrently, as many at a time as the shared account limiter allows. Failures are
+        # collected, so one account raising doesn't close the session the others are still using
+        results = await account_limiter.gather(*tasks, return_exceptions=True)
+        log_account_failures("Monorail", private_keys, results)
 
 
 if __name__ == "__main__":
@@ -1,12 +1,19 @@
 """Programmatically stake on several some dApps (Kinstu, apriori, magma)"""
 
 from src.monorail import MonorailSwapper
+import aiohttp
 import asyncio
 import random
 import logging
 from web3.exceptions import Web3RPCError
 
-from utils import timeout, get_web3_connection, private_keys, data
+from utils import (timeout, get_web3_connection, private_keys, data, PIPELINED_TXS, account_limiter,
+                   log_account_failures)
+from transactions import send_pipelined
+from gas import gas_model
+from balances import wallet_balances
+from fees import fee_oracle
+from errors import ErrorClass, classify
 from logger import color_print
 
 # Constants
@@ -25,14 +32,17 @@ def get_random_stake_amount():
 
 
 class MonadStaker(MonorailSwapper):  # Inheriting attributes and method from MonadSwapper
-    def __init__(self, w3, private_key):
+    def __init__(self, w3, private_key, session=None):
         """
         Initialize a MonadStaker with your private key
 
         Args:
+            w3: AsyncWeb3 instance connected to Monad testnet
             private_key (str): Private key of the wallet to stake from
+            session: Shared aiohttp session used for the Monorail APIs
         """
-        super().__init__(w3, private_key)  # Call parent constructor
+        super().__init__(w3, private_key, session)  # Call parent constructor
+        self.last_receipt = None  # Receipt of the last transaction sent by _sign_and_send_transaction
 
         # Contract addresses
         self.kintsu_contract = "0x07AabD925866E8353407E67C1D157836f7Ad923e"
@@ -66,7 +76,7 @@ class MonadStaker(MonorailSwapper):  # Inheriting attributes and method from Mon
         # For debugging
         self.debug_mode = False
 
-    def kintsu_stake(self, amount_to_stake):
+    async def kintsu_stake(self, amount_to_stake):
         """
         Stake MON tokens to receive sMON tokens through Kintsu
 
@@ -82,24 +92,24 @@ class MonadStaker(MonorailSwapper):  # Inheriting attributes and method from Mon
         stake_amount_wei = self.w3.to_wei(amount_to_stake, 'ether')
 
         # Get current nonce
-        nonce = self.w3.eth.get_transaction_count(self.wallet_address)
+        nonce = await self.w3.eth.get_transaction_count(self.wallet_address)
 
         # Build transaction
-        txn = contract.functions.stake().build_transaction({
+        stake = contract.functions.stake()
+        txn = await stake.build_transaction(gas_model.with_limit(stake, {
             'from': self.wallet_address,
             'value': stake_amount_wei,
             'gas': 100000,
-            'maxFeePerGas': self.w3.to_wei(50, 'gwei'),
-            'maxPriorityFeePerGas': self.w3.to_wei(2, 'gwei'),
+            **await fee_oracle.suggest(self.w3),
             'nonce': nonce,
-            'chainId': self.w3.eth.chain_id,
+            'chainId': await self.w3.eth.chain_id,
             'type': 2  # EIP-1559 transaction
-        })
+        }))
 
         # Sign and send transaction
-        return self._sign_and_send_transaction(txn, f"Staked {amount_to_stake} MON for sMON via Kintsu")
+        return await self._sign_and_send_transaction(txn, f"Staked {amount_to_stake} MON for sMON via Kintsu")
 
-    def apriori_stake(self, amount_to_stake):
+    async def apriori_stake(self, amount_to_stake):
         """
         Stake MON tokens to receive aprMON tokens through Apriori
 
@@ -116,45 +126,47 @@ class MonadStaker(MonorailSwapper):  # Inheriting attributes and method from Mon
         stake_amount_wei = self.w3.to_wei(amount_to_stake, 'ether')
 
         # Get current nonce
-        nonce = self.w3.eth.get_transaction_count(self.wallet_address)
+        nonce = await self.w3.eth.get_transaction_count(self.wallet_address)
 
         # Build transaction
-        txn = contract.functions.deposit(
+        deposit = contract.functions.deposit(
             stake_amount_wei,
             self.wallet_address  # receiver is the same as sender
-        ).build_transaction({
+        )
+        txn = await deposit.build_transaction(gas_model.with_limit(deposit, {
             'from': self.wallet_address,
             'value': stake_amount_wei,
             'gas': 100000,
-            'maxFeePerGas': self.w3.to_wei(50, 'gwei'),
-            'maxPriorityFeePerGas': self.w3.to_wei(2, 'gwei'),
+            **await fee_oracle.suggest(self.w3),
             'nonce': nonce,
-            'chainId': self.w3.eth.chain_id,
+            'chainId': await self.w3.eth.chain_id,
             'type': 2  # EIP-1559 transaction
-        })
+        }))
 
         # Sign and send transaction
-        return self._sign_and_send_transaction(txn, f"Staked {amount_to_stake} MON for aprMON via Apriori")
+        return await self._sign_and_send_transaction(txn, f"Staked {amount_to_stake} MON for aprMON via Apriori")
 
-    def _sign_and_send_transaction(self, transaction, success_message):
+    async def _sign_and_send_transaction(self, transaction, success_message):
         """Helper method to sign and send a transaction"""
         # Sign transaction
         signed_txn = self.w3.eth.account.sign_transaction(transaction, self.private_key)
 
         # Send transaction
-        tx_hash = self.w3.eth.send_raw_transaction(signed_txn.raw_transaction)
+        tx_hash = await self.w3.eth.send_raw_transaction(signed_txn.raw_transaction)
         tx_hash_hex = tx_hash.hex()
 
         nonce = transaction["nonce"]
-        mon_bal = self.get_bal()
+        mon_bal = await self.get_bal()
 
         logging.info(f"Account {self.display_address}: Bal {mon_bal} MON. Transaction #{nonce} sent! Hash: 0x{tx_hash_hex}")
 
         # Wait for transaction receipt
-        tx_receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash, timeout=120)
+        tx_receipt = await self.w3.eth.wait_for_transaction_receipt(tx_hash, timeout=120)
+        gas_model.observe(transaction, tx_receipt)
+        wallet_balances.observe(transaction, tx_receipt)
+        self.last_receipt = tx_receipt
         gas_used = tx_receipt.gasUsed
-        gas_price = self.w3.eth.gas_price
-        eth_spent = self.w3.from_wei(gas_used * gas_price, 'ether')
+        eth_spent = self.w3.from_wei(gas_used * tx_receipt.effectiveGasPrice, 'ether')
 
         if tx_receipt["status"] == 1:
             logging.info(f"Account {self.display_address}: Success! {success_message}. Tx fees: {eth_spent:.5f} MON")
@@ -163,44 +175,44 @@ class MonadStaker(MonorailSwapper):  # Inheriting attributes and method from Mon
             logging.error(f"Account {self.display_address}: Transaction failed. Tx fees: {eth_spent:.5f} MON")
             return None
 
-    def build_base_transaction(self):
+    async def build_base_transaction(self):
         # Get current nonce
-        nonce = self.w3.eth.get_transaction_count(self.wallet_address)
+        nonce = await self.w3.eth.get_transaction_count(self.wallet_address)
 
         # Build raw transaction with the provided function selector
         txn = {
             'from': self.wallet_address,
             'gas': 100000,
-            'maxFeePerGas': self.w3.to_wei(50, 'gwei'),
-            'maxPriorityFeePerGas': self.w3.to_wei(2, 'gwei'),
+            **await fee_oracle.suggest(self.w3),
             'nonce': nonce,
-            'chainId': self.w3.eth.chain_id,
+            'chainId': await self.w3.eth.chain_id,
             'type': 2
         }
         return txn
 
-    def magma_stake(self, amount_to_stake):
+    async def magma_stake(self, amount_to_stake):
         function_selector = '0xd5575982'
         # Convert amount to wei
         stake_amount_wei = self.w3.to_wei(amount_to_stake, 'ether')
 
         # Build raw transaction with the provided function selector
-        base_txn = self.build_base_transaction()
+        base_txn = await self.build_base_transaction()
         remaining_txn = {
             'to': self.magma_contract,
             'value': stake_amount_wei,
             'data': function_selector,  # Direct function selector without ABI
         }
         txn = {**base_txn, **remaining_txn}
+        txn['gas'] = gas_model.limit(txn) or txn['gas']
 
         # Sign and send transaction
-        return self._sign_and_send_transaction(txn, f"Staked {amount_to_stake} MON for gMON via Magma")
+        return await self._sign_and_send_transaction(txn, f"Staked {amount_to_stake} MON for gMON via Magma")
 
-    def magma_unstake(self, amount_to_unstake):
+    async def magma_unstake(self, amount_to_unstake):
         unstake_amount_wei = self.w3.to_wei(amount_to_unstake, 'ether')
 
         # Get current nonce
-        nonce = self.w3.eth.get_transaction_count(self.wallet_address)
+        nonce = await self.w3.eth.get_transaction_count(self.wallet_address)
 
         # Create function selector and parameter
         function_selector = "0x6fed1ea7"
@@ -212,7 +224,7 @@ class MonadStaker(MonorailSwapper):  # Inheriting attributes and method from Mon
         # Combine function selector and parameter
         data = function_selector + hex_amount
 
-        base_txn = self.build_base_transaction()
+        base_txn = await self.build_base_transaction()
         remaining_txn = {
             'to': self.magma_contract,
             'value': 0,
@@ -220,16 +232,45 @@ class MonadStaker(MonorailSwapper):  # Inheriting attributes and method from Mon
             'nonce': nonce
         }
         txn = {**base_txn, **remaining_txn}
+        txn['gas'] = gas_model.limit(txn) or txn['gas']
 
         # Sign and send transaction
-        return self._sign_and_send_transaction(txn, f"Un-staked {amount_to_unstake} gMON for MON via Magma")
+        return await self._sign_and_send_transaction(txn, f"Un-staked {amount_to_unstake} gMON for MON via Magma")
 
+    async def magma_stake_unstake(self, amount):
+        """
+        Stake on Magma and unstake the same amount with consecutive nonces, confirmed together
 
-async def stake_token(private_key, cycles=DAILY_STAKES):
+        The unstake only has to land after the stake, so both are signed up front (fixed gas limit from
+        build_base_transaction) and sent back-to-back instead of waiting out a receipt in between.
+        """
+        amount_wei = self.w3.to_wei(amount, 'ether')
+        base_txn = await self.build_base_transaction()
+        stake_txn = {**base_txn, 'to': self.magma_contract, 'value': amount_wei, 'data': '0xd5575982'}
+        unstake_txn = {**base_txn, 'to': self.magma_contract, 'value': 0,
+                       'data': "0x6fed1ea7" + hex(amount_wei)[2:].zfill(64)}
+        for txn in (stake_txn, unstake_txn):
+            txn['gas'] = gas_model.limit(txn) or txn['gas']
+
+        tx_hashes, receipts = await send_pipelined(self.w3, self.private_key, [stake_txn, unstake_txn])
+        logging.info(f"Account {self.display_address}: Magma stake/unstake sent! Hashes: "
+                     f"{', '.join('0x' + h for h in tx_hashes)}")
+
+        for tx_hash, receipt, message in zip(tx_hashes, receipts, [f"Staked {amount} MON for gMON via Magma",
+                                                                   f"Un-staked {amount} gMON for MON via Magma"]):
+            eth_spent = self.w3.from_wei(receipt.gasUsed * receipt.effectiveGasPrice, 'ether')
+            if receipt["status"] != 1:
+                logging.error(f"Account {self.display_address}: Transaction failed. Tx fees: {eth_spent:.5f} MON")
+                return None
+            logging.info(f"Account {self.display_address}: Success! {message}. Tx fees: {eth_spent:.5f} MON")
+        return '0x' + tx_hashes[-1]
+
+
+async def stake_token(private_key, session, cycles=DAILY_STAKES):
     count = 0
     while True:  # Infinite loop, till you interrupt
         try:
-            staker = MonadStaker(get_web3_connection(), private_key)
+            staker = await MonadStaker(get_web3_connection(use_async=True), private_key, session).connect()
 
             # Define possible staking methods
             staking_methods = STAKING_METHODS
@@ -249,11 +290,14 @@ async def stake_token(private_key, cycles=DAILY_STAKES):
 
                 # Call the selected staking method with the amount
                 color_print(f"Prepping to stake {amount} MON on {method_name.split('_')[0]}")
-                staking_method(amount)
+                if method_name == "magma_stake" and PIPELINED_TXS:
+                    await staker.magma_stake_unstake(amount)
+                    continue
+                await staking_method(amount)
                 if method_name == "magma_stake":
                     await timeout(30, 120)
                     color_print(f"Prepping to Unstake {amount} MON on {method_name.split('_')[0]}")
-                    staker.magma_unstake(amount)
+                    await staker.magma_unstake(amount)
 
             # after all thestaking for loop has been completed
             count += 1
@@ -266,20 +310,17 @@ async def stake_token(private_key, cycles=DAILY_STAKES):
                 await timeout(60, 200)
 
         except Web3RPCError as e:
-            error_list = ["intrinsic gas greater than limit", "Signer had insufficient balance"]
-            for error in error_list:
-                if error in str(e):
-                    logging.warning(
-                        f"Account {staker.display_address}: Ai craft error: {error}..")
-                    # initialise funder
-                    funder = MonadStaker(get_web3_connection(), FUNDER_PRIVATE_KEY)
-                    funder.send_base_tokens(staker.wallet_address, FUND_AMT)
-                else:
-                    logging.error(f"Error in stakers{e}.")
-                    raise e
+            if classify(e) is ErrorClass.FUNDING:
+                logging.warning(f"Account {staker.display_address}: Staker funding error: {e}..")
+                # initialise funder
+                funder = MonadStaker(get_web3_connection(use_async=True), FUNDER_PRIVATE_KEY)
+                await funder.send_base_tokens(staker.wallet_address, FUND_AMT)
+            else:
+                logging.error(f"Error in stakers{e}.")
+                raise e
 
 
-async def run():
+async def run(private_keys=private_keys):
     """Run staker with multiple private keys from private_keys.txt."""
 
     if not private_keys:
@@ -289,13 +330,16 @@ async def run():
 
     color_print(f"Starting Monad Staker with {len(private_keys)} accounts...", "GREEN")
 
-    # Create tasks for each private key
-    tasks = []
-    for private_key in private_keys:
-        tasks.append(stake_token(private_key))
+    async with aiohttp.ClientSession() as session:
+        # Create tasks for each private key
+        tasks = []
+        for private_key in private_keys:
+            tasks.append(stake_token(private_key, session))
 
-    # Run all tasks concurrently
-    await asyncio.gather(*tasks)
+        # Run all tasks concurrently, as many at a time as the shared account limiter allows. Failures are
+        # collected, so one account raising doesn't close the session the others are still using
+        results = await account_limiter.gather(*tasks, return_exceptions=True)
+        log_account_failures("Staker", private_keys, results)
 
 
 if __name__ == "__main__":
@@ -2,18 +2,29 @@ import random
 import time
 import asyncio
 from colorama import init, Fore, Style
-from utils import get_web3_connection, private_keys, data, handle_funding_error, monad_testnet_tokens
+from utils import (get_web3_connection, private_keys, data, handle_funding_error, monad_testnet_tokens, APPROVE_MAX,
+                   account_limiter)
+from gas import gas_model
+from balances import wallet_balances
+from fees import fee_oracle
+from rpc_cache import is_connected
+from allowances import allowance_index, approval_amount
+from retry import retry_delay
+from errors import ErrorClass, classify
+import metrics
 
 # Initialize colorama
 init(autoreset=True)
 
 # Constants
-RPC_URL = "https://testnet-rpc.monad.xyz/"
 EXPLORER_URL = "https://testnet.monadexplorer.com/tx/0x"
 UNISWAP_V2_ROUTER_ADDRESS = "0xCa810D095e90Daae6e867c19DF6D9A8C56db2c89"
 WETH_ADDRESS = "0x760AfE86e5de5fa0Ee542fc7B7B713e1c5425701"
 CHAIN_ID = 10143  # Monad testnet chain ID
 CYCLES = data["DAILY_INTERACTION"]["DEX"]["uniswap"]
+PAIR_TTL = 300  # Seconds the pair index is reused before its reserves are read again
+MIN_LIQUIDITY = 10 ** 18  # WMON reserve (1 MON) a pair needs to be traded, keeping price impact under ~1%
+SLIPPAGE = 0.05  # Tolerated drift between the cached reserves and the ones the swap executes against
 
 # Token addresses
 TOKEN_ADDRESSES = monad_testnet_tokens
@@ -23,10 +34,19 @@ ERC20_ABI = [
     {"constant": True, "inputs": [{"name": "_owner", "type": "address"}], "name": "balanceOf",
      "outputs": [{"name": "balance", "type": "uint256"}], "type": "function"},
     {"constant": False, "inputs": [{"name": "_spender", "type": "address"}, {"name": "_value", "type": "uint256"}],
-     "name": "approve", "outputs": [{"name": "", "type": "bool"}], "type": "function"}
+     "name": "approve", "outputs": [{"name": "", "type": "bool"}], "type": "function"},
+    {"constant": True, "inputs": [{"name": "owner", "type": "address"}, {"name": "spender", "type": "address"}],
+     "name": "allowance", "outputs": [{"name": "", "type": "uint256"}], "type": "function"}
 ]
 
 ROUTER_ABI = [
+    {
+        "name": "factory",
+        "type": "function",
+        "stateMutability": "view",
+        "inputs": [],
+        "outputs": [{"internalType": "address", "name": "", "type": "address"}]
+    },
     {
         "name": "swapExactETHForTokens",
         "type": "function",
@@ -55,6 +75,112 @@ ROUTER_ABI = [
 ]
 
 
+FACTORY_ABI = [
+    {"constant": True, "inputs": [{"name": "tokenA", "type": "address"}, {"name": "tokenB", "type": "address"}],
+     "name": "getPair", "outputs": [{"name": "pair", "type": "address"}], "type": "function"}
+]
+
+PAIR_ABI = [
+    {"constant": True, "inputs": [], "name": "getReserves",
+     "outputs": [{"name": "reserve0", "type": "uint112"}, {"name": "reserve1", "type": "uint112"},
+                 {"name": "blockTimestampLast", "type": "uint32"}], "type": "function"}
+]
+
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+
+def get_amount_out(amount_in, reserve_in, reserve_out):
+    """UniswapV2Library.getAmountOut: constant product with the 0.3% fee"""
+    amount_in_with_fee = amount_in * 997
+    return amount_in_with_fee * reserve_out // (reserve_in * 1000 + amount_in_with_fee)
+
+
+class PairIndex:
+    def __init__(self, tokens, ttl=PAIR_TTL, min_liquidity=MIN_LIQUIDITY):
+        """
+        Token -> WMON V2 pairs with their reserves, read in two batched JSON-RPC requests
+
+        Only tokens whose pair holds at least `min_liquidity` WMON are offered for trading, and swap
+        outputs are computed from the cached reserves instead of being left unbounded.
+
+        Args:
+            tokens: Symbol -> token address of every candidate token
+            ttl: Seconds the index is reused before it is rebuilt
+            min_liquidity: WMON reserve in wei a pair needs to be traded
+        """
+        self.tokens = tokens
+        self.ttl = ttl
+        self.min_liquidity = min_liquidity
+        self.pairs = {}  # Symbol -> {'token', 'pair', 'reserve_token', 'reserve_weth'}
+        self.fetched_at = 0.0
+        self.lock = asyncio.Lock()
+
+    async def refresh(self, w3):
+        """Read getPair for every token, then getReserves for every existing pair"""
+        weth = w3.to_checksum_address(WETH_ADDRESS)
+        router = w3.eth.contract(address=w3.to_checksum_address(UNISWAP_V2_ROUTER_ADDRESS), abi=ROUTER_ABI)
+        factory = w3.eth.contract(address=await router.functions.factory().call(), abi=FACTORY_ABI)
+        tokens = {symbol: w3.to_checksum_address(address) for symbol, address in self.tokens.items()}
+
+        async with w3.batch_requests() as batch:
+            for token in tokens.values():
+                batch.add(factory.functions.getPair(token, weth))
+            pair_addresses = await batch.async_execute()
+        pairs = {symbol: (token, pair) for (symbol, token), pair in zip(tokens.items(), pair_addresses)
+                 if pair != ZERO_ADDRESS}
+
+        reserves = []
+        if pairs:
+            async with w3.batch_requests() as batch:
+                for _, pair in pairs.values():
+                    batch.add(w3.eth.contract(address=pair, abi=PAIR_ABI).functions.getReserves())
+                reserves = await batch.async_execute()
+
+        self.pairs = {}
+        for (symbol, (token, pair)), (reserve0, reserve1, _) in zip(pairs.items(), reserves):
+            # V2 pairs order their tokens by address
+            token_is_0 = int(token, 16) < int(weth, 16)
+            reserve_token, reserve_weth = (reserve0, reserve1) if token_is_0 else (reserve1, reserve0)
+            if reserve_weth >= self.min_liquidity and reserve_token > 0:
+                self.pairs[symbol] = {'token': token, 'pair': pair, 'reserve_token': reserve_token,
+                                      'reserve_weth': reserve_weth}
+        self.fetched_at = time.time()
+        metrics.incr('uniswap_pairs.refresh')
+        print(f"{Fore.CYAN}🔎 Uniswap pairs with liquidity: {len(self.pairs)}/{len(tokens)}{Style.RESET_ALL}")
+
+    async def liquid(self, w3):
+        """Symbol -> pair entry of every tradable token, rebuilding the index when stale"""
+        if time.time() - self.fetched_at >= self.ttl:
+            async with self.lock:
+                if time.time() - self.fetched_at >= self.ttl:  # Not rebuilt while we were waiting
+                    await self.refresh(w3)
+        return self.pairs
+
+    async def choose(self, w3):
+        """Random tradable (symbol, token address)"""
+        pairs = await self.liquid(w3)
+        if not pairs:
+            raise Exception("No Uniswap V2 pair with enough liquidity")
+        symbol = random.choice(list(pairs))
+        return symbol, pairs[symbol]['token']
+
+    def min_out(self, symbol, amount_in, buy=True):
+        """amountOutMin for a MON -> token (buy) or token -> MON swap, from the cached reserves"""
+        pair = self.pairs.get(symbol)
+        if pair is None:
+            return 0
+        reserves = (pair['reserve_weth'], pair['reserve_token']) if buy else (pair['reserve_token'], pair['reserve_weth'])
+        return int(get_amount_out(amount_in, *reserves) * (1 - SLIPPAGE))
+
+    def invalidate(self):
+        """Rebuild on next use, e.g. after a swap reverted against stale reserves"""
+        self.fetched_at = 0.0
+
+
+# Shared by every account in the process
+pair_index = PairIndex(TOKEN_ADDRESSES)
+
+
 # Display functions
 def print_border(text, color=Fore.CYAN, width=60):
     print(f"{color}┌{'─' * (width - 2)}┐{Style.RESET_ALL}")
@@ -74,10 +200,10 @@ def print_step(step, message):
 
 
 # Get web3 connection for account
-def get_w3_for_account():
+async def get_w3_for_account():
     try:
-        w3 = get_web3_connection()
-        if not w3.is_connected():
+        w3 = get_web3_connection(use_async=True)
+        if not await is_connected(w3):
             raise Exception("RPC connection failed")
         return w3
     except Exception as e:
@@ -85,11 +211,6 @@ def get_w3_for_account():
         return None
 
 
-# Random delay between 60-180 seconds
-def get_random_delay():
-    return random.randint(60, 180)
-
-
 # Generate random amount (0.0001 - 0.01 MON)
 def get_random_amount(w3):
     min_val = 0.0001
@@ -105,40 +226,44 @@ async def approve_token(private_key, token_address, amount, token_symbol, w3):
         wallet = account.address[:5] + "..." + account.address[-5:]
 
         token_contract = w3.eth.contract(address=w3.to_checksum_address(token_address), abi=ERC20_ABI)
-        balance = token_contract.functions.balanceOf(account.address).call()
+        balance = await wallet_balances.async_read(w3, account.address, token_address)
 
         if balance < amount:
             raise ValueError(
                 f"Insufficient {token_symbol} balance: {w3.from_wei(balance, 'ether')} < {w3.from_wei(amount, 'ether')}")
 
+        router = w3.to_checksum_address(UNISWAP_V2_ROUTER_ADDRESS)
+        if await allowance_index.async_read(token_contract, account.address, router, amount) >= amount:
+            print_step('approve', f"{Fore.GREEN}{token_symbol} already approved{Style.RESET_ALL}")
+            return
+
         print_step('approve', f'Approving {token_symbol} spending')
 
-        tx = token_contract.functions.approve(w3.to_checksum_address(UNISWAP_V2_ROUTER_ADDRESS),
-                                              amount).build_transaction({
+        approve = token_contract.functions.approve(router, approval_amount(amount, APPROVE_MAX))
+        tx = await approve.build_transaction(gas_model.with_limit(approve, {
             'from': account.address,
-            'gasPrice': w3.eth.gas_price,
-            'nonce': w3.eth.get_transaction_count(account.address),
+            'gasPrice': await fee_oracle.gas_price(w3),
+            'nonce': await w3.eth.get_transaction_count(account.address),
             'chainId': CHAIN_ID
-        })
-
-        estimated_gas = w3.eth.estimate_gas(tx)
-        tx['gas'] = estimated_gas
+        }))
 
-        gas_price_wei = w3.eth.gas_price
-        gas_cost_wei = estimated_gas * gas_price_wei
+        gas_cost_wei = tx['gas'] * tx['gasPrice']
         gas_cost_mon = w3.from_wei(gas_cost_wei, 'ether')
 
         signed_tx = w3.eth.account.sign_transaction(tx, private_key)
-        tx_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+        tx_hash = await w3.eth.send_raw_transaction(signed_tx.raw_transaction)
 
         print_step('approve',
                    f"Tx: {Fore.YELLOW}{EXPLORER_URL}{tx_hash.hex()}{Style.RESET_ALL} | Gas {gas_cost_mon} MON")
         await asyncio.sleep(1)
-        receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+        receipt = await w3.eth.wait_for_transaction_receipt(tx_hash)
+        gas_model.observe(tx, receipt)
+        wallet_balances.observe(tx, receipt)
 
         if receipt['status'] != 1:
             raise Exception(f"Approval failed: Status {receipt['status']}")
 
+        allowance_index.record_receipt(receipt)
         print_step('approve', f"{Fore.GREEN}Approval successful!{Style.RESET_ALL}")
 
     except Exception as e:
@@ -155,48 +280,50 @@ async def swap_mon_to_token(private_key, token_address, amount, token_symbol, w3
         start_msg = f"Buy {w3.from_wei(amount, 'ether')} MON → {token_symbol} | {wallet}"
         print_border(start_msg)
 
-        mon_balance = w3.eth.get_balance(account.address)
+        mon_balance = await wallet_balances.async_read(w3, account.address)
         if mon_balance < amount:
             raise ValueError(
                 f"Insufficient MON balance: {w3.from_wei(mon_balance, 'ether')} < {w3.from_wei(amount, 'ether')}")
 
         router_contract = w3.eth.contract(address=w3.to_checksum_address(UNISWAP_V2_ROUTER_ADDRESS), abi=ROUTER_ABI)
 
-        tx = router_contract.functions.swapExactETHForTokens(
-            0,  # amountOutMin (0 for simplicity)
+        swap = router_contract.functions.swapExactETHForTokens(
+            pair_index.min_out(token_symbol, amount),  # amountOutMin from the cached reserves
             [w3.to_checksum_address(WETH_ADDRESS), w3.to_checksum_address(token_address)],
             account.address,
             int(time.time()) + 600  # deadline
-        ).build_transaction({
+        )
+        tx = await swap.build_transaction(gas_model.with_limit(swap, {
             'from': account.address,
             'value': amount,
-            'gasPrice': w3.eth.gas_price,
-            'nonce': w3.eth.get_transaction_count(account.address),
+            'gasPrice': await fee_oracle.gas_price(w3),
+            'nonce': await w3.eth.get_transaction_count(account.address),
             'chainId': CHAIN_ID
-        })
+        }))
 
-        estimated_gas = w3.eth.estimate_gas(tx)
-        tx['gas'] = estimated_gas
-
-        gas_price_wei = w3.eth.gas_price
-        gas_cost_wei = estimated_gas * gas_price_wei
+        gas_cost_wei = tx['gas'] * tx['gasPrice']
         gas_cost_mon = w3.from_wei(gas_cost_wei, 'ether')
 
         print_step('swap_buy', 'Sending transaction...')
         signed_tx = w3.eth.account.sign_transaction(tx, private_key)
-        tx_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+        tx_hash = await w3.eth.send_raw_transaction(signed_tx.raw_transaction)
 
         print_step('swap_buy',
                    f"Tx: {Fore.YELLOW}{EXPLORER_URL}{tx_hash.hex()}{Style.RESET_ALL} | Gas {gas_cost_mon} MON")
         await asyncio.sleep(1)
-        receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+        receipt = await w3.eth.wait_for_transaction_receipt(tx_hash)
+        gas_model.observe(tx, receipt)
+        wallet_balances.observe(tx, receipt)
 
         if receipt['status'] == 1:
             print_step('swap_buy', f"{Fore.GREEN}Buy successful!{Style.RESET_ALL}")
         else:
+            pair_index.invalidate()  # Most likely reserves moved past the slippage bound
             raise Exception(f"Transaction failed: Status {receipt['status']}")
 
     except Exception as e:
+        if classify(e) is ErrorClass.REVERT:
+            pair_index.invalidate()  # Re-read reserves before the next attempt
         print_step('swap_buy', f"{Fore.RED}Failed: {str(e)}{Style.RESET_ALL}")
         raise
 
@@ -211,7 +338,7 @@ async def swap_token_to_mon(private_key, token_address, token_symbol, w3):
         print_border(start_msg)
 
         token_contract = w3.eth.contract(address=w3.to_checksum_address(token_address), abi=ERC20_ABI)
-        balance = token_contract.functions.balanceOf(account.address).call()
+        balance = await wallet_balances.async_read(w3, account.address, token_address)
 
         if balance == 0:
             print_step('swap_sell', f"{Fore.YELLOW}No {token_symbol} balance, skipping{Style.RESET_ALL}")
@@ -222,132 +349,133 @@ async def swap_token_to_mon(private_key, token_address, token_symbol, w3):
 
         router_contract = w3.eth.contract(address=w3.to_checksum_address(UNISWAP_V2_ROUTER_ADDRESS), abi=ROUTER_ABI)
 
-        tx = router_contract.functions.swapExactTokensForETH(
+        swap = router_contract.functions.swapExactTokensForETH(
             balance,  # amountIn
-            0,  # amountOutMin (0 for simplicity)
+            pair_index.min_out(token_symbol, balance, buy=False),  # amountOutMin from the cached reserves
             [w3.to_checksum_address(token_address), w3.to_checksum_address(WETH_ADDRESS)],
             account.address,
             int(time.time()) + 600  # deadline
-        ).build_transaction({
+        )
+        tx = await swap.build_transaction(gas_model.with_limit(swap, {
             'from': account.address,
-            'gasPrice': w3.eth.gas_price,
-            'nonce': w3.eth.get_transaction_count(account.address),
+            'gasPrice': await fee_oracle.gas_price(w3),
+            'nonce': await w3.eth.get_transaction_count(account.address),
             'chainId': CHAIN_ID
-        })
-
-        estimated_gas = w3.eth.estimate_gas(tx)
-        tx['gas'] = estimated_gas
+        }))
 
-        gas_price_wei = w3.eth.gas_price
-        gas_cost_wei = estimated_gas * gas_price_wei
+        gas_cost_wei = tx['gas'] * tx['gasPrice']
         gas_cost_mon = w3.from_wei(gas_cost_wei, 'ether')
 
         print_step('swap_sell', 'Sending transaction...')
         signed_tx = w3.eth.account.sign_transaction(tx, private_key)
-        tx_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+        tx_hash = await w3.eth.send_raw_transaction(signed_tx.raw_transaction)
 
         print_step('swap_sell',
                    f"Tx: {Fore.YELLOW}{EXPLORER_URL}{tx_hash.hex()}{Style.RESET_ALL} | Gas {gas_cost_mon} MON")
         await asyncio.sleep(1)
-        receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+        receipt = await w3.eth.wait_for_transaction_receipt(tx_hash)
+        gas_model.observe(tx, receipt)
+        wallet_balances.observe(tx, receipt)
 
         if receipt['status'] == 1:
+            allowance_index.spend(account.address, token_contract.address, router_contract.address, balance)
             print_step('swap_sell', f"{Fore.GREEN}Sell successful!{Style.RESET_ALL}")
         else:
+            pair_index.invalidate()  # Most likely reserves moved past the slippage bound
             raise Exception(f"Transaction failed: Status {receipt['status']}")
 
     except Exception as e:
+        # The sell may have relied on a stale allowance entry; re-read it next time
+        allowance_index.forget(account.address, w3.to_checksum_address(token_address), UNISWAP_V2_ROUTER_ADDRESS)
         print_step('swap_sell', f"{Fore.RED}Failed: {str(e)}{Style.RESET_ALL}")
         raise
 
 
-# Run swap cycle for each private key
+# Run the swap cycles for one account, retrying the account up to 3 times. Returns True on success
+async def run_account(account_idx, private_key, cycles, total):
+    account_retries = 1
+
+    while account_retries <= 3:
+        try:
+            # Get fresh w3 connection for each account attempt
+            w3 = await get_w3_for_account()
+            if not w3:
+                raise Exception("Web3 connection failed")
+
+            wallet_ = w3.eth.account.from_key(private_key).address
+            wallet = f"{wallet_[:5]}...{wallet_[-5:]}"
+
+            if account_retries == 1:
+                print_border(f"ACCOUNT {account_idx}/{total} | {wallet}", Fore.CYAN)
+            else:
+                print_border(f"ACCOUNT {account_idx}/{total} RETRY {account_retries}/3 | {wallet}", Fore.YELLOW)
+
+            for i in range(cycles):
+                print_border(f"UNISWAP CYCLE {i + 1}/{cycles} | {wallet}")
+                amount = get_random_amount(w3)
+
+                # Randomly select a token that has a pair with liquidity
+                token_symbol, token_address = await pair_index.choose(w3)
+                swap_retries = 1
+
+                while swap_retries <= 3:
+                    try:
+                        # Buy token with MON
+                        await swap_mon_to_token(private_key, token_address, amount, token_symbol, w3)
+                        await asyncio.sleep(random.randint(30, 60))  # Wait between swaps
+
+                        # Sell token back to MON
+                        # await swap_token_to_mon(private_key, token_address, token_symbol, w3)
+                        break
+
+                    except Exception as e:
+                        print(f"{Fore.RED}⚠️ Swap attempt {swap_retries} failed: {str(e)[:50]}...{Style.RESET_ALL}")
+                        # The funder still uses the sync client, so keep it off the event loop
+                        if await asyncio.to_thread(handle_funding_error, e, wallet_):
+                            swap_retries += 1
+                            continue
+                        elif swap_retries < 3 and (delay := retry_delay(e, swap_retries)) is not None:
+                            print(f"{Fore.YELLOW}🔄 Retrying swap in {delay:.2f} seconds...{Style.RESET_ALL}")
+                            await asyncio.sleep(delay)
+                            # Randomly select a token that has a pair with liquidity
+                            token_symbol, token_address = await pair_index.choose(w3)
+                            swap_retries += 1
+                            continue
+                        else:
+                            raise  # Propagate error to account level
+
+                if i < cycles - 1:
+                    delay = random.randint(30, 60)
+                    print(f"\n{Fore.YELLOW}⏳ Waiting {delay / 60:.1f} minutes before next cycle...{Style.RESET_ALL}")
+                    await asyncio.sleep(delay)
+
+            # If we reach here, all cycles completed successfully
+            print(f"{Fore.GREEN}✅ Account {account_idx} completed successfully{Style.RESET_ALL}")
+            return True
+
+        except Exception as e:
+            print(f"{Fore.RED}❌ Account {account_idx} attempt {account_retries} failed: {str(e)[:50]}..."
+                  f"{Style.RESET_ALL}")
+
+            if await asyncio.to_thread(handle_funding_error, e, wallet_ if 'wallet_' in locals() else 'Unknown'):
+                account_retries += 1
+                continue
+            elif account_retries < 3 and (delay := retry_delay(e, account_retries)) is not None:
+                print(f"{Fore.YELLOW}🔄 Retrying account in {delay:.2f} seconds...{Style.RESET_ALL}")
+                await asyncio.sleep(delay)
+                account_retries += 1
+                continue
+            else:
+                print(f"{Fore.RED}💀 Account {account_idx} failed after 3 attempts, skipping...{Style.RESET_ALL}")
+                return False
+    return False
+
+
+# Run swap cycle for every account, as many at a time as the shared account limiter allows
 async def run_swap_cycle(cycles, private_keys):
-    successful_accounts = 0
-
-    for account_idx, private_key in enumerate(private_keys, 1):
-        account_retries = 1
-
-        while account_retries <= 3:
-            try:
-                # Get fresh w3 connection for each account attempt
-                w3 = get_w3_for_account()
-                if not w3:
-                    raise Exception("Web3 connection failed")
-
-                wallet_ = w3.eth.account.from_key(private_key).address
-                wallet = f"{wallet_[:5]}...{wallet_[-5:]}"
-
-                if account_retries == 1:
-                    print_border(f"ACCOUNT {account_idx}/{len(private_keys)} | {wallet}", Fore.CYAN)
-                else:
-                    print_border(f"ACCOUNT {account_idx}/{len(private_keys)} RETRY {account_retries}/3 | {wallet}",
-                                 Fore.YELLOW)
-
-                for i in range(cycles):
-                    print_border(f"UNISWAP CYCLE {i + 1}/{cycles} | {wallet}")
-                    amount = get_random_amount(w3)
-
-                    # Randomly select a token to trade
-                    token_symbol, token_address = random.choice(list(TOKEN_ADDRESSES.items()))
-                    swap_retries = 1
-
-                    while swap_retries <= 3:
-                        try:
-                            # Buy token with MON
-                            await swap_mon_to_token(private_key, token_address, amount, token_symbol, w3)
-                            await asyncio.sleep(random.randint(30, 60))  # Wait between swaps
-
-                            # Sell token back to MON
-                            # await swap_token_to_mon(private_key, token_address, token_symbol, w3)
-                            break
-
-                        except Exception as e:
-                            print(f"{Fore.RED}⚠️ Swap attempt {swap_retries} failed: {str(e)[:50]}...{Style.RESET_ALL}")
-                            if handle_funding_error(e, wallet_):
-                                swap_retries += 1
-                                continue
-                            elif swap_retries < 3:
-                                print(f"{Fore.YELLOW}🔄 Retrying swap in 30 seconds...{Style.RESET_ALL}")
-                                await asyncio.sleep(30)
-                                # Randomly select a token to trade
-                                token_symbol, token_address = random.choice(list(TOKEN_ADDRESSES.items()))
-                                swap_retries += 1
-                                continue
-                            else:
-                                raise  # Propagate error to account level
-
-                    if i < cycles - 1:
-                        delay = random.randint(30, 60)
-                        print(
-                            f"\n{Fore.YELLOW}⏳ Waiting {delay / 60:.1f} minutes before next cycle...{Style.RESET_ALL}")
-                        await asyncio.sleep(delay)
-
-                # If we reach here, all cycles completed successfully
-                successful_accounts += 1
-                print(f"{Fore.GREEN}✅ Account {account_idx} completed successfully{Style.RESET_ALL}")
-                break  # Exit retry loop on success
-
-            except Exception as e:
-                print(
-                    f"{Fore.RED}❌ Account {account_idx} attempt {account_retries} failed: {str(e)[:50]}...{Style.RESET_ALL}")
-
-                if handle_funding_error(e, wallet_ if 'wallet_' in locals() else 'Unknown'):
-                    account_retries += 1
-                    continue
-                elif account_retries < 3:
-                    print(f"{Fore.YELLOW}🔄 Retrying account in 30 seconds...{Style.RESET_ALL}")
-                    await asyncio.sleep(30)
-                    account_retries += 1
-                    continue
-                else:
-                    print(f"{Fore.RED}💀 Account {account_idx} failed after 3 attempts, skipping...{Style.RESET_ALL}")
-                    break
-
-        if account_idx < len(private_keys):
-            delay = get_random_delay()
-            print(f"\n{Fore.YELLOW}⏳ Waiting {delay / 60:.1f} minutes before next account...{Style.RESET_ALL}")
-            await asyncio.sleep(delay)
+    results = await account_limiter.gather(*(run_account(account_idx, private_key, cycles, len(private_keys))
+                                             for account_idx, private_key in enumerate(private_keys, 1)))
+    successful_accounts = sum(1 for result in results if result)
 
     print(f"{Fore.GREEN}{'═' * 60}{Style.RESET_ALL}")
     print(
@@ -356,7 +484,7 @@ async def run_swap_cycle(cycles, private_keys):
 
 
 # Main function
-async def run():
+async def run(private_keys=private_keys):
     print(f"{Fore.GREEN}{'═' * 60}{Style.RESET_ALL}")
     print(f"{Fore.GREEN}│ {'UNISWAP V2 - MONAD TESTNET':^56} │{Style.RESET_ALL}")
     print(f"{Fore.GREEN}{'═' * 60}{Style.RESET_ALL}")
@@ -0,0 +1,255 @@
+"""Shared async WMON wrap/unwrap engine used by the bebop, izumi and rubic scripts"""
+
+import asyncio
+import random
+from typing import Optional, Tuple
+from colorama import init, Fore, Style
+from web3 import AsyncWeb3
+from utils import get_web3_connection, handle_funding_error, PIPELINED_TXS, account_limiter
+from concurrency import AimdLimiter
+from transactions import send_pipelined
+from gas import gas_model
+from balances import wallet_balances
+from fees import fee_oracle
+from rpc_cache import is_connected
+from retry import retry_delay
+
+# Initialize colorama
+init(autoreset=True)
+
+# Constants
+EXPLORER_URL = "https://testnet.monadexplorer.com/tx/0x"
+WMON_CONTRACT = "0x760AfE86e5de5fa0Ee542fc7B7B713e1c5425701"
+CHAIN_ID = 10143  # Monad testnet chain ID
+ATTEMPTS = 3
+UNWRAP_GAS_LIMIT = 60000  # Used when the unwrap is signed before the wrap is mined and can't be estimated
+
+# Smart contract ABI
+WMON_ABI = [
+    {"constant": False, "inputs": [], "name": "deposit", "outputs": [], "payable": True, "stateMutability": "payable",
+     "type": "function"},
+    {"constant": False, "inputs": [{"name": "amount", "type": "uint256"}], "name": "withdraw", "outputs": [],
+     "payable": False, "stateMutability": "nonpayable", "type": "function"},
+]
+
+
+# Display border function
+def print_border(text, color=Fore.CYAN, width=60):
+    print(f"{color}┌{'─' * (width - 2)}┐{Style.RESET_ALL}")
+    print(f"{color}│ {text:^56} │{Style.RESET_ALL}")
+    print(f"{color}└{'─' * (width - 2)}┘{Style.RESET_ALL}")
+
+
+# Display step function
+def print_step(step, message):
+    steps = {
+        'wrap': 'Wrap MON',
+        'unwrap': 'Unwrap WMON'
+    }
+    step_text = steps[step]
+    print(f"{Fore.YELLOW}➤ {Fore.CYAN}{step_text:<15}{Style.RESET_ALL} | {message}")
+
+
+class WmonEngine:
+    """
+    Wraps MON into WMON and back for many accounts concurrently.
+
+    Every account runs its own wrap → unwrap cycles; the shared account limiter decides how many are in flight.
+    """
+
+    def __init__(self, name: str, cycles: int, amount_range: Tuple[float, float] = (0.01, 0.05),
+                 delay_range: Tuple[int, int] = (60, 180), limiter: AimdLimiter = account_limiter,
+                 pipelined: bool = PIPELINED_TXS):
+        """
+        Args:
+            name: Display name of the dApp driving the engine (e.g. "BEBOP")
+            cycles: Number of wrap/unwrap cycles per account
+            amount_range: Min and max MON to wrap per cycle
+            delay_range: Min and max seconds to wait between an account's cycles
+            limiter: Account slots shared with every other script, sized by RPC health
+            pipelined: Send wrap and unwrap back-to-back with nonces n and n+1 and confirm them together
+        """
+        self.name = name
+        self.cycles = cycles
+        self.amount_range = amount_range
+        self.delay_range = delay_range
+        self.pipelined = pipelined
+        self.limiter = limiter
+
+    def get_random_amount(self) -> int:
+        """Random wrap amount in wei within `amount_range`."""
+        amount = random.uniform(*self.amount_range)
+        return AsyncWeb3.to_wei(round(amount, 4), 'ether')
+
+    async def _build(self, w3: AsyncWeb3, private_key: str, contract_function, value: int = 0,
+                     default_gas: Optional[int] = None) -> dict:
+        """
+        Build a WMON call with its gas limit served from the gas model.
+
+        While the model is cold the call is estimated, or `default_gas` is used if given (for calls that
+        can't be estimated yet because they depend on a pending transaction).
+        """
+        account = w3.eth.account.from_key(private_key)
+
+        params = {
+            'from': account.address,
+            'value': value,
+            'gasPrice': await fee_oracle.gas_price(w3),
+            'chainId': CHAIN_ID
+        }
+        gas = gas_model.limit_for(contract_function, value)
+        if gas is None:
+            gas = default_gas
+        if gas is not None:
+            params['gas'] = gas
+        tx = await contract_function.build_transaction(params)
+
+        if gas is None:
+            # build_transaction filled in estimate_gas
+            tx['gas'] = int(tx['gas'] * 1.1)
+        return tx
+
+    async def _send(self, w3: AsyncWeb3, private_key: str, contract_function, step: str, value: int = 0) -> str:
+        """Build, sign and send a WMON call, then wait for its receipt."""
+        account = w3.eth.account.from_key(private_key)
+
+        tx = await self._build(w3, private_key, contract_function, value)
+        tx['nonce'] = await w3.eth.get_transaction_count(account.address)
+        gas_cost_mon = w3.from_wei(tx['gas'] * tx['gasPrice'], 'ether')
+
+        signed_tx = w3.eth.account.sign_transaction(tx, private_key)
+        tx_hash = await w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+        print_step(step, f"Tx: {Fore.YELLOW}{EXPLORER_URL}{tx_hash.hex()}{Style.RESET_ALL} | Gas {gas_cost_mon} MON")
+
+        receipt = await w3.eth.wait_for_transaction_receipt(tx_hash)
+        gas_model.observe(tx, receipt)
+        wallet_balances.observe(tx, receipt)
+        if receipt['status'] != 1:
+            raise Exception(f"{step.title()} failed: {EXPLORER_URL}{tx_hash.hex()}")
+        return tx_hash.hex()
+
+    async def wrap(self, w3: AsyncWeb3, private_key: str, amount: int) -> str:
+        """Wrap `amount` wei of MON into WMON."""
+        try:
+            contract = w3.eth.contract(address=WMON_CONTRACT, abi=WMON_ABI)
+            tx_hash = await self._send(w3, private_key, contract.functions.deposit(), 'wrap', value=amount)
+            print_step('wrap', f"{Fore.GREEN}Wrap successful!{Style.RESET_ALL}")
+            return tx_hash
+        except Exception as e:
+            print_step('wrap', f"{Fore.RED}Failed: {str(e)}{Style.RESET_ALL}")
+            raise
+
+    async def unwrap(self, w3: AsyncWeb3, private_key: str, amount: int) -> str:
+        """Unwrap `amount` wei of WMON back into MON."""
+        try:
+            contract = w3.eth.contract(address=WMON_CONTRACT, abi=WMON_ABI)
+            tx_hash = await self._send(w3, private_key, contract.functions.withdraw(amount), 'unwrap')
+            print_step('unwrap', f"{Fore.GREEN}Unwrap successful!{Style.RESET_ALL}")
+            return tx_hash
+        except Exception as e:
+            print_step('unwrap', f"{Fore.RED}Failed: {str(e)}{Style.RESET_ALL}")
+            raise
+
+    async def wrap_unwrap_pipelined(self, w3: AsyncWeb3, private_key: str, amount: int) -> None:
+        """Sign wrap and unwrap with consecutive nonces, send both at once and confirm them with one wait."""
+        contract = w3.eth.contract(address=WMON_CONTRACT, abi=WMON_ABI)
+        try:
+            wrap_tx = await self._build(w3, private_key, contract.functions.deposit(), value=amount)
+            unwrap_tx = await self._build(w3, private_key, contract.functions.withdraw(amount),
+                                          default_gas=UNWRAP_GAS_LIMIT)
+
+            print_step('wrap', 'Sending wrap and unwrap back-to-back...')
+            tx_hashes, receipts = await send_pipelined(w3, private_key, [wrap_tx, unwrap_tx])
+        except Exception as e:
+            print_step('wrap', f"{Fore.RED}Failed: {str(e)}{Style.RESET_ALL}")
+            raise
+
+        for step, tx_hash, receipt in zip(('wrap', 'unwrap'), tx_hashes, receipts):
+            if receipt['status'] != 1:
+                print_step(step, f"{Fore.RED}Failed: {EXPLORER_URL}{tx_hash}{Style.RESET_ALL}")
+                raise Exception(f"{step.title()} failed: {EXPLORER_URL}{tx_hash}")
+            print_step(step, f"{Fore.GREEN}{step.title()} successful!{Style.RESET_ALL} "
+                             f"Tx: {Fore.YELLOW}{EXPLORER_URL}{tx_hash}{Style.RESET_ALL}")
+
+    async def swap_cycle(self, w3: AsyncWeb3, private_key: str, amount: int) -> None:
+        """Run one wrap → unwrap cycle."""
+        if self.pipelined:
+            await self.wrap_unwrap_pipelined(w3, private_key, amount)
+            return
+        await self.wrap(w3, private_key, amount)
+        await self.unwrap(w3, private_key, amount)
+
+    async def _handle_error(self, error: Exception, wallet_address: str, label: str, attempt: int) -> bool:
+        """Fund the wallet if the error calls for it, otherwise back off by error class. False means give up."""
+        print(f"{Fore.RED}⚠️ {label} attempt {attempt} failed: {str(error)[:50]}...{Style.RESET_ALL}")
+        # The funder still uses the sync client, so keep it off the event loop
+        if await asyncio.to_thread(handle_funding_error, error, wallet_address):
+            return True
+        delay = retry_delay(error, attempt)
+        if delay is None:
+            return False
+        print(f"{Fore.YELLOW}🔄 Retrying {label.lower()} in {delay:.2f} seconds...{Style.RESET_ALL}")
+        await asyncio.sleep(delay)
+        return True
+
+    async def run_account(self, account_idx: int, private_key: str, total: int) -> bool:
+        """Run all cycles for one account. Returns True if every cycle succeeded."""
+        wallet_address: Optional[str] = None
+
+        for account_attempt in range(1, ATTEMPTS + 1):
+            try:
+                w3 = get_web3_connection(use_async=True)
+                if not await is_connected(w3):
+                    raise Exception("RPC connection failed")
+
+                wallet_address = w3.eth.account.from_key(private_key).address
+                wallet = f"{wallet_address[:5]}...{wallet_address[-5:]}"
+
+                if account_attempt == 1:
+                    print_border(f"{self.name} | ACCOUNT {account_idx}/{total} | {wallet}", Fore.CYAN)
+                else:
+                    print_border(f"{self.name} | ACCOUNT {account_idx}/{total} RETRY {account_attempt}/{ATTEMPTS} | "
+                                 f"{wallet}", Fore.YELLOW)
+
+                for i in range(self.cycles):
+                    amount = self.get_random_amount()
+                    print_border(f"SWAP CYCLE {i + 1}/{self.cycles} | {w3.from_wei(amount, 'ether')} MON | {wallet}")
+
+                    for swap_attempt in range(1, ATTEMPTS + 1):
+                        try:
+                            await self.swap_cycle(w3, private_key, amount)
+                            break
+                        except Exception as e:
+                            if swap_attempt == ATTEMPTS or not await self._handle_error(e, wallet_address, "Swap",
+                                                                                        swap_attempt):
+                                raise  # Propagate error to account level
+
+                    if i < self.cycles - 1:
+                        delay = random.randint(*self.delay_range)
+                        print(f"\n{Fore.YELLOW}⏳ {wallet}: waiting {delay / 60:.1f} minutes before next cycle..."
+                              f"{Style.RESET_ALL}")
+                        await asyncio.sleep(delay)
+
+                print(f"{Fore.GREEN}✅ Account {account_idx} completed successfully{Style.RESET_ALL}")
+                return True
+
+            except Exception as e:
+                if account_attempt == ATTEMPTS or not await self._handle_error(
+                        e, wallet_address or 'Unknown', f"Account {account_idx}", account_attempt):
+                    print(f"{Fore.RED}💀 Account {account_idx} failed after {account_attempt} attempts, skipping..."
+                          f"{Style.RESET_ALL}")
+                    return False
+        return False
+
+    async def run(self, private_keys) -> int:
+        """Run every account with bounded parallelism. Returns the number of successful accounts."""
+
+        results = await self.limiter.gather(*(self.run_account(idx, pk, len(private_keys))
+                                              for idx, pk in enumerate(private_keys, 1)))
+        successful_accounts = sum(1 for result in results if result)
+
+        print(f"{Fore.GREEN}{'═' * 60}{Style.RESET_ALL}")
+        print(f"{Fore.GREEN}│ {f'DONE: {successful_accounts}/{len(private_keys)} accounts, {self.cycles} cycles each':^56} │"
+              f"{Style.RESET_ALL}")
+        print(f"{Fore.GREEN}{'═' * 60}{Style.RESET_ALL}")
+        return successful_accounts
@@ -1,27 +1,118 @@
 from src.stakers import MonadStaker
 import logging
-from utils import get_web3_connection, private_keys, data
+import time
+from eth_account import Account
+from utils import get_web3_connection, private_keys, data, account_limiter, log_account_failures
+from gas import gas_model
+from errors import ErrorClass, classify, revert_reason
+from retry import retry_delay
 from logger import color_print
+from state import load_state, save_state
+import metrics
 import random
+import aiohttp
 import asyncio
 from web3.exceptions import Web3RPCError
 
 # Constants
 FUND_AMT = data["FUND_AMOUNT"]
 FUNDER_PRIVATE_KEY = data["FUNDER_PRIVATE_KEY"]
+NOT_RESOLVABLE_REASON = "Position is not resolvable (actual value not yet updated)"
+RESOLVE_AFTER = 8 * 60  # Seconds after a bet until the market value it settles against is updated
+RESOLVE_RETRY = 2 * 60  # Seconds before retrying a position that failed to resolve
+RESOLVE_ATTEMPTS = 5  # Failed resolutions before a position is dropped
+SWEEP_LIMIT = RESOLVE_AFTER + RESOLVE_ATTEMPTS * RESOLVE_RETRY  # Seconds a run keeps resolving its positions
+
+
+class PositionTracker:
+    def __init__(self, name="zona_positions", resolve_after=RESOLVE_AFTER, retry_after=RESOLVE_RETRY,
+                 attempts=RESOLVE_ATTEMPTS):
+        """
+        Persistent store of open Zona positions, keyed by the hash of the bet transaction
+
+        Each position records the account, amount, block and time it was placed, and when it can be
+        resolved. Positions that fail to resolve are postponed by `retry_after` seconds and dropped
+        after `attempts` failures.
+
+        Args:
+            name: State file the positions are stored in (state/<name>.json)
+            resolve_after: Seconds after placement until a position becomes resolvable
+            retry_after: Seconds a failed resolution is postponed by
+            attempts: Failed resolutions before a position is dropped
+        """
+        self.name = name
+        self.resolve_after = resolve_after
+        self.retry_after = retry_after
+        self.attempts = attempts
+        self.positions = load_state(name, {})
+
+    def record(self, address, amount_wei, tx_hash, block, placed_at=None):
+        """Track a bet that was just placed"""
+        placed_at = time.time() if placed_at is None else placed_at
+        self.positions[tx_hash] = {
+            "account": address.lower(),
+            "amount": str(amount_wei),  # JSON can't hold uint256 as a number
+            "block": block,
+            "placed_at": placed_at,
+            "resolvable_at": placed_at + self.resolve_after,
+            "failures": 0,
+        }
+        save_state(self.name, self.positions)
+
+    def due(self, now=None):
+        """Account address -> hashes of its positions that can be resolved now"""
+        now = time.time() if now is None else now
+        accounts = {}
+        for tx_hash, position in self.positions.items():
+            if position["resolvable_at"] <= now:
+                accounts.setdefault(position["account"], []).append(tx_hash)
+        return accounts
+
+    def next_due(self, accounts=None):
+        """Earliest time a position of `accounts` (of any account when None) becomes resolvable, None without any"""
+        times = [position["resolvable_at"] for position in self.positions.values()
+                 if accounts is None or position["account"] in accounts]
+        return min(times, default=None)
+
+    def resolved(self, tx_hashes):
+        for tx_hash in tx_hashes:
+            self.positions.pop(tx_hash, None)
+        save_state(self.name, self.positions)
+
+    def postpone(self, tx_hashes, failed=True):
+        """Retry later; failed attempts count towards dropping the position"""
+        for tx_hash in tx_hashes:
+            position = self.positions.get(tx_hash)
+            if position is None:
+                continue
+            if failed:
+                position["failures"] += 1
+            if position["failures"] >= self.attempts:
+                logging.warning(f"Dropping Zona position {tx_hash} of {position['account']} after "
+                                f"{position['failures']} failed resolutions")
+                del self.positions[tx_hash]
+            else:
+                position["resolvable_at"] = time.time() + self.retry_after
+        save_state(self.name, self.positions)
+
+
+# Shared by every account in the process
+position_tracker = PositionTracker()
 
 
 class ZonaBet(MonadStaker):  # Inheriting attributes and method from MonadStaker
-    def __init__(self, w3, private_key):
+    def __init__(self, w3, private_key, session=None):
         """
         Initialize a MonadStaker with your private key
 
         Args:
+            w3: AsyncWeb3 instance connected to Monad testnet
             private_key (str): Private key of the wallet to stake from
+            session: Shared aiohttp session used for the Monorail APIs
         """
-        super().__init__(w3, private_key)  # Call parent constructor
+        super().__init__(w3, private_key, session)  # Call parent constructor
 
-    def zona_bet(self, amount_to_bet):
+    async def zona_bet(self, amount_to_bet):
         """Place a bet on Zona Finance with the specified amount."""
         # Convert amount to wei
         bet_amount_wei = self.w3.to_wei(amount_to_bet, 'ether')
@@ -46,41 +137,32 @@ class ZonaBet(MonadStaker):  # Inheriting attributes and method from MonadStaker
         ZONA_CONTRACT_ADDRESS = "0xf7efcB69E4D2E3f254ac57DF2C64c12CE381aeda"
 
         # Build base transaction
-        base_txn = self.build_base_transaction()
+        base_txn = await self.build_base_transaction()
 
-        # Estimate gas
         try:
-            gas_estimate = self.w3.eth.estimate_gas({
-                'to': ZONA_CONTRACT_ADDRESS,
-                'from': self.wallet_address,
-                'data': tx_data,
-                'value': bet_amount_wei
-            })
-
-            # Add some buffer to the gas estimate
-            gas_with_buffer = int(gas_estimate * 1.1)
-
             # Construct the full transaction
             txn = {
                 **base_txn,
                 'to': ZONA_CONTRACT_ADDRESS,
                 'value': bet_amount_wei,
                 'data': tx_data,
-                'gas': gas_with_buffer
             }
+            # Gas limit from the gas model, estimated with some buffer while it is cold
+            del txn['gas']
+            txn['gas'] = await gas_model.async_estimate(self.w3, txn, 1.1)
 
             # Sign and send transaction
-            return self._sign_and_send_transaction(txn, f"Bet {amount_to_bet} MON on zona finance success!")
+            return await self._sign_and_send_transaction(txn, f"Bet {amount_to_bet} MON on zona finance success!")
 
         except Exception as e:
             logging.error(f"Gas estimation failed: {e}")
             # You could implement fallback logic here if needed
             raise
 
-    def zona_resolve_bet(self):
+    async def zona_resolve_bet(self):
 
         # Build raw transaction with the provided function selector
-        base_txn = self.build_base_transaction()
+        base_txn = await self.build_base_transaction()
 
         # Override the gas value from base_txn
         # base_txn['gas'] = 150000
@@ -93,18 +175,22 @@ class ZonaBet(MonadStaker):  # Inheriting attributes and method from MonadStaker
         }
         txn = {**base_txn, **remaining_txn}
 
-        gas_estimate = self.w3.eth.estimate_gas(txn)
-        txn['gas'] = gas_estimate
+        # Simulate even when the gas model is warm and skips estimate_gas: a position that isn't
+        # resolvable yet reverts here with NOT_RESOLVABLE_REASON instead of burning gas on-chain
+        await self.w3.eth.call({key: txn[key] for key in ('from', 'to', 'value', 'data')})
+
+        del txn['gas']
+        txn['gas'] = await gas_model.async_estimate(self.w3, txn)
 
         # Sign and send transaction
-        return self._sign_and_send_transaction(txn, f"Bet resolved on zona finance successfully")
+        return await self._sign_and_send_transaction(txn, f"Bet resolved on zona finance successfully")
 
 
-async def place_bet(private_key):
+async def place_bet(private_key, session):
     """Place a single bet using the provided private key."""
     try:
         # Initialize the betting class
-        bet = ZonaBet(get_web3_connection(), private_key)
+        bet = await ZonaBet(get_web3_connection(use_async=True), private_key, session).connect()
 
         try:
             # Get a random bet amount between 0.001 and 0.005
@@ -112,25 +198,20 @@ async def place_bet(private_key):
 
             # Place the bet
             color_print(f"Account {bet.display_address}: Preparing to bet {bet_amount} tokens")
-            bet.zona_bet(bet_amount)
+            record_bet(bet, await bet.zona_bet(bet_amount), bet_amount)
             logging.info(f"Account {bet.display_address}: Placed bet successfully.")
 
         except Web3RPCError as e:
-            if 'Signer had insufficient balance' in str(e):
+            if classify(e) is ErrorClass.FUNDING:
                 logging.warning(
                     f"Account {bet.display_address}: Signer had insufficient balance. Funding from Fund wallet.."
                 )
                 # Initialize funder
-                funder = ZonaBet(get_web3_connection(), FUNDER_PRIVATE_KEY)
-                funder.send_base_tokens(bet.wallet_address, FUND_AMT)
-                # Try again after funding
-                await asyncio.sleep(30)
-                bet.zona_bet(bet_amount)
-            elif '0x08c379a000000000000000000000000000000000000000000000000000000000000000200000000000000000000000000000000000000000000000000000000000000039506f736974696f6e206973206e6f74207265736f6c7661626c65202861637475616c2076616c7565206e6f742079657420757064617465642900000000000000' in str(
-                    e):
-                # Handle the specific error mentioned in your example
-                logging.warning(
-                    f"Account {bet.display_address}: Position is not resolvable (actual value not yet updated)")
+                funder = ZonaBet(get_web3_connection(use_async=True), FUNDER_PRIVATE_KEY)
+                await funder.send_base_tokens(bet.wallet_address, FUND_AMT)
+                # Try again once the funding transfer is mined, after the funding policy's backoff
+                await asyncio.sleep(retry_delay(e, 1))
+                record_bet(bet, await bet.zona_bet(bet_amount), bet_amount)
             else:
                 logging.error(f"Account {bet.display_address}: Error {e}")
 
@@ -138,7 +219,61 @@ async def place_bet(private_key):
         color_print(f"Account {bet.display_address}: An error occurred: {e}", "RED")
 
 
-async def run():
+def record_bet(bet, tx_hash, bet_amount):
+    """Track a successfully placed bet so a later sweep resolves it"""
+    if tx_hash is None:
+        return  # Reverted, no position was opened
+    receipt = bet.last_receipt
+    position_tracker.record(bet.wallet_address, bet.w3.to_wei(bet_amount, 'ether'), tx_hash,
+                            receipt["blockNumber"] if receipt else None)
+
+
+async def resolve_positions(private_key, tx_hashes, session):
+    """Resolve one account's due positions, postponing them while the contract can't resolve yet"""
+    try:
+        bet = await ZonaBet(get_web3_connection(use_async=True), private_key, session).connect()
+        if await bet.zona_resolve_bet():
+            position_tracker.resolved(tx_hashes)
+            metrics.incr('zona.resolved', len(tx_hashes))
+        else:
+            position_tracker.postpone(tx_hashes)
+    except Exception as e:
+        reason = revert_reason(e)
+        if reason == NOT_RESOLVABLE_REASON:
+            # Market value not updated yet, not a failure of the position
+            logging.info(f"Zona positions {tx_hashes} not resolvable yet, retrying later")
+            position_tracker.postpone(tx_hashes, failed=False)
+            metrics.incr('zona.not_resolvable')
+        else:
+            logging.error(f"Zona resolution failed for {tx_hashes}: {reason or e}")
+            position_tracker.postpone(tx_hashes)
+
+
+async def sweep_positions(keys_by_address, session, limit=SWEEP_LIMIT):
+    """
+    Resolve the positions of these accounts as they become due, including the ones placed in this run
+
+    Sleeps until the earliest position is resolvable, resolves every due one, and repeats until none are
+    left or the next one isn't due within `limit` seconds; those are left to the next run.
+    """
+    deadline = time.time() + limit
+    while True:
+        due = {address: tx_hashes for address, tx_hashes in position_tracker.due().items()
+               if address in keys_by_address}
+        if due:
+            # resolve_positions handles its own errors, postponing what it couldn't resolve
+            await account_limiter.gather(*(resolve_positions(keys_by_address[address], tx_hashes, session)
+                                           for address, tx_hashes in due.items()))
+            continue
+
+        resolvable_at = position_tracker.next_due(keys_by_address)
+        if resolvable_at is None or resolvable_at > deadline:
+            return
+        logging.info(f"Next Zona position resolvable in {resolvable_at - time.time():.0f}s")
+        await asyncio.sleep(max(0.0, resolvable_at - time.time()))
+
+
+async def run(private_keys=private_keys):
     """Run bets with multiple private keys from private_key.txt."""
 
     if not private_keys:
@@ -148,13 +283,22 @@ async def run():
 
     color_print(f"Starting Zona Bet with {len(private_keys)} accounts...", "GREEN")
 
-    # Create tasks for each private key
-    tasks = []
-    for private_key in private_keys:
-        tasks.append(place_bet(private_key))
+    keys_by_address = {Account.from_key(private_key).address.lower(): private_key for private_key in private_keys}
+
+    async with aiohttp.ClientSession() as session:
+        # Create tasks for each private key
+        tasks = []
+        for private_key in private_keys:
+            tasks.append(place_bet(private_key, session))
+
+        # Run all tasks concurrently, as many at a time as the shared account limiter allows. Failures are
+        # collected, so one account raising doesn't close the session the others are still using
+        results = await account_limiter.gather(*tasks, return_exceptions=True)
+        log_account_failures("Zona", private_keys, results)
 
-    # Run all tasks concurrently
-    await asyncio.gather(*tasks)
+        # Then resolve the positions of earlier runs and of this one as they become due. Bets are done by
+        # now, so a resolution never shares a nonce with a bet of the same account
+        await sweep_positions(keys_by_address, session)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,29 @@
+import json
+import os
+import threading
+from pathlib import Path
+
+STATE_DIR = Path(__file__).parent / "state"  # Runtime state shared across runs, one JSON file per store
+
+_lock = threading.Lock()
+
+
+def load_state(name, default=None):
+    """Load state/<name>.json, or `default` if it doesn't exist or can't be parsed"""
+    path = STATE_DIR / f"{name}.json"
+    try:
+        with open(path, 'r') as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default
+
+
+def save_state(name, value):
+    """Atomically write state/<name>.json"""
+    STATE_DIR.mkdir(exist_ok=True)
+    path = STATE_DIR / f"{name}.json"
+    with _lock:
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, 'w') as file:
+            json.dump(value, file, indent=2)
+        os.replace(tmp_path, path)
@@ -0,0 +1,50 @@
+import asyncio
+
+from aiohttp import web
+
+
+class StandInRpc:
+    def __init__(self, latency=0.0, fail=False, throttle=None):
+        """
+        Local JSON-RPC server answering eth_blockNumber and eth_chainId, for driving the RPC clients in tests
+
+        :param latency: Seconds every response is delayed by
+        :param fail: Answer every request with a 500 while set
+        :param throttle: Called for every request; a 429 is returned while it returns True
+        """
+        self.latency = latency
+        self.fail = fail
+        self.throttle = throttle
+        self.requests = 0
+        self.runner = None
+        self.url = None
+
+    async def handle(self, request):
+        self.requests += 1
+        body = await request.json()
+        await asyncio.sleep(self.latency)
+        if self.fail:
+            return web.Response(status=500, text="Internal Server Error")
+        if self.throttle and self.throttle():
+            return web.Response(status=429, text="Too Many Requests")
+        answers = [self.answer(item) for item in (body if isinstance(body, list) else [body])]
+        return web.json_response(answers if isinstance(body, list) else answers[0])
+
+    @staticmethod
+    def answer(item):
+        result = {"eth_chainId": "0x279f", "eth_blockNumber": "0x64"}.get(item["method"])
+        return {"jsonrpc": "2.0", "id": item["id"], "result": result}
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/"
+        return self
+
+    async def stop(self):
+        await self.runner.cleanup()
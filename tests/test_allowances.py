@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+from hexbytes import HexBytes
+
+import state
+from allowances import APPROVAL_TOPIC, MAX_UINT256, AllowanceIndex
+
+OWNER = "0x00000000000000000000000000000000000000aa"
+SPENDER = "0x00000000000000000000000000000000000000bb"
+TOKEN = "0xe0590015a873bf326bd645c3e1266d4db41c4e6b"
+
+
+@pytest.fixture(autouse=True)
+def state_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(state, "STATE_DIR", tmp_path)
+
+
+def _approval(amount, owner=OWNER, spender=SPENDER):
+    topics = [APPROVAL_TOPIC, owner[2:].rjust(64, '0'), spender[2:].rjust(64, '0')]
+    return {"logs": [{"address": TOKEN, "topics": [HexBytes(bytes.fromhex(topic)) for topic in topics],
+                      "data": HexBytes(amount.to_bytes(32, 'big'))}]}
+
+
+class StandInToken:
+    """Token contract answering allowance() with a fixed amount, counting the reads"""
+
+    def __init__(self, allowance):
+        self.address = TOKEN
+        self.reads = 0
+        token = self
+
+        class Call:
+            async def call(self):
+                token.reads += 1
+                return allowance
+
+        class Functions:
+            @staticmethod
+            def allowance(owner, spender):
+                return Call()
+
+        self.functions = Functions()
+
+
+def test_approval_receipt_covers_later_spends_without_a_read():
+    index = AllowanceIndex("allowances_test")
+    index.record_receipt(_approval(MAX_UINT256))
+    token = StandInToken(0)
+    assert asyncio.run(index.async_read(token, OWNER, SPENDER, 10 ** 18)) == MAX_UINT256
+    assert token.reads == 0
+
+
+def test_new_approval_replaces_the_known_allowance():
+    index = AllowanceIndex("allowances_test")
+    index.record_receipt(_approval(500))
+    assert index.is_sufficient(OWNER, TOKEN, SPENDER, 500)
+    index.record_receipt(_approval(0))  # Revoked
+    assert not index.is_sufficient(OWNER, TOKEN, SPENDER, 1)
+
+
+def test_insufficient_or_forgotten_allowance_is_read_again():
+    index = AllowanceIndex("allowances_test")
+    index.record_receipt(_approval(100))
+    token = StandInToken(1000)
+    assert asyncio.run(index.async_read(token, OWNER, SPENDER, 500)) == 1000
+    assert token.reads == 1
+
+    index.forget(OWNER, TOKEN, SPENDER)  # e.g. a swap relying on it reverted
+    assert index.get(OWNER, TOKEN, SPENDER) is None
+    asyncio.run(index.async_read(token, OWNER, SPENDER, 500))
+    assert token.reads == 2
+
+
+def test_spends_decrease_exact_approvals_only():
+    index = AllowanceIndex("allowances_test")
+    index.set(OWNER, TOKEN, SPENDER, 500)
+    index.spend(OWNER, TOKEN, SPENDER, 200)
+    assert index.get(OWNER, TOKEN, SPENDER) == 300
+
+    index.set(OWNER, TOKEN, SPENDER, MAX_UINT256)
+    index.spend(OWNER, TOKEN, SPENDER, 200)
+    assert index.get(OWNER, TOKEN, SPENDER) == MAX_UINT256
+
+
+def test_index_persists_across_runs():
+    AllowanceIndex("allowances_test").record_receipt(_approval(MAX_UINT256))
+    assert AllowanceIndex("allowances_test").get(OWNER, TOKEN, SPENDER) == MAX_UINT256
@@ -0,0 +1,65 @@
+from hexbytes import HexBytes
+
+from balances import DEPOSIT_TOPIC, NATIVE, TRANSFER_TOPIC, WMON_ADDRESS, BalanceCache
+
+WALLET = "0x00000000000000000000000000000000000000aa"
+OTHER = "0x00000000000000000000000000000000000000bb"
+TOKEN = "0xe0590015a873bf326bd645c3e1266d4db41c4e6b"
+GWEI = 10 ** 9
+
+
+def _topic(value):
+    return HexBytes(bytes.fromhex(value.removeprefix('0x').rjust(64, '0')))
+
+
+def _log(address, signature, *addresses, amount):
+    return {"address": address, "topics": [_topic(signature), *(_topic(a) for a in addresses)],
+            "data": HexBytes(amount.to_bytes(32, 'big'))}
+
+
+def _receipt(status=1, gas_used=21000, logs=()):
+    return {"status": status, "gasUsed": gas_used, "effectiveGasPrice": 50 * GWEI, "logs": list(logs)}
+
+
+def test_fee_is_the_gas_limit_times_the_effective_price():
+    cache = BalanceCache()
+    cache.set(WALLET, NATIVE, 10 ** 18)
+    cache.observe({"from": WALLET, "gas": 100000, "value": 5}, _receipt(gas_used=40000))
+    assert cache.get(WALLET) == 10 ** 18 - 100000 * 50 * GWEI - 5
+
+
+def test_fee_falls_back_to_gas_used_without_a_limit():
+    cache = BalanceCache()
+    cache.set(WALLET, NATIVE, 10 ** 18)
+    cache.observe({"from": WALLET, "value": 0}, _receipt(gas_used=40000))
+    assert cache.get(WALLET) == 10 ** 18 - 40000 * 50 * GWEI
+
+
+def test_failed_transaction_costs_the_fee_but_not_the_value():
+    cache = BalanceCache()
+    cache.set(WALLET, NATIVE, 10 ** 18)
+    cache.set(WALLET, TOKEN, 1000)
+    logs = [_log(TOKEN, TRANSFER_TOPIC, WALLET, OTHER, amount=400)]
+    cache.observe({"from": WALLET, "gas": 100000, "value": 10 ** 17}, _receipt(status=0, logs=logs))
+    assert cache.get(WALLET) == 10 ** 18 - 100000 * 50 * GWEI
+    assert cache.get(WALLET, TOKEN) == 1000  # A reverted transaction emitted nothing
+
+
+def test_logs_move_known_token_balances_only():
+    cache = BalanceCache()
+    cache.set(WALLET, TOKEN, 1000)
+    cache.set(WALLET, WMON_ADDRESS, 0)
+    cache.observe({"from": WALLET, "gas": 60000, "value": 7}, _receipt(logs=[
+        _log(TOKEN, TRANSFER_TOPIC, WALLET, OTHER, amount=400),
+        _log(WMON_ADDRESS, DEPOSIT_TOPIC, WALLET, amount=7),
+    ]))
+    assert cache.get(WALLET, TOKEN) == 600
+    assert cache.get(WALLET, WMON_ADDRESS) == 7
+    assert cache.get(OTHER, TOKEN) is None  # Never read, so not derived either
+    assert cache.get(WALLET) is None  # MON wasn't known before the transaction
+
+
+def test_entries_are_reread_after_the_reconcile_interval():
+    cache = BalanceCache(reconcile_interval=0)
+    cache.set(WALLET, NATIVE, 10 ** 18)
+    assert cache.get(WALLET) is None
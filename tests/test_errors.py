@@ -0,0 +1,99 @@
+import asyncio
+
+import aiohttp
+import pytest
+import requests
+from eth_abi import encode
+from web3.exceptions import ContractLogicError, TimeExhausted, Web3RPCError
+from yarl import URL
+
+from errors import ERROR_SELECTOR, PANIC_SELECTOR, ErrorClass, classify, decode_revert, revert_reason
+
+TX_HASH = "0x" + "ab" * 32
+ADDRESS = "0x760AfE86e5de5fa0Ee542fc7B7B713e1c5425701"
+
+
+def _error_data(reason):
+    return "0x" + ERROR_SELECTOR + encode(['string'], [reason]).hex()
+
+
+def _rpc(message, code=-32000, data=None):
+    error = {"code": code, "message": message}
+    if data is not None:
+        error["data"] = data
+    return Web3RPCError(message, rpc_response={"jsonrpc": "2.0", "id": 1, "error": error})
+
+
+def _http(status):
+    url = URL("https://testnet-rpc.monad.xyz/")
+    request_info = aiohttp.RequestInfo(url, "POST", {}, url)
+    return aiohttp.ClientResponseError(request_info, (), status=status, message="")
+
+
+def _requests_http(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(f"{status} Error", response=response)
+
+
+@pytest.mark.parametrize("error, expected", [
+    # Funding, including reverts whose reason is a native balance problem
+    (_rpc("insufficient funds for gas * price + value"), ErrorClass.FUNDING),
+    (_rpc("Signer had insufficient balance"), ErrorClass.FUNDING),
+    (_rpc("execution reverted: insufficient balance"), ErrorClass.FUNDING),
+    (Exception("gas required exceeds allowance (0)"), ErrorClass.FUNDING),
+    # Nonce and fee errors are rebuilt, not funded
+    (_rpc("nonce too low: next nonce 7, tx nonce 6"), ErrorClass.NONCE),
+    (_rpc("already known"), ErrorClass.NONCE),
+    (_rpc("replacement transaction underpriced"), ErrorClass.FEE),
+    (_rpc("max fee per gas less than block base fee"), ErrorClass.FEE),
+    # Rate limits by JSON-RPC code, HTTP status or message
+    (_rpc("request failed", code=-32005), ErrorClass.RATE_LIMIT),
+    (_http(429), ErrorClass.RATE_LIMIT),
+    (_requests_http(429), ErrorClass.RATE_LIMIT),
+    (Exception("Too Many Requests"), ErrorClass.RATE_LIMIT),
+    # Transient network errors
+    (_http(502), ErrorClass.TRANSIENT),
+    (_http(500), ErrorClass.TRANSIENT),
+    (_requests_http(503), ErrorClass.TRANSIENT),
+    (asyncio.TimeoutError(), ErrorClass.TRANSIENT),
+    (aiohttp.ServerDisconnectedError(), ErrorClass.TRANSIENT),
+    (TimeExhausted(f"Transaction HexBytes('{TX_HASH}') is not in the chain after 120 seconds"), ErrorClass.TRANSIENT),
+    (Exception("Failed to connect to Monad network"), ErrorClass.TRANSIENT),
+    # Deterministic reverts
+    (ContractLogicError("execution reverted", data=_error_data("Position is not resolvable")), ErrorClass.REVERT),
+    (_rpc("execution reverted", code=3, data="0xdeadbeef"), ErrorClass.REVERT),
+    (_rpc("ERC20: transfer amount exceeds balance"), ErrorClass.REVERT),
+    (ContractLogicError("0x", data="0x"), ErrorClass.REVERT),
+    # Nothing known, and a hash or address in the message isn't taken for anything
+    (Exception(f"Unexpected receipt for {TX_HASH} from {ADDRESS}"), ErrorClass.UNKNOWN),
+])
+def test_classify(error, expected):
+    assert classify(error) is expected
+
+
+@pytest.mark.parametrize("data, expected", [
+    (_error_data("Position is not resolvable"), "Position is not resolvable"),
+    (bytes.fromhex(_error_data("Too little received")[2:]), "Too little received"),
+    ({"data": _error_data("STF")}, "STF"),
+    ("0x" + PANIC_SELECTOR + encode(['uint256'], [0x11]).hex(), "Panic(0x11)"),
+    ("0xdeadbeef", "custom error 0xdeadbeef"),
+    ("0x" + ERROR_SELECTOR + "00", "custom error 0x08c379a0"),  # Truncated payload
+    ("0x1234", None),
+    (None, None),
+])
+def test_decode_revert(data, expected):
+    assert decode_revert(data) == expected
+
+
+@pytest.mark.parametrize("error, expected", [
+    (Exception(f"execution reverted: {_error_data('STF')}"), "STF"),
+    (Exception("execution reverted, data: 0x7939f424"), "custom error 0x7939f424"),
+    (_rpc("execution reverted", code=3, data=_error_data("STF")), "STF"),
+    # A tx hash or an address is not custom-error revert data
+    (Exception(f"Transaction {TX_HASH} failed"), None),
+    (Exception(f"Transfer to {ADDRESS} failed"), None),
+    (Exception("execution reverted"), None),
+])
+def test_revert_reason(error, expected):
+    assert revert_reason(error) == expected
@@ -0,0 +1,80 @@
+import asyncio
+
+import metrics
+from gas import GasModel
+
+ROUTER = "0xc995498c22a012353fae7ecc701810d673e25794"
+SWAP = "0x7ff36ab5"
+
+
+class StandInFunction:
+    """Contract function exposing what the gas model keys on"""
+    address = ROUTER
+    selector = SWAP
+
+
+class StandInEth:
+    def __init__(self, estimate):
+        self.estimate = estimate
+        self.estimates = 0
+
+    async def estimate_gas(self, tx):
+        self.estimates += 1
+        return self.estimate
+
+
+class StandInWeb3:
+    def __init__(self, estimate=150000):
+        self.eth = StandInEth(estimate)
+
+
+def _swap(gas=None):
+    tx = {"to": ROUTER, "data": SWAP + "00" * 32, "value": 10 ** 15}
+    if gas is not None:
+        tx["gas"] = gas
+    return tx
+
+
+def _mined(model, gas_used, status=1, gas=200000):
+    model.observe(_swap(gas), {"status": status, "gasUsed": gas_used})
+
+
+def test_cold_key_is_estimated_then_served_once_warm():
+    model = GasModel(percentile=0.95, headroom=1.2, min_samples=3)
+    w3 = StandInWeb3()
+    params = {"from": ROUTER, "value": 10 ** 15}
+
+    assert model.with_limit(StandInFunction(), params) is params  # Cold: left to estimate_gas
+    assert asyncio.run(model.async_estimate(w3, _swap(), buffer=1.1)) == int(150000 * 1.1)
+    assert w3.eth.estimates == 1
+
+    for gas_used in (100000, 110000, 120000):
+        _mined(model, gas_used)
+    hits = metrics.snapshot().get('gas_model.hit', 0)
+    assert model.with_limit(StandInFunction(), params)["gas"] == int(120000 * 1.2)
+    assert asyncio.run(model.async_estimate(w3, _swap())) == int(120000 * 1.2)
+    assert w3.eth.estimates == 1  # Warm: no more round trips
+    assert metrics.snapshot()['gas_model.hit'] == hits + 2
+
+
+def test_keys_are_per_contract_selector_and_payable():
+    model = GasModel(min_samples=1)
+    _mined(model, 100000)
+    assert model.limit(_swap()) is not None
+    assert model.limit({**_swap(), "value": 0}) is None
+    assert model.limit({**_swap(), "data": "0x38ed1739"}) is None
+    assert model.limit({**_swap(), "to": "0x" + "11" * 20}) is None
+
+
+def test_out_of_gas_failure_makes_the_key_cold_again():
+    model = GasModel(min_samples=1)
+    _mined(model, 100000)
+    _mined(model, 120000, status=0, gas=120000)  # Used its whole limit
+    assert model.limit(_swap()) is None
+
+
+def test_other_failures_keep_what_was_learned():
+    model = GasModel(min_samples=1)
+    _mined(model, 100000)
+    _mined(model, 60000, status=0, gas=120000)  # Reverted well under its limit
+    assert model.limit(_swap()) == int(100000 * model.headroom)
@@ -0,0 +1,73 @@
+import asyncio
+import time
+
+from web3 import AsyncWeb3
+
+from rpc_router import RoutedAsyncHTTPProvider, RpcRouter
+from stand_in_rpc import StandInRpc
+
+
+async def _serve(*servers):
+    return [await server.start() for server in servers]
+
+
+async def _read(router, times):
+    provider = RoutedAsyncHTTPProvider(router)
+    w3 = AsyncWeb3(provider)
+    try:
+        for _ in range(times):
+            assert await w3.eth.block_number == 100
+    finally:
+        await provider.disconnect()
+
+
+def test_reads_go_to_the_fastest_endpoint():
+    async def scenario():
+        slow, fast = await _serve(StandInRpc(latency=0.05), StandInRpc())
+        try:
+            router = RpcRouter([slow.url, fast.url])
+            await _read(router, 6)
+            assert router.ranked()[0].url == fast.url
+            assert slow.requests == 1  # Only the request that measured it
+            assert fast.requests == 5
+        finally:
+            await slow.stop()
+            await fast.stop()
+
+    asyncio.run(scenario())
+
+
+def test_failing_endpoint_fails_over_and_ranks_last():
+    async def scenario():
+        failing, slow, fast = await _serve(StandInRpc(fail=True), StandInRpc(latency=0.05), StandInRpc())
+        try:
+            router = RpcRouter([failing.url, slow.url, fast.url])
+            await _read(router, 5)
+            assert failing.requests == 1  # Never measured healthy, so not tried first again
+            assert [endpoint.url for endpoint in router.ranked()] == [fast.url, slow.url, failing.url]
+        finally:
+            for server in (failing, slow, fast):
+                await server.stop()
+
+    asyncio.run(scenario())
+
+
+def test_breaker_trips_and_moves_the_pin():
+    async def scenario():
+        flaky, slow = await _serve(StandInRpc(), StandInRpc(latency=0.05))
+        try:
+            router = RpcRouter([flaky.url, slow.url], min_samples=5, cooldown=60)
+            provider = RoutedAsyncHTTPProvider(router)
+            await _read(router, 4)
+            assert router.pin(provider).url == flaky.url
+
+            flaky.fail = True
+            await _read(router, 6)  # Every read still succeeds through the slow endpoint
+            assert router.endpoints[0].is_open(time.monotonic())
+            assert [endpoint.url for endpoint in router.ranked()] == [slow.url]
+            assert router.pin(provider).url == slow.url
+        finally:
+            await flaky.stop()
+            await slow.stop()
+
+    asyncio.run(scenario())
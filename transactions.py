@@ -0,0 +1,42 @@
+import asyncio
+from typing import Any, Dict, List, Tuple
+
+from gas import gas_model
+from balances import wallet_balances
+
+
+async def send_pipelined(w3, private_key: str, transactions: List[Dict[str, Any]],
+                         timeout: int = 120) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """
+    Send a sequence of transactions back-to-back with consecutive nonces and confirm them together.
+
+    Only use this when each transaction depends on the previous one purely for ordering: the later
+    transactions are signed before the earlier ones are mined, so their gas limits must already be set
+    (they cannot be estimated against the pre-sequence state).
+
+    Args:
+        w3: AsyncWeb3 instance
+        private_key: Key that signs every transaction in the sequence
+        transactions: Fully built transactions without a nonce, in execution order
+        timeout: Seconds to wait for the last transaction's receipt
+
+    Returns:
+        Tuple of (transaction hashes, receipts), both in execution order
+    """
+    account = w3.eth.account.from_key(private_key)
+    nonce = await w3.eth.get_transaction_count(account.address, 'pending')
+
+    tx_hashes = []
+    for offset, transaction in enumerate(transactions):
+        signed_tx = account.sign_transaction({**transaction, 'nonce': nonce + offset})
+        tx_hashes.append(await w3.eth.send_raw_transaction(signed_tx.raw_transaction))
+
+    # Nonce ordering guarantees the earlier transactions are mined once the last one is
+    last_receipt = await w3.eth.wait_for_transaction_receipt(tx_hashes[-1], timeout=timeout)
+    earlier_receipts = await asyncio.gather(*(w3.eth.get_transaction_receipt(h) for h in tx_hashes[:-1]))
+    receipts = [*earlier_receipts, last_receipt]
+
+    for transaction, receipt in zip(transactions, receipts):
+        gas_model.observe(transaction, receipt)
+        wallet_balances.observe(transaction, receipt)
+    return [tx_hash.hex() for tx_hash in tx_hashes], receipts
@@ -1,13 +1,22 @@
 import asyncio
 import json
+import threading
+from contextlib import asynccontextmanager
+from eth_account import Account
 from web3 import Web3, AsyncWeb3
 import requests
 import random
 import os
 from pathlib import Path
 from logger import color_print, logger
-from proxies import get_free_proxy
+from proxies import proxy_cache
 from headers import get_phantom_headers
+from fees import fee_oracle
+from rpc_cache import RpcCacheMiddleware
+from errors import ErrorClass, classify
+from rpc_router import RpcRouter, RoutedHTTPProvider, RoutedAsyncHTTPProvider
+from ratelimit import DEFAULT_LIMITS, HostRateLimiter
+from concurrency import AimdLimiter
 
 BASE_DIR = Path(os.path.dirname(os.path.abspath(__file__)))
 
@@ -54,14 +63,30 @@ else:
 private_keys = selected_keys
 
 RPC_URL = "https://testnet-rpc.monad.xyz"
+RPC_URLS = data.get("RPC_URLS") or [RPC_URL]  # Endpoints the RPC router spreads requests over
 PROXIES = data["PROXIES"]
 GITHUB_USERNAME = data["GITHUB_USERNAME"]
+CONCURRENCY = data.get("CONCURRENCY", 10)  # Accounts processed at the same time, adapted from here
+MAX_CONCURRENCY = data.get("MAX_CONCURRENCY", 50)  # Ceiling the adaptive account limit may grow to
+PIPELINED_TXS = data.get("PIPELINED_TXS", True)  # Send order-only dependent txs back-to-back
+APPROVE_MAX = data.get("APPROVE_MAX", True)  # Approve DEX routers once for an unlimited amount
+RATE_LIMITS = {**DEFAULT_LIMITS, **data.get("RATE_LIMITS", {})}  # Requests per second by host
+
+# Shared by every client, so each host's budget holds for the whole fleet
+rate_limiter = HostRateLimiter(RATE_LIMITS)
+# Shared by every connection, so endpoint health is learned once for the whole fleet
+rpc_router = RpcRouter(RPC_URLS, limiter=rate_limiter)
+# Accounts in flight, grown while the RPC stays fast and healthy, cut when it degrades
+account_limiter = AimdLimiter(CONCURRENCY, maximum=MAX_CONCURRENCY)
+rpc_router.listeners.append(account_limiter.observe)
 
 if PROXIES:
     color_print(f"Proxies found in config file", 'GREEN')
 else:
     color_print(f"Proxies NOT found in config file!", "RED")
     reply = input("Do you like to proceed with free proxies. Free proxies might be buggy (y/n): ")
+    if reply.lower() == 'y' and not proxy_cache.ensure():
+        color_print(f"No working free proxy found, connections will fail until one is validated", "RED")
 
 
 def verify_github_star(repo_url, config_path='config.json'):
@@ -146,7 +171,10 @@ def get_web3_connection(use_async=False):
         request_kwargs["proxies"] = {'https': PROXIES, 'http': PROXIES}
     else:
         if reply.lower() == 'y':
-            free_proxies = get_free_proxy()['proxy']
+            # Served from the proxy cache; testing happens at startup and in the background
+            free_proxies = proxy_cache.get()
+            if free_proxies is None:
+                raise ConnectionError("No validated free proxy cached, waiting for the background revalidation")
             request_kwargs["proxies"] = free_proxies
 
     if use_async:
@@ -162,12 +190,16 @@ def get_web3_connection(use_async=False):
             del request_kwargs["proxies"]
 
         # For AsyncWeb3
-        provider = AsyncWeb3.AsyncHTTPProvider(RPC_URL, request_kwargs=request_kwargs)
-        return AsyncWeb3(provider)
+        provider = RoutedAsyncHTTPProvider(rpc_router, request_kwargs=request_kwargs)
+        w3 = AsyncWeb3(provider)
     else:
         # For regular Web3
-        provider = Web3.HTTPProvider(RPC_URL, request_kwargs=request_kwargs)
-        return Web3(provider)
+        provider = RoutedHTTPProvider(rpc_router, request_kwargs=request_kwargs)
+        w3 = Web3(provider)
+
+    # Serve chain id, token metadata and per-block data from the shared response cache
+    w3.middleware_onion.add(RpcCacheMiddleware, name='rpc_cache')
+    return w3
 
 
 async def timeout(start=60, end=300):
@@ -188,8 +220,32 @@ async def timeout(start=60, end=300):
     await asyncio.sleep(time_out)
 
 
+
+def log_account_failures(script: str, private_keys, results) -> int:
+    """Log every account whose task failed in a return_exceptions gather, returning how many did"""
+    failures = 0
+    for private_key, result in zip(private_keys, results):
+        if isinstance(result, BaseException):
+            failures += 1
+            logger.error(f"{script}: Account {Account.from_key(private_key).address} failed: {result!r}")
+    return failures
+
+
 FUND_AMT = data["FUND_AMOUNT"]
 FUNDER_PRIVATE_KEY = data["FUNDER_PRIVATE_KEY"]
+# Held around every transfer from the funder wallet: accounts are funded concurrently from threads and tasks
+funder_lock = threading.Lock()
+
+
+@asynccontextmanager
+async def hold_funder_lock():
+    """Hold funder_lock from a coroutine without blocking the event loop"""
+    while not funder_lock.acquire(blocking=False):
+        await asyncio.sleep(0.05)
+    try:
+        yield
+    finally:
+        funder_lock.release()
 
 
 def handle_funding_error(exception: Exception, wallet_address: str) -> bool:
@@ -203,99 +259,72 @@ def handle_funding_error(exception: Exception, wallet_address: str) -> bool:
     Returns:
         bool: True if funding was attempted, False otherwise
     """
-    error_list = [
-        "intrinsic gas greater than limit",
-        "Signer had insufficient balance",
-        "insufficient funds",
-        "insufficient balance",
-        "insufficient funds for gas",
-        "insufficient funds for transfer",
-        "insufficient funds for gas * price + value",
-        "insufficient funds for intrinsic transaction cost",
-        "not enough balance",
-        "balance too low",
-        "insufficient ETH balance",
-        "insufficient native token",
-        "gas required exceeds allowance",
-        "out of gas",
-        "execution reverted: insufficient balance",
-        "transfer amount exceeds balance",
-        "sender doesn't have enough funds",
-        "insufficient allowance",
-        "ERC20: transfer amount exceeds balance",
-        "ERC20: insufficient allowance"
-    ]
-
-    for error in error_list:
-        if error in str(exception).lower():  # Case insensitive matching
-            logger.warning(f"Account {wallet_address}: Funding error: {error}")
-            try:
-                # Send tokens directly using web3
-                w3 = get_web3_connection()
-                funder_account = w3.eth.account.from_key(FUNDER_PRIVATE_KEY)
-
-                # Check funder balance first
-                funder_balance = w3.eth.get_balance(funder_account.address)
-                gas_cost = 21000 * w3.eth.gas_price
-                funding_amount = w3.to_wei(FUND_AMT, 'ether')
-                total_needed = funding_amount + gas_cost
-
-                if funder_balance < total_needed:
-                    logger.error(f"Funder {funder_account.address} has insufficient balance. "
-                                  f"Has: {w3.from_wei(funder_balance, 'ether'):.6f} MON, "
-                                  f"Needs: {w3.from_wei(total_needed, 'ether'):.6f} MON")
-                    return False
-
-                logger.info(f"Funder {funder_account.address}: Prepping to send {FUND_AMT} MON to {wallet_address}")
-
-                # Use EIP-1559 transaction for better gas handling
-                try:
-                    # Try EIP-1559 first (better gas handling)
-                    latest_block = w3.eth.get_block('latest')
-                    base_fee = latest_block.get('baseFeePerGas', w3.eth.gas_price)
-                    max_priority_fee = min(w3.to_wei(2, 'gwei'), w3.eth.gas_price)
-
-                    tx_data = {
-                        'to': wallet_address,
-                        'value': funding_amount,
-                        'gas': 21000,
-                        'maxFeePerGas': base_fee + max_priority_fee,
-                        'maxPriorityFeePerGas': max_priority_fee,
-                        'nonce': w3.eth.get_transaction_count(funder_account.address),
-                        'chainId': w3.eth.chain_id,
-                        'type': 2  # EIP-1559
-                    }
-                except:
-                    # Fallback to legacy transaction
-                    tx_data = {
-                        'to': wallet_address,
-                        'value': funding_amount,
-                        'gas': 21000,
-                        'gasPrice': w3.eth.gas_price,
-                        'nonce': w3.eth.get_transaction_count(funder_account.address),
-                        'chainId': w3.eth.chain_id
-                    }
-
-                # Sign and send transaction
-                signed_tx = w3.eth.account.sign_transaction(tx_data, FUNDER_PRIVATE_KEY)
-                tx_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
-                tx_receipt = w3.eth.wait_for_transaction_receipt(tx_hash, timeout=120)
-
-                if tx_receipt.status == 1:
-                    gas_used = tx_receipt.gasUsed
-                    effective_gas_price = tx_receipt.get('effectiveGasPrice', w3.eth.gas_price)
-                    eth_spent = w3.from_wei(gas_used * effective_gas_price, 'ether')
-                    logger.info(f"Funder {funder_account.address}: "
-                                 f"Successfully sent {FUND_AMT} MON to {wallet_address}. Tx fees: {eth_spent:.6f} MON")
-                    return True
-                else:
-                    raise Exception(f"Funding transaction failed!")
-
-            except Exception as e:
-                logger.error(f"Failed to fund {wallet_address}: {str(e)}")
+    if classify(exception) is not ErrorClass.FUNDING:
+        return False
+
+    logger.warning(f"Account {wallet_address}: Funding error: {str(exception)[:120]}")
+    try:
+        # Send tokens directly using web3
+        w3 = get_web3_connection()
+        funder_account = w3.eth.account.from_key(FUNDER_PRIVATE_KEY)
+
+        # One funder transfer at a time, from its nonce read until it's mined, so none share a nonce
+        with funder_lock:
+            # Check funder balance first
+            funder_balance = w3.eth.get_balance(funder_account.address)
+            gas_cost = 21000 * fee_oracle.gas_price_sync(w3)
+            funding_amount = w3.to_wei(FUND_AMT, 'ether')
+            total_needed = funding_amount + gas_cost
+
+            if funder_balance < total_needed:
+                logger.error(f"Funder {funder_account.address} has insufficient balance. "
+                              f"Has: {w3.from_wei(funder_balance, 'ether'):.6f} MON, "
+                              f"Needs: {w3.from_wei(total_needed, 'ether'):.6f} MON")
                 return False
 
-    return False
+            logger.info(f"Funder {funder_account.address}: Prepping to send {FUND_AMT} MON to {wallet_address}")
+
+            # Use EIP-1559 transaction for better gas handling
+            try:
+                # Try EIP-1559 first (better gas handling)
+                tx_data = {
+                    'to': wallet_address,
+                    'value': funding_amount,
+                    'gas': 21000,
+                    **fee_oracle.suggest_sync(w3),
+                    'nonce': w3.eth.get_transaction_count(funder_account.address),
+                    'chainId': w3.eth.chain_id,
+                    'type': 2  # EIP-1559
+                }
+            except:
+                # Fallback to legacy transaction
+                tx_data = {
+                    'to': wallet_address,
+                    'value': funding_amount,
+                    'gas': 21000,
+                    'gasPrice': w3.eth.gas_price,
+                    'nonce': w3.eth.get_transaction_count(funder_account.address),
+                    'chainId': w3.eth.chain_id
+                }
+
+            # Sign and send transaction
+            signed_tx = w3.eth.account.sign_transaction(tx_data, FUNDER_PRIVATE_KEY)
+            tx_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+            tx_receipt = w3.eth.wait_for_transaction_receipt(tx_hash, timeout=120)
+
+            if tx_receipt.status == 1:
+                gas_used = tx_receipt.gasUsed
+                effective_gas_price = tx_receipt.get('effectiveGasPrice', w3.eth.gas_price)
+                eth_spent = w3.from_wei(gas_used * effective_gas_price, 'ether')
+                logger.info(f"Funder {funder_account.address}: "
+                             f"Successfully sent {FUND_AMT} MON to {wallet_address}. Tx fees: {eth_spent:.6f} MON")
+                return True
+            else:
+                raise Exception(f"Funding transaction failed!")
+
+    except Exception as e:
+        logger.error(f"Failed to fund {wallet_address}: {str(e)}")
+        return False
 
 monad_testnet_tokens = {
     'aprMON': '0xb2f82d0f38dc453d596ad40a37799446cc89274a',